@@ -3,16 +3,32 @@
 # ----------------------------------------------------------------------------#
 
 import json
+import math
 import dateutil.parser
 import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for
+from datetime import date, datetime, timedelta
+from itertools import groupby
+from flask import Flask, render_template, request, Response, flash, redirect, url_for, jsonify, abort, \
+    stream_with_context
 from flask_moment import Moment
 from flask_sqlalchemy import SQLAlchemy
-import logging
-from logging import Formatter, FileHandler
+from sqlalchemy import and_, case, cast, func, literal, null, or_, select, tuple_, union, union_all
 from flask_wtf import Form
 from forms import *
 from flask_migrate import Migrate
+from profiler import ProfilerMiddleware
+from compression import CompressionMiddleware
+from fragments import init_fragments
+from invalidation import init_invalidation
+from rollups import init_rollups
+from geo import init_geo, geocode, bounding_box, covering_cells, cell_ranges, distance_km, EARTH_RADIUS_KM
+from logs import configure_logging
+from metrics import init_metrics, record_cache
+from partitions import init_partitions
+from schema import init_schema
+from ratelimit import init_ratelimit
+from warmup import init_warmup, record_access
+from cache import create_cache, versioned_key, invalidate_namespace, normalize_term
 
 # ----------------------------------------------------------------------------#
 # App Config.
@@ -25,6 +41,16 @@ db = SQLAlchemy(app)
 
 migrate = Migrate(app, db)
 
+app.wsgi_app = ProfilerMiddleware(app.wsgi_app, app)
+# outermost, so the profiler and metrics only see uncompressed work
+app.wsgi_app = CompressionMiddleware(app.wsgi_app, app.config)
+init_metrics(app, db)
+cache = create_cache(app.config)
+bus = init_invalidation(app, cache, invalidate_namespace)
+init_fragments(app)
+init_partitions(app, db)
+init_schema(app, db)
+
 
 # ----------------------------------------------------------------------------#
 # Models.
@@ -45,7 +71,26 @@ class Venue(db.Model):
     website = db.Column(db.String)
     seeking_talent = db.Column(db.Boolean)
     seeking_description = db.Column(db.String)
-    shows = db.relationship('Show', backref='Venue', lazy=True);
+    created_at = db.Column(db.DateTime, nullable=False, server_default=db.func.now(), index=True)
+    # bumped by every edit; see save_changes
+    version = db.Column(db.Integer, nullable=False, server_default='1')
+    # the city's location from the gazetteer and its geohash; see geo.py
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    geohash = db.Column(db.String(12))
+    shows = db.relationship('Show', backref='Venue', lazy=True, passive_deletes=True);
+
+    # only venues that are seeking talent are match candidates; the trigram
+    # indexes serve the ILIKE filters of every search; the geohash index
+    # serves the radius searches of /venues/near
+    __table_args__ = (
+        db.Index('ix_Venue_geohash', 'geohash'),
+        db.Index('ix_Venue_seeking_state_city', 'state', 'city',
+                 postgresql_where=db.text('seeking_talent')),
+        db.Index('ix_Venue_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('ix_Venue_city_trgm', 'city', postgresql_using='gin', postgresql_ops={'city': 'gin_trgm_ops'}),
+        db.Index('ix_Venue_genres_trgm', 'genres', postgresql_using='gin', postgresql_ops={'genres': 'gin_trgm_ops'}),
+    )
 
 
 
@@ -63,15 +108,69 @@ class Artist(db.Model):
     seeking_venue = db.Column(db.Boolean)
     website = db.Column(db.String)
     seeking_description = db.Column(db.String)
-    shows = db.relationship('Show', backref='Artist', lazy=True);
+    created_at = db.Column(db.DateTime, nullable=False, server_default=db.func.now(), index=True)
+    # bumped by every edit; see save_changes
+    version = db.Column(db.Integer, nullable=False, server_default='1')
+    shows = db.relationship('Show', backref='Artist', lazy=True, passive_deletes=True);
+
+    # only artists that are seeking venues are match candidates; the trigram
+    # indexes serve the ILIKE filters of every search
+    __table_args__ = (
+        db.Index('ix_Artist_seeking_state_city', 'state', 'city',
+                 postgresql_where=db.text('seeking_venue')),
+        db.Index('ix_Artist_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index('ix_Artist_city_trgm', 'city', postgresql_using='gin', postgresql_ops={'city': 'gin_trgm_ops'}),
+        db.Index('ix_Artist_genres_trgm', 'genres', postgresql_using='gin', postgresql_ops={'genres': 'gin_trgm_ops'}),
+    )
+
+
+class Gazetteer(db.Model):
+    # places for offline geocoding, loaded by `flask geo import`
+    __tablename__ = 'Gazetteer'
+
+    id = db.Column(db.Integer, primary_key=True)
+    city_key = db.Column(db.String(120), nullable=False)
+    state = db.Column(db.String(120), nullable=False)
+    latitude = db.Column(db.Float, nullable=False)
+    longitude = db.Column(db.Float, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_Gazetteer_state_city_key', 'state', 'city_key', unique=True),
+    )
 
 
 class Show(db.Model):
     __tablename__ = 'Show'
     id = db.Column(db.Integer, primary_key=True)
-    start_time = db.Column(db.String)
-    artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id'), nullable=False)
-    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'), nullable=False)
+    start_time = db.Column(db.String, nullable=False)
+    artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'), nullable=False)
+    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'), nullable=False)
+
+    # start_time is stored as 'YYYY-MM-DD HH:MM:SS', so string ranges sort
+    # chronologically and these indexes serve the calendar range queries.
+    # On postgres the table is range-partitioned by month on start_time with
+    # a (id, start_time) primary key; see partitions.py.
+    __table_args__ = (
+        db.Index('ix_Show_start_time', 'start_time'),
+        db.Index('ix_Show_venue_id_start_time', 'venue_id', 'start_time'),
+        db.Index('ix_Show_artist_id_start_time', 'artist_id', 'start_time'),
+    )
+
+
+class ShowRollup(db.Model):
+    # shows per month, venue city and artist genre, kept current by the
+    # write routes; see rollups.py
+    __tablename__ = 'ShowRollup'
+
+    month = db.Column(db.String(7), primary_key=True)
+    state = db.Column(db.String(120), primary_key=True)
+    city = db.Column(db.String(120), primary_key=True)
+    genre = db.Column(db.String(120), primary_key=True)
+    show_count = db.Column(db.Integer, nullable=False, server_default='0')
+
+    __table_args__ = (
+        db.Index('ix_ShowRollup_genre_month', 'genre', 'month'),
+    )
 
 
 # ----------------------------------------------------------------------------#
@@ -90,112 +189,352 @@ def format_datetime(value, format='medium'):
 app.jinja_env.filters['datetime'] = format_datetime
 
 
+def parse_genres(value):
+    # genres are stored as a plain string, either 'Jazz,Folk' or the
+    # '{Jazz,Folk}' literal postgres produces for a multi-select submit
+    if not value:
+        return []
+    return [genre.strip().strip('"') for genre in value.strip('{}').split(',') if genre.strip()]
+
+
+rollups = init_rollups(app, db, Show, Venue, Artist, ShowRollup, parse_genres)
+
+
+def form_genres(data):
+    # the genres multi-select submits one value per selected genre
+    return ','.join(data.getlist("genres")) or None
+
+
+def blank_as_null(submitted):
+    # an input left empty submits '', while the column it edits is NULL
+    return dict((name, None if value == '' else value) for name, value in submitted.items())
+
+
+def like_pattern(term):
+    # '%term%' with LIKE wildcards in the term escaped
+    return '%' + term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+# ----------------------------------------------------------------------------#
+# Caches.
+# ----------------------------------------------------------------------------#
+
+def invalidate(*namespaces):
+    # called after a successful commit for every cache group the write
+    # touched; the bus drops them here and in every other worker
+    bus.publish(namespaces)
+
+
+def entity_key(kind, entityId):
+    # a detail page entry is dropped by a write to the entity itself
+    # (namespace 'venue:<id>') or by one that touches every page of its kind
+    # (namespace 'detail:venue'), like renaming an artist who played there
+    return versioned_key(cache, 'detail:' + kind,
+                         '%d:%d' % (entityId, cache.counter('ns:%s:%d' % (kind, entityId))))
+
+
+def cached_search(namespace, term, compute):
+    # search results keyed on the normalized term; a hit needs no database
+    key = versioned_key(cache, namespace, normalize_term(term))
+    result = cache.get(key)
+    record_cache(namespace, result is not None)
+    if result is None:
+        result = compute(normalize_term(term))
+        cache.set(key, result, app.config.get('SEARCH_CACHE_TTL'))
+    return result
+
+
+# ----------------------------------------------------------------------------#
+# Streaming.
+# ----------------------------------------------------------------------------#
+
+# template output is sent in batches of this many fragments
+STREAM_BUFFER_SIZE = 64
+# rows fetched from the database per statement by the listing queries
+LISTING_BATCH_SIZE = 500
+
+
+def stream_template(templateName, **context):
+    # like render_template, but the page is sent while it renders: the layout
+    # head goes out before the listing query runs, and rows are pulled from
+    # the generators in the context only as the template reaches them
+    app.update_template_context(context)
+    stream = app.jinja_env.get_template(templateName).stream(context)
+    stream.enable_buffering(STREAM_BUFFER_SIZE)
+    return Response(stream_with_context(stream), mimetype='text/html')
+
+
+def batched_rows(query, order, position):
+    # the rows of query sorted by order - expressions that can't be NULL and
+    # end in a unique column - fetched LISTING_BATCH_SIZE at a time, each
+    # batch starting after the last row of the one before (position(row) is
+    # that row's values of order). The session is closed after every batch,
+    # so a slow client reading the page holds no connection, cursor or
+    # transaction between them.
+    after = None
+    while True:
+        batch = query if after is None else query.filter(tuple_(*order) > tuple_(*after))
+        rows = batch.order_by(*order).limit(LISTING_BATCH_SIZE).all()
+        db.session.close()
+        for row in rows:
+            yield row
+        if len(rows) < LISTING_BATCH_SIZE:
+            return
+        after = position(rows[-1])
+
+
+# ----------------------------------------------------------------------------#
+# Edits.
+# ----------------------------------------------------------------------------#
+
+# the cache groups that hold each column; an edit only invalidates the
+# groups of the columns it actually changed, plus the entity's own page
+VENUE_CACHED_COLUMNS = {
+    'search:venues': ('name',),
+    'search:all': ('name', 'city', 'state', 'genres', 'image_link'),
+    'home': ('name', 'city', 'state'),
+    'areas': ('name', 'city', 'state'),
+    'detail:artist': ('name', 'image_link'),
+}
+ARTIST_CACHED_COLUMNS = {
+    'search:artists': ('name',),
+    'search:all': ('name', 'city', 'state', 'genres', 'image_link'),
+    'home': ('name', 'city', 'state'),
+    'detail:venue': ('name', 'image_link'),
+}
+
+
+def same_value(name, submitted, stored):
+    # the genres multi-select submits its picks in the order of its choices,
+    # whatever order they were stored in
+    if name == 'genres':
+        return set(parse_genres(submitted)) == set(parse_genres(stored))
+    return submitted == stored
+
+
+def save_changes(model, entityId, submitted, version=None):
+    # writes only the submitted columns whose value differs from the stored
+    # row. The UPDATE is guarded by the row version, so an edit started from
+    # an older version than the stored one (someone else saved in between)
+    # is detected instead of silently overwriting theirs, without holding a
+    # lock while the editor has the form open. Returns {changed column: value
+    # before the edit}, or None on a conflict or when the row is gone.
+    columns = sorted(submitted)
+    current = db.session.query(model.version, *[getattr(model, name) for name in columns]) \
+        .filter(model.id == entityId).first()
+    if current is None or (version is not None and version != current[0]):
+        return None
+    previous = dict((name, value) for name, value in zip(columns, current[1:])
+                    if not same_value(name, submitted[name], value))
+    if not previous:
+        return {}
+    changes = dict((name, submitted[name]) for name in previous)
+    changes['version'] = model.version + 1
+    updated = model.query.filter(model.id == entityId, model.version == current[0]) \
+        .update(changes, synchronize_session=False)
+    if not updated:
+        return None
+    return previous
+
+
+def changed_namespaces(cachedColumns, changed):
+    return [namespace for namespace, columns in sorted(cachedColumns.items())
+            if any(name in changed for name in columns)]
+
+
 # ----------------------------------------------------------------------------#
 # Controllers.
 # ----------------------------------------------------------------------------#
 
+HOME_FEED_SIZE = 10
+
+
+def home_feed():
+    # the newest venues and artists and the next upcoming shows, cached until
+    # the next venue/artist/show write or HOME_FEED_TTL, whichever is first
+    key = versioned_key(cache, 'home', 'feed')
+    feed = cache.get(key)
+    record_cache('home', feed is not None)
+    if feed is not None:
+        return feed
+
+    recentVenues = []
+    for venueId, version, venueName, city, state in \
+            db.session.query(Venue.id, Venue.version, Venue.name, Venue.city, Venue.state) \
+            .order_by(Venue.created_at.desc(), Venue.id.desc()).limit(HOME_FEED_SIZE):
+        recentVenues.append({"id": venueId, "version": version, "name": venueName, "city": city, "state": state})
+    recentArtists = []
+    for artistId, version, artistName, city, state in \
+            db.session.query(Artist.id, Artist.version, Artist.name, Artist.city, Artist.state) \
+            .order_by(Artist.created_at.desc(), Artist.id.desc()).limit(HOME_FEED_SIZE):
+        recentArtists.append({"id": artistId, "version": version, "name": artistName, "city": city, "state": state})
+    upcomingShows = []
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    for startTime, artistId, artistVersion, artistName, venueId, venueVersion, venueName in \
+            db.session.query(Show.start_time, Artist.id, Artist.version, Artist.name,
+                             Venue.id, Venue.version, Venue.name) \
+            .join(Artist, Artist.id == Show.artist_id) \
+            .join(Venue, Venue.id == Show.venue_id) \
+            .filter(Show.start_time >= now) \
+            .order_by(Show.start_time).limit(HOME_FEED_SIZE):
+        upcomingShows.append({
+            "artist_id": artistId,
+            "artist_version": artistVersion,
+            "artist_name": artistName,
+            "venue_id": venueId,
+            "venue_version": venueVersion,
+            "venue_name": venueName,
+            "start_time": startTime
+        })
+
+    feed = {
+        "venues": recentVenues,
+        "artists": recentArtists,
+        "shows": upcomingShows
+    }
+    cache.set(key, feed, app.config.get('HOME_FEED_TTL'))
+    return feed
+
+
+def render_home():
+    return render_template('pages/home.html', feed=home_feed())
+
+
 @app.route('/')
 def index():
-    return render_template('pages/home.html')
+    return render_home()
 
 
 #  Venues
 #  ----------------------------------------------------------------
 
-@app.route('/venues')
-def venues():
-    outputData = [];
-    inputData = Venue.query.all()
-    for venue in inputData:
-        city = venue.city
-        allShows = Show.query.all()
-        numUpcomingShows = 0
-        for show in allShows:
-            if(show.venue_id == venue.id):
-                numUpcomingShows+=1
-        # check if outputData is empty
-        if outputData is None:
-            outputData.append({
-                "city": city,
-                "state": venue.state,
-                "venues": [{
-                    "id": venue.id,
-                    "name": venue.name,
-                    "num_upcoming_shows": numUpcomingShows
-                }]
+def venue_areas():
+    # venues ordered by area and grouped as they stream, so no area or venue
+    # list is built up front; the streamed areas are collected into the
+    # cache for the following requests
+    key = versioned_key(cache, 'areas', 'all')
+    cachedAreas = cache.get(key)
+    record_cache('areas', cachedAreas is not None)
+    if cachedAreas is not None:
+        return cachedAreas
+
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    upcomingShows = db.session.query(func.count(Show.id)) \
+        .filter(Show.venue_id == Venue.id, Show.start_time >= now) \
+        .correlate(Venue).as_scalar()
+    inputData = batched_rows(
+        db.session.query(Venue.state, Venue.city, Venue.id, Venue.version, Venue.name, upcomingShows),
+        (func.coalesce(Venue.state, ''), func.coalesce(Venue.city, ''), func.coalesce(Venue.name, ''), Venue.id),
+        lambda row: (row.state or '', row.city or '', row.name or '', row.id))
+
+    def area_venues(rows, collected):
+        for _, _, venueId, version, venueName, numUpcomingShows in rows:
+            collected.append({
+                "id": venueId,
+                "version": version,
+                "name": venueName,
+                "num_upcoming_shows": numUpcomingShows
             })
+            yield collected[-1]
 
-        # check if area is already in outputData
-        areaInOutput = False;
-        for data in outputData:
-            if city == data["city"]:
-                areaInOutput = True
-                data["venues"].append({
-                    "id": venue.id,
-                    "name": venue.name,
-                    "num_upcoming_show": numUpcomingShows
-                })
-
-        # area is not in outputData
-        if areaInOutput == False:
-            outputData.append({
+    def areas():
+        collected = []
+        for (state, city), rows in groupby(inputData, lambda row: (row[0], row[1])):
+            collected.append({"city": city, "state": state, "venues": []})
+            yield {
                 "city": city,
-                "state": venue.state,
-                "venues": [{
-                    "id": venue.id,
-                    "name": venue.name,
-                    "num_upcoming_shows": numUpcomingShows,
-                }]
-            })
-    return render_template('pages/venues.html', areas=outputData);
+                "state": state,
+                "venues": area_venues(rows, collected[-1]["venues"])
+            }
+        cache.set(key, collected, app.config.get('LISTING_CACHE_TTL'))
 
+    return areas()
 
-@app.route('/venues/search', methods=['POST'])
-def search_venues():
-    allVenues = Venue.query.all()
-    search_query = request.form.get("search_term").lower()
+
+def warm_venue_areas():
+    # venue_areas() caches the areas once they have been streamed to the
+    # end, each with its venues, as a render would: list(venue_areas())
+    # alone would skip the venues and cache empty areas
+    for area in venue_areas():
+        list(area["venues"])
+
+
+@app.route('/venues')
+def venues():
+    return stream_template('pages/venues.html', areas=venue_areas())
+
+
+def search_venue_rows(term):
+    # one indexed query: matching venues with a correlated count of their
+    # upcoming shows served by ix_Show_venue_id_start_time
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    upcomingShows = db.session.query(func.count(Show.id)) \
+        .filter(Show.venue_id == Venue.id, Show.start_time >= now) \
+        .correlate(Venue).as_scalar()
     foundVenues = []
-    for venue in allVenues:
-        venueName = venue.name.lower()
-        if search_query in venueName:
-            shows = Show.query.filter(Show.venue_id==venue.id).all()
-            foundVenues.append({
-                "id": venue.id,
-                "name": venue.name,
-                "num_upcoming_shows": len(shows)
-            })
-    response = {
+    for venueId, version, venueName, numUpcomingShows in \
+            db.session.query(Venue.id, Venue.version, Venue.name, upcomingShows) \
+            .filter(Venue.name.ilike(like_pattern(term), escape='\\')) \
+            .order_by(Venue.name):
+        foundVenues.append({
+            "id": venueId,
+            "version": version,
+            "name": venueName,
+            "num_upcoming_shows": numUpcomingShows
+        })
+    return {
         "count": len(foundVenues),
         "data": foundVenues
     }
+
+
+@app.route('/venues/search', methods=['POST'])
+def search_venues():
+    response = cached_search('search:venues', request.form.get('search_term', ''), search_venue_rows)
+    record_access('search:venues', normalize_term(request.form.get('search_term', '')))
     return render_template('pages/search_venues.html', results=response,
                            search_term=request.form.get('search_term', ''))
 
 
-@app.route('/venues/<int:venue_id>')
-def show_venue(venue_id):
-    # shows the venue page with the given venue_id
-    allVenues = Venue.query.all()
-    currentVenue = Venue()
-    for venue in allVenues:
-        if venue.id == venue_id:
-            currentVenue = venue;
-
-    allShows = Show.query.all()
-    showsOfVenues = []
-    for show in allShows:
-        if show.venue_id == venue_id:
-            showsOfVenues.append(show)
-
-    pastShows = []
+def venue_detail(venue_id):
+    # the venue page, cached until the venue, its shows or the artists on them
+    # change, or for DETAIL_CACHE_TTL
+    key = entity_key('venue', venue_id)
+    outputData = cache.get(key)
+    record_cache('detail:venue', outputData is not None)
+    if outputData is not None:
+        return outputData
+
+    currentVenue = Venue.query.get(venue_id)
+    if currentVenue is None:
+        return None
+
+    # upcoming and past shows are separate start_time ranges, so the
+    # upcoming list only touches the current and future Show partitions
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    venueShows = db.session.query(Show.start_time, Artist.id, Artist.version, Artist.name, Artist.image_link) \
+        .join(Artist, Artist.id == Show.artist_id) \
+        .filter(Show.venue_id == venue_id)
     upcomingShows = []
-    date_format = '%Y-%m-%d %H:%M:%S'
-    for show in showsOfVenues:
-        date = datetime.strptime(show.start_time, date_format)
-        if date < datetime.now():
-            pastShows.append(show)
-        else:
-            upcomingShows.append(show)
+    for startTime, artistId, artistVersion, artistName, artistImageLink in \
+            venueShows.filter(Show.start_time >= now).order_by(Show.start_time):
+        upcomingShows.append({
+            "artist_id": artistId,
+            "artist_version": artistVersion,
+            "artist_name": artistName,
+            "artist_image_link": artistImageLink,
+            "start_time": startTime
+        })
+    pastShows = []
+    for startTime, artistId, artistVersion, artistName, artistImageLink in \
+            venueShows.filter(Show.start_time < now).order_by(Show.start_time.desc()):
+        pastShows.append({
+            "artist_id": artistId,
+            "artist_version": artistVersion,
+            "artist_name": artistName,
+            "artist_image_link": artistImageLink,
+            "start_time": startTime
+        })
 
     pastShowsCount = len(pastShows)
     upcomingShowsCount = len(upcomingShows)
@@ -203,7 +542,7 @@ def show_venue(venue_id):
     outputData = {
         "id": currentVenue.id,
         "name": currentVenue.name,
-        "genres": currentVenue.genres,
+        "genres": parse_genres(currentVenue.genres),
         "address": currentVenue.address,
         "city": currentVenue.city,
         "state": currentVenue.state,
@@ -218,8 +557,17 @@ def show_venue(venue_id):
         "past_shows_count": pastShowsCount,
         "upcoming_shows_count": upcomingShowsCount,
     }
+    cache.set(key, outputData, app.config.get('DETAIL_CACHE_TTL'))
+    return outputData
 
 
+@app.route('/venues/<int:venue_id>')
+def show_venue(venue_id):
+    # shows the venue page with the given venue_id
+    outputData = venue_detail(venue_id)
+    if outputData is None:
+        abort(404)
+    record_access('venue', venue_id)
     return render_template('pages/show_venue.html', venue=outputData)
 
 
@@ -242,7 +590,7 @@ def create_venue_submission():
         newVenue.state = data.get("state")
         newVenue.address = data.get("address")
         newVenue.phone = data.get("phone")
-        newVenue.genres = data.get("genres")
+        newVenue.genres = form_genres(data)
         newVenue.facebook_link = data.get("facebook_link")
         newVenue.image_link = data.get("image_link")
         newVenue.website_link = data.get("website_link")
@@ -251,98 +599,131 @@ def create_venue_submission():
             seekingTalent = True
         newVenue.seeking_talent = seekingTalent
         newVenue.seeking_description = data.get("seeking_description")
+        location = geocode(db, Gazetteer, newVenue.city, newVenue.state)
+        newVenue.latitude = location["latitude"]
+        newVenue.longitude = location["longitude"]
+        newVenue.geohash = location["geohash"]
         db.session.add(newVenue)
         db.session.commit()
+        invalidate('search:venues', 'search:all', 'home', 'areas')
         # on successful db insert, flash success
         flash('Venue ' + request.form['name'] + ' was successfully listed!')
     except:
         db.session.rollback()
         flash('An error occurred. Venue ' + data.get("name") + ' could not be listed.')
     finally:
-        return render_template('pages/home.html')
+        return render_home()
 
 
-@app.route('/venues/<venue_id>', methods=['DELETE'])
+@app.route('/venues/<int:venue_id>', methods=['DELETE'])
 def delete_venue(venue_id):
-    # TODO: Complete this endpoint for taking a venue_id, and using
-    # SQLAlchemy ORM to delete a record. Handle cases where the session commit could fail.
+    # a single set-based DELETE; the venue's shows are removed by the
+    # ON DELETE CASCADE on Show.venue_id in the same transaction, after
+    # their rollups are subtracted
+    deleted = 0
     try:
-        Venue.query.filter(Venue.id == venue_id).delete
-        print(Venue.query.filter(Venue.id == venue_id))
+        rollups.venue_deleting(venue_id)
+        deleted = Venue.query.filter(Venue.id == venue_id).delete(synchronize_session=False)
         db.session.commit()
+        invalidate('search:venues', 'search:artists', 'search:all', 'home', 'areas',
+                   'venue:%d' % venue_id, 'detail:artist')
     except:
         db.session.rollback()
-    # BONUS CHALLENGE: Implement a button to delete a Venue on a Venue Page, have it so that
-    # clicking that button delete it from the db then redirect the user to the homepage
-    return None
+        return jsonify({"success": False}), 500
+    if not deleted:
+        return jsonify({"success": False}), 404
+    return jsonify({"success": True})
 
 
 #  Artists
 #  ----------------------------------------------------------------
 @app.route('/artists')
 def artists():
-    data = []
-    artists = Artist.query.all()
-    for artist in artists:
-        data.append({
-            "id": artist.id,
-            "name": artist.name
+    # only the columns the cards render, streamed as plain rows: no Artist
+    # objects, identity map entries or per-row dicts
+    rows = batched_rows(db.session.query(Artist.id, Artist.version, Artist.name),
+                        (func.coalesce(Artist.name, ''), Artist.id), lambda row: (row.name or '', row.id))
+    return stream_template('pages/artists.html', artists=rows)
+
+
+def search_artist_rows(term):
+    # one indexed query: matching artists with a correlated count of their
+    # upcoming shows served by ix_Show_artist_id_start_time
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    upcomingShows = db.session.query(func.count(Show.id)) \
+        .filter(Show.artist_id == Artist.id, Show.start_time >= now) \
+        .correlate(Artist).as_scalar()
+    foundArtists = []
+    for artistId, version, artistName, numUpcomingShows in \
+            db.session.query(Artist.id, Artist.version, Artist.name, upcomingShows) \
+            .filter(Artist.name.ilike(like_pattern(term), escape='\\')) \
+            .order_by(Artist.name):
+        foundArtists.append({
+            "id": artistId,
+            "version": version,
+            "name": artistName,
+            "num_upcoming_shows": numUpcomingShows
         })
-    return render_template('pages/artists.html', artists=data)
+    return {
+        "count": len(foundArtists),
+        "data": foundArtists
+    }
 
 
 @app.route('/artists/search', methods=['POST'])
 def search_artists():
-    allArtists = Artist.query.all()
-    search_query = request.form.get("search_term").lower()
-    foundArtists = []
-    for artist in allArtists:
-        artistName = artist.name.lower()
-        if search_query in artistName:
-            shows = Show.query.filter(Show.artist_id == artist.id).all()
-            foundArtists.append({
-                "id": artist.id,
-                "name": artist.name,
-                "num_upcoming_shows": len(shows)
-            })
-    response = {
-        "count": len(foundArtists),
-        "data": foundArtists
-    }
+    response = cached_search('search:artists', request.form.get('search_term', ''), search_artist_rows)
+    record_access('search:artists', normalize_term(request.form.get('search_term', '')))
     return render_template('pages/search_artists.html', results=response,
                            search_term=request.form.get('search_term', ''))
 
 
-@app.route('/artists/<int:artist_id>')
-def show_artist(artist_id):
-    artists = Artist.query.all()
-    currentArtist = Artist()
-    for artist in artists:
-        if artist.id == artist_id:
-            currentArtist = artist
-
-    allShows = Show.query.all()
-    showsOfArtists = []
-    for show in allShows:
-        if show.artist_id == artist_id:
-            showsOfArtists.append(show)
-
-    pastShows = []
+def artist_detail(artist_id):
+    # the artist page, cached until the artist, its shows or the venues on them
+    # change, or for DETAIL_CACHE_TTL
+    key = entity_key('artist', artist_id)
+    outputData = cache.get(key)
+    record_cache('detail:artist', outputData is not None)
+    if outputData is not None:
+        return outputData
+
+    currentArtist = Artist.query.get(artist_id)
+    if currentArtist is None:
+        return None
+
+    # upcoming and past shows are separate start_time ranges, so the
+    # upcoming list only touches the current and future Show partitions
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    artistShows = db.session.query(Show.start_time, Venue.id, Venue.version, Venue.name, Venue.image_link) \
+        .join(Venue, Venue.id == Show.venue_id) \
+        .filter(Show.artist_id == artist_id)
     upcomingShows = []
-    date_format = '%Y-%m-%d %H:%M:%S'
-    for show in showsOfArtists:
-        date = datetime.strptime(show.start_time, date_format)
-        if date < datetime.now():
-            pastShows.append(show)
-        else:
-            upcomingShows.append(show)
+    for startTime, venueId, venueVersion, venueName, venueImageLink in \
+            artistShows.filter(Show.start_time >= now).order_by(Show.start_time):
+        upcomingShows.append({
+            "venue_id": venueId,
+            "venue_version": venueVersion,
+            "venue_name": venueName,
+            "venue_image_link": venueImageLink,
+            "start_time": startTime
+        })
+    pastShows = []
+    for startTime, venueId, venueVersion, venueName, venueImageLink in \
+            artistShows.filter(Show.start_time < now).order_by(Show.start_time.desc()):
+        pastShows.append({
+            "venue_id": venueId,
+            "venue_version": venueVersion,
+            "venue_name": venueName,
+            "venue_image_link": venueImageLink,
+            "start_time": startTime
+        })
 
     pastShowsCount = len(pastShows)
     upcomingShowsCount = len(upcomingShows)
     outputData = {
         "id": currentArtist.id,
         "name": currentArtist.name,
-        "genres": currentArtist.genres,
+        "genres": parse_genres(currentArtist.genres),
         "city": currentArtist.city,
         "state": currentArtist.state,
         "phone": currentArtist.phone,
@@ -356,75 +737,127 @@ def show_artist(artist_id):
         "website": currentArtist.website,
         "seeking_description": currentArtist.seeking_description
     }
+    cache.set(key, outputData, app.config.get('DETAIL_CACHE_TTL'))
+    return outputData
+
+
+@app.route('/artists/<int:artist_id>')
+def show_artist(artist_id):
+    # shows the artist page with the given artist_id
+    outputData = artist_detail(artist_id)
+    if outputData is None:
+        abort(404)
+    record_access('artist', artist_id)
     return render_template('pages/show_artist.html', artist=outputData)
 
 
+@app.route('/artists/<int:artist_id>', methods=['DELETE'])
+def delete_artist(artist_id):
+    # a single set-based DELETE; the artist's shows are removed by the
+    # ON DELETE CASCADE on Show.artist_id in the same transaction, after
+    # their rollups are subtracted
+    deleted = 0
+    try:
+        rollups.artist_deleting(artist_id)
+        deleted = Artist.query.filter(Artist.id == artist_id).delete(synchronize_session=False)
+        db.session.commit()
+        invalidate('search:venues', 'search:artists', 'search:all', 'home', 'areas',
+                   'artist:%d' % artist_id, 'detail:venue')
+    except:
+        db.session.rollback()
+        return jsonify({"success": False}), 500
+    if not deleted:
+        return jsonify({"success": False}), 404
+    return jsonify({"success": True})
+
+
 #  Update
 #  ----------------------------------------------------------------
 @app.route('/artists/<int:artist_id>/edit', methods=['GET'])
 def edit_artist(artist_id):
-    form = ArtistForm()
-    artist = Artist.query.filter(Artist.id == artist_id).all()[0]
+    artist = Artist.query.get(artist_id)
+    if artist is None:
+        abort(404)
+    form = ArtistForm(obj=artist)
+    form.genres.data = parse_genres(artist.genres)
+    form.website_link.data = artist.website
     return render_template('forms/edit_artist.html', form=form, artist=artist)
 
 
 @app.route('/artists/<int:artist_id>/edit', methods=['POST'])
 def edit_artist_submission(artist_id):
     data = request.form
-
+    submitted = blank_as_null({
+        "name": data.get("name"),
+        "city": data.get("city"),
+        "state": data.get("state"),
+        "phone": data.get("phone"),
+        "genres": form_genres(data),
+        "seeking_venue": data.get("seeking_venue") == "y",
+        "image_link": data.get("image_link"),
+        "facebook_link": data.get("facebook_link"),
+        "seeking_description": data.get("seeking_description"),
+        "website": data.get("website_link"),
+    })
     try:
-        editArtist = Artist.query.get(artist_id)
-        editArtist.name = data.get("name")
-        editArtist.city = data.get("city")
-        editArtist.state = data.get("state")
-        editArtist.phone = data.get("phone")
-        editArtist.genres = data.get("genres")
-        seeking_venue = False
-        if data.get("seeking_venue") == "y":
-            seeking_venue = True
-        editArtist.seeking_venue = seeking_venue
-        editArtist.image_link = data.get("image_link")
-        editArtist.facebook_link = data.get("facebook_link")
-        editArtist.seeking_description = data.get("seeking_description")
-        editArtist.website = data.get("website_link")
+        changed = save_changes(Artist, artist_id, submitted, data.get("version", type=int))
+        if changed:
+            rollups.artist_edited(artist_id, changed)
         db.session.commit()
     except:
         db.session.rollback()
-    finally:
-        return redirect(url_for('show_artist', artist_id=artist_id))
-
+        changed = {}
+    if changed is None:
+        flash('Artist ' + str(data.get("name")) + ' was changed by someone else while you were editing. '
+              'Your changes were not saved, please review and edit again.')
+        return redirect(url_for('edit_artist', artist_id=artist_id))
+    if changed:
+        invalidate('artist:%d' % artist_id, *changed_namespaces(ARTIST_CACHED_COLUMNS, changed))
+    return redirect(url_for('show_artist', artist_id=artist_id))
 
 
 @app.route('/venues/<int:venue_id>/edit', methods=['GET'])
 def edit_venue(venue_id):
-    form = VenueForm()
     venue = Venue.query.get(venue_id)
+    if venue is None:
+        abort(404)
+    form = VenueForm(obj=venue)
+    form.genres.data = parse_genres(venue.genres)
+    form.website_link.data = venue.website
     return render_template('forms/edit_venue.html', form=form, venue=venue)
 
 
 @app.route('/venues/<int:venue_id>/edit', methods=['POST'])
 def edit_venue_submission(venue_id):
-    data = request.form;
-
+    data = request.form
+    submitted = blank_as_null({
+        "name": data.get("name"),
+        "city": data.get("city"),
+        "address": data.get("address"),
+        "state": data.get("state"),
+        "phone": data.get("phone"),
+        "genres": form_genres(data),
+        "image_link": data.get("image_link"),
+        "facebook_link": data.get("facebook_link"),
+        "website": data.get("website_link"),
+        "seeking_talent": data.get("seeking_talent") == "y",
+        "seeking_description": data.get("seeking_description"),
+    })
     try:
-        editVenue = Venue.query.get(venue_id)
-        editVenue.name = data.get("name")
-        editVenue.city = data.get("city")
-        editVenue.address = data.get("address")
-        editVenue.state = data.get("state")
-        editVenue.phone = data.get("phone")
-        editVenue.genres = data.get("genres")
-        editVenue.image_link = data.get("image_link")
-        editVenue.facebook_link = data.get("facebook_link")
-        editVenue.website = data.get("website_link")
-        seekingTalent = False;
-        if data.get("seeking_talent")=="y":
-            seekingTalent = True
-        editVenue.seeking_talent = seekingTalent
-        editVenue.seeking_description = data.get("seeking_description")
+        submitted.update(geocode(db, Gazetteer, submitted["city"], submitted["state"]))
+        changed = save_changes(Venue, venue_id, submitted, data.get("version", type=int))
+        if changed:
+            rollups.venue_edited(venue_id, changed)
         db.session.commit()
     except:
         db.session.rollback()
+        changed = {}
+    if changed is None:
+        flash('Venue ' + str(data.get("name")) + ' was changed by someone else while you were editing. '
+              'Your changes were not saved, please review and edit again.')
+        return redirect(url_for('edit_venue', venue_id=venue_id))
+    if changed:
+        invalidate('venue:%d' % venue_id, *changed_namespaces(VENUE_CACHED_COLUMNS, changed))
     return redirect(url_for('show_venue', venue_id=venue_id))
 
 
@@ -446,7 +879,7 @@ def create_artist_submission():
         newArtist.city = data.get("city")
         newArtist.state = data.get("state")
         newArtist.phone = data.get("phone")
-        newArtist.genres = data.get("genres")
+        newArtist.genres = form_genres(data)
         seeking_venue = False
         if data.get("seeking_venue")=="y":
             seeking_venue = True
@@ -457,13 +890,14 @@ def create_artist_submission():
         newArtist.website = data.get("website_link")
         db.session.add(newArtist)
         db.session.commit()
+        invalidate('search:artists', 'search:all', 'home')
         # on successful db insert, flash success
         flash('Artist ' + request.form['name'] + ' was successfully listed!')
     except:
         flash('An error occurred. Artist ' + data.get("name") + ' could not be listed.')
         db.session.rollback()
     finally:
-        return render_template('pages/home.html')
+        return render_home()
 
 
 #  Shows
@@ -471,29 +905,17 @@ def create_artist_submission():
 
 @app.route('/shows')
 def shows():
-    # displays list of shows at /shows
-
-    inputData = Show.query.all()
-    outputData = []
-    venues = Venue.query.all()
-    artists = Artist.query.all()
-
-    for show in inputData:
-        for venue in venues:
-            if venue.id == show.venue_id:
-                showVenue = venue
-        for artist in artists:
-            if artist.id == show.artist_id:
-                showArtist = artist
-        outputData.append({
-            "venue_id": show.venue_id,
-            "venue_name": showVenue.name,
-            "artist_id": show.artist_id,
-            "artist_name": showArtist.name,
-            "artist_image_link": showArtist.image_link,
-            "start_time": show.start_time
-        })
-    return render_template('pages/shows.html', shows=outputData)
+    # displays list of shows at /shows, streamed as plain rows of the
+    # columns the tiles render (and the id the batches are ordered by)
+    query = db.session.query(Show.venue_id, Venue.version.label('venue_version'), Venue.name.label('venue_name'),
+                             Show.artist_id, Artist.version.label('artist_version'),
+                             Artist.name.label('artist_name'), Artist.image_link.label('artist_image_link'),
+                             Show.start_time, Show.id) \
+        .join(Venue, Venue.id == Show.venue_id) \
+        .join(Artist, Artist.id == Show.artist_id)
+    rows = batched_rows(query, (Show.start_time, Show.id), lambda row: (row.start_time, row.id))
+
+    return stream_template('pages/shows.html', shows=rows)
 
 
 @app.route('/shows/create')
@@ -503,24 +925,589 @@ def create_shows():
     return render_template('forms/new_show.html', form=form)
 
 
+# days between the occurrences of a recurring show
+SHOW_REPEATS = {'weekly': 7, 'biweekly': 14}
+SHOW_MAX_OCCURRENCES = 53
+SHOW_MAX_LINEUP = 20
+
+
+def parse_lineup(value):
+    # '3, 7 12' -> [3, 7, 12], in order and without repeats
+    artistIds = []
+    for part in (value or '').replace(',', ' ').split():
+        if int(part) not in artistIds:
+            artistIds.append(int(part))
+    return artistIds
+
+
+def expand_shows(data):
+    # one Show row per artist of the line-up and occurrence of the show
+    venueId = int(data['venue_id'])
+    artistIds = parse_lineup(data['artist_id'])
+    if not artistIds or len(artistIds) > SHOW_MAX_LINEUP:
+        raise ValueError('line-up size')
+    startTime = dateutil.parser.parse(data['start_time'])
+    occurrences = [startTime]
+    if data.get('repeat') in SHOW_REPEATS:
+        until = dateutil.parser.parse(data.get('repeat_until') or '').replace(hour=23, minute=59, second=59)
+        step = timedelta(days=SHOW_REPEATS[data['repeat']])
+        while occurrences[-1] + step <= until:
+            if len(occurrences) == SHOW_MAX_OCCURRENCES:
+                raise ValueError('too many occurrences')
+            occurrences.append(occurrences[-1] + step)
+    return [{"venue_id": venueId, "artist_id": artistId, "start_time": occurrence.strftime('%Y-%m-%d %H:%M:%S')}
+            for occurrence in occurrences for artistId in artistIds]
+
+
+def find_show_conflicts(newShows):
+    # existing shows at the venue or with one of the artists that start less
+    # than SHOW_DURATION_MINUTES before or after a new show, found in one
+    # statement: a window per start time, each a range over
+    # ix_Show_venue_id_start_time and ix_Show_artist_id_start_time
+    duration = timedelta(minutes=app.config.get('SHOW_DURATION_MINUTES', 180))
+    windows = {}
+    for show in newShows:
+        venueIds, artistIds = windows.setdefault(show["start_time"], (set(), set()))
+        venueIds.add(show["venue_id"])
+        artistIds.add(show["artist_id"])
+    overlaps = []
+    for startTime, (venueIds, artistIds) in sorted(windows.items()):
+        start = datetime.strptime(startTime, '%Y-%m-%d %H:%M:%S')
+        during = and_(Show.start_time > (start - duration).strftime('%Y-%m-%d %H:%M:%S'),
+                      Show.start_time < (start + duration).strftime('%Y-%m-%d %H:%M:%S'))
+        overlaps.append(and_(Show.venue_id.in_(sorted(venueIds)), during))
+        overlaps.append(and_(Show.artist_id.in_(sorted(artistIds)), during))
+    return db.session.query(Show.start_time, Show.venue_id, Show.artist_id) \
+        .filter(or_(*overlaps)) \
+        .order_by(Show.start_time) \
+        .all()
+
+
 @app.route('/shows/create', methods=['POST'])
 def create_show_submission():
+    # a show, a line-up of several artists (comma-separated artist ids) and/or
+    # a weekly residency, expanded here and inserted in one transaction with
+    # a single batched INSERT
     data = request.form
     try:
-        newShow = Show()
-        newShow.artist_id = data['artist_id']
-        newShow.venue_id = data['venue_id']
-        newShow.start_time = data['start_time']
-        db.session.add(newShow)
-        db.session.commit()
-
-        # on successful db insert, flash success
-        flash('Show was successfully listed!')
+        newShows = expand_shows(data)
+    except (KeyError, ValueError, OverflowError):
+        flash('Show could not be listed: check the IDs and dates. A line-up has at most %d artists '
+              'and a show repeats at most %d times.' % (SHOW_MAX_LINEUP, SHOW_MAX_OCCURRENCES))
+        return render_home()
+    try:
+        conflicts = find_show_conflicts(newShows)
+        if conflicts:
+            flash('Show could not be listed, the venue or an artist is already booked on '
+                  + ', '.join(sorted(set(startTime for startTime, _, _ in conflicts))[:5]) + '.')
+        else:
+            db.session.execute(Show.__table__.insert(), newShows)
+            rollups.shows_created(newShows)
+            db.session.commit()
+            invalidate('search:venues', 'search:artists', 'search:all', 'home', 'areas',
+                       *sorted(set(['venue:%d' % show["venue_id"] for show in newShows] +
+                                   ['artist:%d' % show["artist_id"] for show in newShows])))
+
+            # on successful db insert, flash success
+            if len(newShows) == 1:
+                flash('Show was successfully listed!')
+            else:
+                flash('%d shows were successfully listed!' % len(newShows))
     except:
         db.session.rollback()
         flash('Show could not be listed!')
     finally:
-        return render_template('pages/home.html')
+        return render_home()
+
+
+#  Search
+#  ----------------------------------------------------------------
+
+SEARCH_LIMIT = 20
+
+
+def search_all_rows(term):
+    # venues, artists and upcoming shows matching the term by name, city or
+    # genre, ranked and counted per kind in one statement; the ILIKE filters
+    # are served by the shared trigram indexes
+    pattern = like_pattern(term)
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+    def rank(name):
+        return case([(func.lower(name) == term, 0),
+                     (func.lower(name).like(like_pattern(term)[1:], escape='\\'), 1),
+                     (name.ilike(pattern, escape='\\'), 2)], else_=3)
+
+    venueResults = select([
+        literal('venues', db.String).label('kind'), Venue.id.label('id'), Venue.name.label('title'),
+        cast(null(), db.String).label('subtitle'),
+        Venue.city.label('city'), Venue.state.label('state'), Venue.image_link.label('image_link'),
+        cast(null(), db.String).label('start_time'), Venue.id.label('venue_id'), cast(null(), db.Integer).label('artist_id'),
+        Venue.version.label('venue_version'), cast(null(), db.Integer).label('artist_version'),
+        rank(Venue.name).label('rank')
+    ]).where(or_(Venue.name.ilike(pattern, escape='\\'),
+                 Venue.city.ilike(pattern, escape='\\'),
+                 Venue.genres.ilike(pattern, escape='\\')))
+    artistResults = select([
+        literal('artists', db.String).label('kind'), Artist.id.label('id'), Artist.name.label('title'),
+        cast(null(), db.String).label('subtitle'),
+        Artist.city.label('city'), Artist.state.label('state'), Artist.image_link.label('image_link'),
+        cast(null(), db.String).label('start_time'), cast(null(), db.Integer).label('venue_id'), Artist.id.label('artist_id'),
+        cast(null(), db.Integer).label('venue_version'), Artist.version.label('artist_version'),
+        rank(Artist.name).label('rank')
+    ]).where(or_(Artist.name.ilike(pattern, escape='\\'),
+                 Artist.city.ilike(pattern, escape='\\'),
+                 Artist.genres.ilike(pattern, escape='\\')))
+    showResults = select([
+        literal('shows', db.String).label('kind'), Show.id.label('id'), Artist.name.label('title'),
+        Venue.name.label('subtitle'),
+        Venue.city.label('city'), Venue.state.label('state'), Artist.image_link.label('image_link'),
+        Show.start_time.label('start_time'), Show.venue_id.label('venue_id'), Show.artist_id.label('artist_id'),
+        Venue.version.label('venue_version'), Artist.version.label('artist_version'),
+        rank(Artist.name).label('rank')
+    ]).select_from(Show.__table__.join(Artist.__table__).join(Venue.__table__)) \
+        .where(Show.start_time >= now) \
+        .where(or_(Artist.name.ilike(pattern, escape='\\'),
+                   Venue.name.ilike(pattern, escape='\\'),
+                   Venue.city.ilike(pattern, escape='\\'),
+                   Artist.genres.ilike(pattern, escape='\\')))
+
+    results = union_all(venueResults, artistResults, showResults).alias('results')
+    ranked = select([
+        results,
+        func.row_number().over(partition_by=results.c.kind,
+                               order_by=(results.c.rank, results.c.start_time, results.c.title)).label('position'),
+        func.count().over(partition_by=results.c.kind).label('total')
+    ]).alias('ranked')
+    rows = db.session.execute(
+        select([ranked]).where(ranked.c.position <= SEARCH_LIMIT).order_by(ranked.c.kind, ranked.c.position))
+
+    response = {"count": 0}
+    for kind in ('venues', 'artists', 'shows'):
+        response[kind] = {"count": 0, "data": []}
+    for row in rows:
+        group = response[row.kind]
+        group["count"] = row.total
+        group["data"].append({
+            "id": row.id,
+            "name": row.title,
+            "venue_name": row.subtitle,
+            "city": row.city,
+            "state": row.state,
+            "image_link": row.image_link,
+            "start_time": row.start_time,
+            "venue_id": row.venue_id,
+            "venue_version": row.venue_version,
+            "artist_id": row.artist_id,
+            "artist_version": row.artist_version
+        })
+    response["count"] = sum(response[kind]["count"] for kind in ('venues', 'artists', 'shows'))
+    return response
+
+
+@app.route('/search', methods=['GET', 'POST'])
+def search():
+    searchTerm = request.values.get('search_term', '')
+    response = cached_search('search:all', searchTerm, search_all_rows)
+    record_access('search:all', normalize_term(searchTerm))
+    return render_template('pages/search.html', results=response, search_term=searchTerm)
+
+
+#  Calendar
+#  ----------------------------------------------------------------
+
+CALENDAR_DAYS = 365
+CALENDAR_MAX_DAYS = 731
+
+
+def parse_calendar_range(args):
+    # returns the [start, end) date range requested via ?start=&end=,
+    # defaulting to the next CALENDAR_DAYS days
+    start = date.today()
+    if args.get('start'):
+        start = datetime.strptime(args['start'], '%Y-%m-%d').date()
+    end = start + timedelta(days=CALENDAR_DAYS)
+    if args.get('end'):
+        end = datetime.strptime(args['end'], '%Y-%m-%d').date()
+    if end <= start or (end - start).days > CALENDAR_MAX_DAYS:
+        raise ValueError('invalid calendar range')
+    return start, end
+
+
+def build_calendar(shows, start, end):
+    # buckets (start_time, id, name) rows into one entry per day of the range
+    bookedDays = {}
+    for startTime, otherId, otherName in shows:
+        bookedDays.setdefault(startTime[:10], []).append({
+            "id": otherId,
+            "name": otherName,
+            "start_time": startTime
+        })
+
+    days = []
+    day = start
+    while day < end:
+        dayShows = bookedDays.get(day.isoformat(), [])
+        days.append({
+            "date": day.isoformat(),
+            "booked": len(dayShows) > 0,
+            "shows": dayShows
+        })
+        day += timedelta(days=1)
+    return days
+
+
+CALENDAR_RANGE_ERROR = "start and end must be YYYY-MM-DD, at most " + str(CALENDAR_MAX_DAYS) + " days apart"
+
+
+def calendar_queries(kind, entityId, start, end):
+    # (name, shows) statements for the calendar of a venue or an artist, run
+    # by the views below and by the async read path in asgi.py; the shows are
+    # a single range scan over ix_Show_<kind>_id_start_time
+    model, column, other, otherColumn = (Venue, Show.venue_id, Artist, Show.artist_id) if kind == 'venue' \
+        else (Artist, Show.artist_id, Venue, Show.venue_id)
+    nameQuery = select([model.name]).where(model.id == entityId)
+    showsQuery = select([Show.start_time, other.id, other.name]) \
+        .select_from(Show.__table__.join(other.__table__, other.id == otherColumn)) \
+        .where(and_(column == entityId,
+                    Show.start_time >= start.isoformat(),
+                    Show.start_time < end.isoformat())) \
+        .order_by(Show.start_time)
+    return nameQuery, showsQuery
+
+
+def calendar_response(kind, entityId, name, shows, start, end):
+    days = build_calendar(shows, start, end)
+    return {
+        kind + "_id": entityId,
+        "name": name,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "booked_count": sum(1 for day in days if day["booked"]),
+        "days": days
+    }
+
+
+def entity_calendar(kind, entityId):
+    try:
+        start, end = parse_calendar_range(request.args)
+    except ValueError:
+        return jsonify({"error": CALENDAR_RANGE_ERROR}), 400
+    nameQuery, showsQuery = calendar_queries(kind, entityId, start, end)
+    name = db.session.execute(nameQuery).scalar()
+    if name is None:
+        return jsonify({"error": kind + " not found"}), 404
+    shows = db.session.execute(showsQuery).fetchall()
+    return jsonify(calendar_response(kind, entityId, name, shows, start, end))
+
+
+@app.route('/venues/<int:venue_id>/calendar')
+def venue_calendar(venue_id):
+    return entity_calendar('venue', venue_id)
+
+
+@app.route('/artists/<int:artist_id>/calendar')
+def artist_calendar(artist_id):
+    return entity_calendar('artist', artist_id)
+
+
+#  Matches
+#  ----------------------------------------------------------------
+
+MATCH_LIMIT = 10
+MATCH_MAX_LIMIT = 50
+MATCH_CANDIDATES = 500
+MATCH_ACTIVITY_DAYS = 180
+
+
+def find_match_candidates(model, seekingColumn, target):
+    # seeking rows are fetched only through index-served prefilters: the
+    # same city and the same state (ix_<model>_seeking_state_city, whose
+    # predicate is the bare seeking column) and each of the target's genres
+    # (ix_<model>_genres_trgm), newest first and MATCH_CANDIDATES at most
+    # each. Of those, the statement returns the MATCH_CANDIDATES that score
+    # best on genres and location (the weights of rank_matches, which adds
+    # recent activity), newest first on ties
+    columns = [model.id, model.name, model.city, model.state, model.genres, model.image_link, model.created_at]
+
+    def newest(*criteria):
+        return select(columns).where(and_(seekingColumn, *criteria)) \
+            .order_by(model.created_at.desc(), model.id) \
+            .limit(MATCH_CANDIDATES).alias().select()
+    targetGenres = sorted(set(parse_genres(target.genres)))
+    prefilters = [newest(model.state == target.state, model.city == target.city),
+                  newest(model.state == target.state)]
+    for genre in targetGenres:
+        prefilters.append(newest(model.genres.ilike(like_pattern(genre), escape='\\')))
+    candidates = union(*prefilters).alias('candidates')
+
+    storedGenres = func.replace(func.replace(func.replace(func.replace(
+        candidates.c.genres, '{', ''), '}', ''), '"', ''), ', ', ',')
+    delimited = literal(',') + func.coalesce(storedGenres, '') + literal(',')
+    relevance = case([(and_(candidates.c.state == target.state, candidates.c.city == target.city), 3),
+                      (candidates.c.state == target.state, 1)], else_=0)
+    for genre in targetGenres:
+        pattern = '%,' + like_pattern(genre)[1:-1] + ',%'
+        relevance = relevance + case([(delimited.like(pattern, escape='\\'), 3)], else_=0)
+    return db.session.execute(
+        select([candidates.c.id, candidates.c.name, candidates.c.city, candidates.c.state, candidates.c.genres,
+                candidates.c.image_link])
+        .order_by(relevance.desc(), candidates.c.created_at.desc(), candidates.c.id)
+        .limit(MATCH_CANDIDATES)).fetchall()
+
+
+def rank_matches(target, candidates, recentShows, limit):
+    # genre overlap weighs most, then location, then recent activity
+    targetGenres = set(parse_genres(target.genres))
+    matches = []
+    for candidate in candidates:
+        sharedGenres = sorted(targetGenres.intersection(parse_genres(candidate.genres)))
+        sameState = candidate.state == target.state
+        sameCity = sameState and candidate.city == target.city
+        recent = recentShows.get(candidate.id, 0)
+        score = 3 * len(sharedGenres) + 2 * sameCity + sameState + 0.5 * min(recent, 4)
+        if score == 0:
+            continue
+        matches.append({
+            "id": candidate.id,
+            "name": candidate.name,
+            "city": candidate.city,
+            "state": candidate.state,
+            "image_link": candidate.image_link,
+            "shared_genres": sharedGenres,
+            "recent_shows": recent,
+            "score": score
+        })
+    matches.sort(key=lambda match: (-match["score"], match["id"]))
+    return matches[:limit]
+
+
+def parse_match_limit(args):
+    try:
+        limit = int(args.get('limit', MATCH_LIMIT))
+    except ValueError:
+        limit = MATCH_LIMIT
+    return max(1, min(limit, MATCH_MAX_LIMIT))
+
+
+@app.route('/venues/<int:venue_id>/matches')
+def venue_matches(venue_id):
+    # ranks artists seeking a venue for this venue
+    venue = db.session.query(Venue.id, Venue.city, Venue.state, Venue.genres) \
+        .filter(Venue.id == venue_id).first()
+    if venue is None:
+        return jsonify({"error": "venue not found"}), 404
+
+    candidates = find_match_candidates(Artist, Artist.seeking_venue, venue)
+    since = (datetime.now() - timedelta(days=MATCH_ACTIVITY_DAYS)).strftime('%Y-%m-%d %H:%M:%S')
+    recentShows = dict(db.session.query(Show.artist_id, func.count(Show.id))
+                       .filter(Show.artist_id.in_([candidate.id for candidate in candidates]),
+                               Show.start_time >= since)
+                       .group_by(Show.artist_id)
+                       .all()) if candidates else {}
+    matches = rank_matches(venue, candidates, recentShows, parse_match_limit(request.args))
+    return jsonify({
+        "venue_id": venue_id,
+        "count": len(matches),
+        "data": matches
+    })
+
+
+@app.route('/artists/<int:artist_id>/matches')
+def artist_matches(artist_id):
+    # ranks venues seeking talent for this artist
+    artist = db.session.query(Artist.id, Artist.city, Artist.state, Artist.genres) \
+        .filter(Artist.id == artist_id).first()
+    if artist is None:
+        return jsonify({"error": "artist not found"}), 404
+
+    candidates = find_match_candidates(Venue, Venue.seeking_talent, artist)
+    since = (datetime.now() - timedelta(days=MATCH_ACTIVITY_DAYS)).strftime('%Y-%m-%d %H:%M:%S')
+    recentShows = dict(db.session.query(Show.venue_id, func.count(Show.id))
+                       .filter(Show.venue_id.in_([candidate.id for candidate in candidates]),
+                               Show.start_time >= since)
+                       .group_by(Show.venue_id)
+                       .all()) if candidates else {}
+    matches = rank_matches(artist, candidates, recentShows, parse_match_limit(request.args))
+    return jsonify({
+        "artist_id": artist_id,
+        "count": len(matches),
+        "data": matches
+    })
+
+
+#  Nearby
+#  ----------------------------------------------------------------
+
+NEARBY_RADIUS_KM = 25
+NEARBY_MAX_RADIUS_KM = 200
+NEARBY_LIMIT = 20
+NEARBY_MAX_LIMIT = 100
+NEARBY_SHOWS_PER_VENUE = 5
+
+
+def parse_nearby_args(args):
+    # (latitude, longitude, radius in km, limit) from ?lat=&lng=&radius=&limit=
+    latitude, longitude = float(args['lat']), float(args['lng'])
+    radius = float(args.get('radius', NEARBY_RADIUS_KM))
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180 and 0 < radius <= NEARBY_MAX_RADIUS_KM):
+        raise ValueError('invalid location')
+    try:
+        limit = int(args.get('limit', NEARBY_LIMIT))
+    except ValueError:
+        limit = NEARBY_LIMIT
+    return latitude, longitude, radius, max(1, min(limit, NEARBY_MAX_LIMIT))
+
+
+NEARBY_ARGS_ERROR = "lat and lng are required, radius must be at most " + str(NEARBY_MAX_RADIUS_KM) + " km"
+
+
+def nearby_venues_query(latitude, longitude, radius, limit):
+    # the `limit` venues nearest within the radius, nearest first. The
+    # geohash cells covering the circle are a few range scans over
+    # ix_Venue_geohash; the database orders those venues by the haversine
+    # term, which grows with the great-circle distance (and wraps around the
+    # antimeridian by itself), drops the ones in the corners and returns
+    # only the nearest. On sqlite this needs its math functions (3.35+)
+    minLat, maxLat, minLng, maxLng = bounding_box(latitude, longitude, radius)
+    cells = []
+    for start, end in cell_ranges(covering_cells(latitude, longitude, radius)):
+        cells.append(Venue.geohash >= start if end is None else and_(Venue.geohash >= start, Venue.geohash < end))
+    conditions = [or_(*cells), Venue.latitude.between(minLat, maxLat)]
+    if -180 <= minLng and maxLng <= 180:
+        conditions.append(Venue.longitude.between(minLng, maxLng))
+    halfLat = func.sin(func.radians(Venue.latitude - latitude) / 2)
+    halfLng = func.sin(func.radians(Venue.longitude - longitude) / 2)
+    haversine = halfLat * halfLat \
+        + math.cos(math.radians(latitude)) * func.cos(func.radians(Venue.latitude)) * halfLng * halfLng
+    conditions.append(haversine <= math.sin(radius / (2 * EARTH_RADIUS_KM)) ** 2)
+    return select([Venue.id, Venue.name, Venue.city, Venue.state, Venue.image_link,
+                   Venue.latitude, Venue.longitude]).where(and_(*conditions)) \
+        .order_by(haversine, Venue.id) \
+        .limit(limit)
+
+
+def with_distances(rows, latitude, longitude):
+    # [(distance in km, row)] in the order of the rows
+    return [(distance_km(latitude, longitude, row.latitude, row.longitude), row) for row in rows]
+
+
+def upcoming_shows_query(venueIds):
+    # the next NEARBY_SHOWS_PER_VENUE shows of every venue in one statement
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    ranked = select([
+        Show.venue_id.label('venue_id'), Show.start_time.label('start_time'), Artist.id.label('artist_id'),
+        Artist.name.label('artist_name'), Artist.image_link.label('artist_image_link'),
+        func.row_number().over(partition_by=Show.venue_id, order_by=(Show.start_time, Show.id)).label('position')
+    ]).select_from(Show.__table__.join(Artist.__table__)) \
+        .where(Show.venue_id.in_(venueIds)) \
+        .where(Show.start_time >= now).alias('ranked')
+    return select([ranked]).where(ranked.c.position <= NEARBY_SHOWS_PER_VENUE) \
+        .order_by(ranked.c.venue_id, ranked.c.position)
+
+
+def nearby_response(latitude, longitude, radius, nearby, showRows):
+    shows = {}
+    for row in showRows:
+        shows.setdefault(row.venue_id, []).append({
+            "artist_id": row.artist_id,
+            "artist_name": row.artist_name,
+            "artist_image_link": row.artist_image_link,
+            "start_time": row.start_time
+        })
+    data = []
+    for distance, venue in nearby:
+        data.append({
+            "id": venue.id,
+            "name": venue.name,
+            "city": venue.city,
+            "state": venue.state,
+            "image_link": venue.image_link,
+            "distance_km": round(distance, 2),
+            "upcoming_shows": shows.get(venue.id, [])
+        })
+    return {
+        "latitude": latitude,
+        "longitude": longitude,
+        "radius_km": radius,
+        "count": len(data),
+        "data": data
+    }
+
+
+@app.route('/venues/near')
+def venues_near():
+    # venues within ?radius= km of ?lat=&lng=, nearest first, with their
+    # next upcoming shows
+    try:
+        latitude, longitude, radius, limit = parse_nearby_args(request.args)
+    except (KeyError, ValueError):
+        return jsonify({"error": NEARBY_ARGS_ERROR}), 400
+    venueRows = db.session.execute(nearby_venues_query(latitude, longitude, radius, limit))
+    nearby = with_distances(venueRows, latitude, longitude)
+    showRows = db.session.execute(upcoming_shows_query([venue.id for _, venue in nearby])) if nearby else []
+    return jsonify(nearby_response(latitude, longitude, radius, nearby, showRows))
+
+
+#  Reports
+#  ----------------------------------------------------------------
+
+REPORT_DIMENSIONS = ('month', 'state', 'city', 'genre')
+REPORT_MAX_ROWS = 10000
+
+
+def parse_report_args(args):
+    # (dimensions to group by, filters) from ?by=&genre=&state=&city=&from=&to=
+    by = [dimension for dimension in args.get('by', ','.join(REPORT_DIMENSIONS)).split(',') if dimension]
+    if not by or any(dimension not in REPORT_DIMENSIONS for dimension in by):
+        raise ValueError('invalid dimensions')
+    filters = []
+    for dimension in ('genre', 'state', 'city'):
+        if args.get(dimension):
+            filters.append(getattr(ShowRollup, dimension) == args[dimension])
+    if args.get('from'):
+        filters.append(ShowRollup.month >= datetime.strptime(args['from'], '%Y-%m').strftime('%Y-%m'))
+    if args.get('to'):
+        filters.append(ShowRollup.month <= datetime.strptime(args['to'], '%Y-%m').strftime('%Y-%m'))
+    return by, filters
+
+
+REPORT_ARGS_ERROR = "by must list some of " + ', '.join(REPORT_DIMENSIONS) + "; from and to must be YYYY-MM"
+
+
+def report_query(by, filters):
+    # sums over the rollups alone; the Show table is never read
+    columns = [getattr(ShowRollup, dimension) for dimension in by]
+    return select(columns + [func.sum(ShowRollup.show_count)]) \
+        .where(and_(ShowRollup.show_count > 0, *filters)) \
+        .group_by(*columns) \
+        .order_by(*columns) \
+        .limit(REPORT_MAX_ROWS + 1)
+
+
+def report_response(by, rows):
+    data = []
+    for row in rows[:REPORT_MAX_ROWS]:
+        entry = dict(zip(by, row[:-1]))
+        entry["shows"] = int(row[-1])
+        data.append(entry)
+    return {
+        "by": by,
+        "count": len(data),
+        "total": sum(entry["shows"] for entry in data),
+        "truncated": len(rows) > REPORT_MAX_ROWS,
+        "data": data
+    }
+
+
+@app.route('/reports/shows')
+def show_report():
+    # shows per month, city and genre, or any grouping of those
+    try:
+        by, filters = parse_report_args(request.args)
+    except ValueError:
+        return jsonify({"error": REPORT_ARGS_ERROR}), 400
+    return jsonify(report_response(by, db.session.execute(report_query(by, filters)).fetchall()))
 
 
 @app.errorhandler(404)
@@ -534,14 +1521,17 @@ def server_error(error):
 
 
 if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(
-        Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
-    )
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.info('errors')
+    configure_logging(app)
+# after the access log hooks, so rejected requests are still logged
+init_ratelimit(app)
+init_warmup(app, db, {
+    'venue': lambda venueId: venue_detail(int(venueId)),
+    'artist': lambda artistId: artist_detail(int(artistId)),
+    'search:venues': lambda term: cached_search('search:venues', term, search_venue_rows),
+    'search:artists': lambda term: cached_search('search:artists', term, search_artist_rows),
+    'search:all': lambda term: cached_search('search:all', term, search_all_rows),
+}, [home_feed, warm_venue_areas])
+init_geo(app, db, Venue, Gazetteer)
 
 # ----------------------------------------------------------------------------#
 # Launch.
@@ -0,0 +1,409 @@
+# ----------------------------------------------------------------------------#
+# ASGI entry point.
+#
+#   uvicorn asgi:application --workers 4
+#
+# Connections live on the event loop, so a process holds thousands of slow
+# clients without a thread each:
+#   - the JSON read API (calendars, /venues/near, /reports/shows) awaits its
+#     statements from the loop: the same statements as the Flask views, on an
+#     async engine (SQLAlchemy's asyncio extension with asyncpg or aiosqlite)
+#     pooled with ASGI_DB_POOL_SIZE connections. Its requests still go
+#     through the Flask request hooks - rate limits, metrics, the access log,
+#     the warm-up - run on the thread pool below, since they may wait on
+#     redis; a request picked for profiling is handed to its Flask view
+#     instead, so the profiler sees the work;
+#   - every other request goes to the Flask app on a pool of ASGI_THREADS
+#     threads once its body has arrived. The thread is released as soon as
+#     the page is generated; only a streamed page larger than
+#     ASGI_STREAM_BUFFER chunks keeps it until the client has read the rest.
+# The listings, detail pages and search are deliberately among the latter:
+# they are HTML read through the ORM session and the caches, which are
+# synchronous. So is the async engine itself for now - it needs SQLAlchemy
+# 1.4 and Flask-SQLAlchemy 2.5, and requirements.txt pins Flask-SQLAlchemy
+# 2.4 - so the read API awaits its statements on the thread pool; the
+# responses are the same. requirements-optional.txt installs the server.
+# ----------------------------------------------------------------------------#
+
+import asyncio
+import contextvars
+import io
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import jsonify, request
+from werkzeug.exceptions import HTTPException
+
+import app as fyyur
+from compression import CompressionMiddleware
+from profiler import ProfilerMiddleware
+
+ASYNC_DRIVERS = (
+    (('postgresql://', 'postgres://'), 'postgresql+asyncpg://', 'asyncpg'),
+    (('sqlite://',), 'sqlite+aiosqlite://', 'aiosqlite'),
+)
+
+
+#  Databases
+#  ----------------------------------------------------------------
+
+class AsyncDatabase(object):
+    # statements awaited on SQLAlchemy's asyncio engine
+
+    def __init__(self, url, config):
+        from sqlalchemy.ext.asyncio import create_async_engine
+        options = {}
+        if not url.startswith('sqlite'):
+            options = {"pool_size": config['ASGI_DB_POOL_SIZE'], "max_overflow": config['ASGI_DB_MAX_OVERFLOW']}
+        self.engine = create_async_engine(url, **options)
+
+    async def fetch(self, statement):
+        async with self.engine.connect() as conn:
+            result = await conn.execute(statement)
+            return result.fetchall()
+
+    async def close(self):
+        await self.engine.dispose()
+
+
+class ThreadedDatabase(object):
+    # the same statements on the app's engine, in the thread pool
+
+    def __init__(self, executor):
+        self.executor = executor
+        with fyyur.app.app_context():
+            self.engine = fyyur.db.engine
+
+    def fetch_sync(self, statement):
+        with self.engine.connect() as conn:
+            return conn.execute(statement).fetchall()
+
+    async def fetch(self, statement):
+        return await asyncio.get_event_loop().run_in_executor(self.executor, self.fetch_sync, statement)
+
+    async def close(self):
+        pass
+
+
+def async_url(url):
+    # the async driver URL for the app's database, None when the driver or
+    # SQLAlchemy's asyncio extension isn't installed
+    for prefixes, asyncPrefix, driver in ASYNC_DRIVERS:
+        for prefix in prefixes:
+            if url.startswith(prefix):
+                try:
+                    __import__('sqlalchemy.ext.asyncio')
+                    __import__(driver)
+                except ImportError:
+                    return None
+                return asyncPrefix + url[len(prefix):]
+    return None
+
+
+def create_database(config, executor):
+    url = async_url(config['SQLALCHEMY_DATABASE_URI'])
+    if url is None:
+        fyyur.app.logger.info('no async database driver, the read API runs on the thread pool')
+        return ThreadedDatabase(executor)
+    return AsyncDatabase(url, config)
+
+
+#  Read API
+#  ----------------------------------------------------------------
+
+async def entity_calendar(database, args, kind, entityId):
+    try:
+        start, end = fyyur.parse_calendar_range(args)
+    except ValueError:
+        return 400, {"error": fyyur.CALENDAR_RANGE_ERROR}
+    nameQuery, showsQuery = fyyur.calendar_queries(kind, entityId, start, end)
+    names = await database.fetch(nameQuery)
+    if not names:
+        return 404, {"error": kind + " not found"}
+    shows = await database.fetch(showsQuery)
+    return 200, fyyur.calendar_response(kind, entityId, names[0][0], shows, start, end)
+
+
+async def venue_calendar(database, args, venue_id):
+    return await entity_calendar(database, args, 'venue', venue_id)
+
+
+async def artist_calendar(database, args, artist_id):
+    return await entity_calendar(database, args, 'artist', artist_id)
+
+
+async def venues_near(database, args):
+    try:
+        latitude, longitude, radius, limit = fyyur.parse_nearby_args(args)
+    except (KeyError, ValueError):
+        return 400, {"error": fyyur.NEARBY_ARGS_ERROR}
+    venueRows = await database.fetch(fyyur.nearby_venues_query(latitude, longitude, radius, limit))
+    nearby = fyyur.with_distances(venueRows, latitude, longitude)
+    showRows = await database.fetch(fyyur.upcoming_shows_query([venue.id for _, venue in nearby])) \
+        if nearby else []
+    return 200, fyyur.nearby_response(latitude, longitude, radius, nearby, showRows)
+
+
+async def show_report(database, args):
+    try:
+        by, filters = fyyur.parse_report_args(args)
+    except ValueError:
+        return 400, {"error": fyyur.REPORT_ARGS_ERROR}
+    return 200, fyyur.report_response(by, await database.fetch(fyyur.report_query(by, filters)))
+
+
+# the Flask endpoints whose GET (and HEAD) requests are served on the event
+# loop; a handler takes the view's arguments
+READ_ENDPOINTS = {
+    'venue_calendar': venue_calendar,
+    'artist_calendar': artist_calendar,
+    'venues_near': venues_near,
+    'show_report': show_report,
+}
+
+
+#  Application
+#  ----------------------------------------------------------------
+
+def build_environ(scope, body):
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': 'HTTP/' + scope.get('http_version', '1.1'),
+        'REMOTE_ADDR': client[0],
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name, value = name.decode('latin-1'), value.decode('latin-1')
+        if name == 'content-type':
+            environ['CONTENT_TYPE'] = value
+        elif name != 'content-length':
+            key = 'HTTP_' + name.upper().replace('-', '_')
+            environ[key] = environ[key] + ',' + value if key in environ else value
+    return environ
+
+
+def response_start(status, headers):
+    return {
+        "type": 'http.response.start',
+        "status": int(status.split(' ', 1)[0]),
+        "headers": [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers],
+    }
+
+
+class Application(object):
+
+    def __init__(self, flaskApp):
+        self.flaskApp = flaskApp
+        self.config = flaskApp.config
+        self.executor = ThreadPoolExecutor(self.config['ASGI_THREADS'], thread_name_prefix='wsgi')
+        self.database = None
+        # only asked which requests to profile
+        self.profiler = ProfilerMiddleware(None, flaskApp)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self.http(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                self.database = create_database(self.config, self.executor)
+                await send({"type": 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self.database is not None:
+                    await self.database.close()
+                self.executor.shutdown(wait=False)
+                await send({"type": 'lifespan.shutdown.complete'})
+                return
+
+    async def http(self, scope, receive, send):
+        if scope['method'] in ('GET', 'HEAD'):
+            environ = build_environ(scope, b'')
+            handler = self.read_handler(environ)
+            if handler is not None:
+                await self.read(scope, send, environ, handler)
+                return
+        await self.wsgi(scope, receive, send)
+
+    def read_handler(self, environ):
+        # the async handler for a read API request, None for the Flask app
+        try:
+            endpoint, _ = self.flaskApp.url_map.bind_to_environ(environ).match()
+        except HTTPException:
+            return None
+        if endpoint not in READ_ENDPOINTS or (self.profiler.enabled and self.profiler.wants_profile(environ)):
+            return None
+        return READ_ENDPOINTS[endpoint]
+
+    async def read(self, scope, send, environ, handler):
+        # dispatched like Flask's wsgi_app and full_dispatch_request, with
+        # the handler awaited in place of the view. The request context
+        # lives in a context of its own, entered by the pool threads that
+        # run the hooks.
+        loop = asyncio.get_event_loop()
+        context = contextvars.copy_context()
+
+        def run(function, *args):
+            return loop.run_in_executor(self.executor, context.run, function, *args)
+
+        requestContext, view, args, viewArgs = await run(self.begin_read, environ)
+        result = error = None
+        try:
+            if view is None:
+                try:
+                    if self.database is None:
+                        # servers without lifespan support
+                        self.database = create_database(self.config, self.executor)
+                    status, payload = await handler(self.database, args, **viewArgs)
+                    view = json_view(status, payload)
+                except Exception as e:
+                    view = raising(e)
+            message, body, result, error = await run(self.finish_read, environ, view)
+            await send(message)
+            await send({"type": 'http.response.body', "body": body})
+        finally:
+            # releases the rate limit slot, even when the client went away
+            await run(self.end_read, requestContext, result, error)
+
+    def begin_read(self, environ):
+        # the before-request hooks; a view returning their response when
+        # they answered, None when the handler is to run
+        requestContext = self.flaskApp.request_context(environ)
+        requestContext.push()
+        try:
+            response = self.flaskApp.preprocess_request()
+        except Exception as e:
+            return requestContext, raising(e), None, None
+        if response is not None:
+            return requestContext, lambda: response, None, None
+        return requestContext, None, request.args, request.view_args
+
+    def finish_read(self, environ, view):
+        # the view's response through Flask's error handlers and the
+        # after-request hooks, compressed like every other response
+        flaskApp = self.flaskApp
+        error = None
+        try:
+            try:
+                response = view()
+            except Exception as e:
+                response = flaskApp.handle_user_exception(e)
+            response = flaskApp.finalize_request(response)
+        except Exception as e:
+            error = e
+            response = flaskApp.handle_exception(e)
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started['message'] = response_start(status, headers)
+
+        result = CompressionMiddleware(response, self.config)(environ, start_response)
+        try:
+            body = b''.join(result)
+        except Exception:
+            close(result)
+            raise
+        return started['message'], body, result, error
+
+    def end_read(self, requestContext, result, error):
+        # closing the response runs the hooks timing the request
+        try:
+            close(result)
+        finally:
+            requestContext.pop(error)
+
+    async def wsgi(self, scope, receive, send):
+        body = []
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            body.append(message.get('body', b''))
+            if not message.get('more_body'):
+                break
+
+        loop = asyncio.get_event_loop()
+        queue = asyncio.Queue(self.config['ASGI_STREAM_BUFFER'])
+        task = loop.run_in_executor(self.executor, self.run_wsgi, build_environ(scope, b''.join(body)), loop, queue)
+        started = finished = False
+        try:
+            while True:
+                item = await queue.get()
+                if item[0] == 'start':
+                    if not started:
+                        await send(item[1])
+                        started = True
+                elif item[0] == 'body':
+                    await send({"type": 'http.response.body', "body": item[1], "more_body": True})
+                else:
+                    finished = True
+                    break
+            if not started:
+                await send(response_start('500 INTERNAL SERVER ERROR', [('Content-Length', '0')]))
+            await send({"type": 'http.response.body', "body": b''})
+        finally:
+            if not finished:
+                # the client went away; let the thread run to the end
+                loop.create_task(drain(queue))
+        await task
+
+    def run_wsgi(self, environ, loop, queue):
+        # runs on one pool thread from start to finish: Flask's contexts and
+        # the scoped session belong to the thread
+        def put(item):
+            asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+        def start_response(status, headers, exc_info=None):
+            put(('start', response_start(status, headers)))
+            return lambda data: put(('body', data))
+
+        try:
+            result = self.flaskApp.wsgi_app(environ, start_response)
+            try:
+                for data in result:
+                    if data:
+                        put(('body', data))
+            finally:
+                close(result)
+        finally:
+            put(('end',))
+
+
+def json_view(status, payload):
+    return lambda: (jsonify(payload), status)
+
+
+def raising(error):
+    def view():
+        raise error
+    return view
+
+
+def close(result):
+    if hasattr(result, 'close'):
+        result.close()
+
+
+async def drain(queue):
+    while (await queue.get())[0] != 'end':
+        pass
+
+
+application = Application(fyyur.app)
@@ -0,0 +1,142 @@
+# ----------------------------------------------------------------------------#
+# Caching.
+#
+# Two interchangeable backends with the same get/set/delete/incr interface:
+#   LocalCache - bounded in-process LRU with per-entry TTL (default)
+#   RedisCache - shared by every worker; needs the optional `redis` package
+# CACHE_BACKEND picks one. Groups of entries are invalidated together by
+# bumping a namespace version that is part of every key in the group, and
+# every entry at once (expire_all) by bumping the cache's epoch, which is
+# part of every key too.
+# ----------------------------------------------------------------------------#
+
+import json
+import threading
+import time
+from collections import OrderedDict
+
+# the counter expire_all bumps
+EPOCH = 'epoch'
+
+
+class LocalCache(object):
+
+    def __init__(self, maxEntries=2048, defaultTtl=300):
+        self.maxEntries = maxEntries
+        self.defaultTtl = defaultTtl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        # namespace versions live outside the LRU so eviction can never
+        # reset one and resurrect entries written under an old version
+        self.counters = {}
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires is not None and expires < time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.defaultTtl if ttl is None else ttl
+        expires = time.time() + ttl if ttl else None
+        with self.lock:
+            self.entries[key] = (value, expires)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxEntries:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def incr(self, key):
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + 1
+            return self.counters[key]
+
+    def counter(self, key):
+        with self.lock:
+            return self.counters.get(key, 0)
+
+    def counter_values(self, keys):
+        with self.lock:
+            return [self.counters.get(key, 0) for key in keys]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.counters.clear()
+
+    def expire_all(self):
+        # drops every entry and moves to a new epoch, so an entry still being
+        # computed under the old one is never served, whatever its namespace
+        with self.lock:
+            self.entries.clear()
+            self.counters[EPOCH] = self.counters.get(EPOCH, 0) + 1
+
+
+class RedisCache(object):
+
+    def __init__(self, url, defaultTtl=300, prefix='fyyur:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.defaultTtl = defaultTtl
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return None if value is None else json.loads(value)
+
+    def set(self, key, value, ttl=None):
+        ttl = self.defaultTtl if ttl is None else ttl
+        self.client.set(self.prefix + key, json.dumps(value), ex=ttl or None)
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def incr(self, key):
+        return self.client.incr(self.prefix + 'counter:' + key)
+
+    def counter(self, key):
+        return int(self.client.get(self.prefix + 'counter:' + key) or 0)
+
+    def counter_values(self, keys):
+        values = self.client.mget([self.prefix + 'counter:' + key for key in keys])
+        return [int(value or 0) for value in values]
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + '*'):
+            self.client.delete(key)
+
+    def expire_all(self):
+        self.incr(EPOCH)
+        # the old epoch's entries can't be read any more; free their memory
+        for key in self.client.scan_iter(self.prefix + '*'):
+            if not key.decode('utf-8').startswith(self.prefix + 'counter:'):
+                self.client.delete(key)
+
+
+def create_cache(config):
+    if config.get('CACHE_BACKEND') == 'redis':
+        return RedisCache(config['CACHE_REDIS_URL'], config.get('CACHE_DEFAULT_TTL', 300))
+    return LocalCache(config.get('CACHE_MAX_ENTRIES', 2048), config.get('CACHE_DEFAULT_TTL', 300))
+
+
+def versioned_key(cache, namespace, key):
+    epoch, version = cache.counter_values([EPOCH, 'ns:' + namespace])
+    return '%s:%d.%d:%s' % (namespace, epoch, version, key)
+
+
+def invalidate_namespace(cache, namespace):
+    cache.incr('ns:' + namespace)
+
+
+def normalize_term(term):
+    # lowercased, trimmed, inner whitespace collapsed
+    return ' '.join((term or '').lower().split())
@@ -0,0 +1,177 @@
+# ----------------------------------------------------------------------------#
+# Response compression.
+#
+# Compresses text responses (HTML, JSON, CSS, JS, ...) with gzip, or brotli
+# when the optional `brotli` package is installed, COMPRESS_BROTLI is on and
+# the client accepts it. Responses with a Content-Length below
+# COMPRESS_MIN_SIZE are sent as they are. Streamed responses (no
+# Content-Length) are compressed chunk by chunk with a flush after each
+# chunk, so the browser still receives every chunk as soon as it is ready.
+# Every compressible response carries Vary: Accept-Encoding, compressed or
+# not, so a shared cache never hands one client's encoding to another.
+# ----------------------------------------------------------------------------#
+
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = (
+    'text/',
+    'application/json',
+    'application/javascript',
+    'application/xml',
+    'image/svg+xml',
+)
+
+
+def parse_accept_encoding(header):
+    # {'gzip': 1.0, 'br': 0.8, ...}
+    accepted = {}
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        if not coding:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    return accepted
+
+
+class GzipEncoder(object):
+    name = 'gzip'
+
+    def __init__(self, level):
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def chunk(self, data):
+        return self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data=b''):
+        return self.compressor.compress(data) + self.compressor.flush(zlib.Z_FINISH)
+
+
+class BrotliEncoder(object):
+    name = 'br'
+
+    def __init__(self, quality):
+        self.compressor = brotli.Compressor(quality=quality)
+
+    def chunk(self, data):
+        return self.compressor.process(data) + self.compressor.flush()
+
+    def finish(self, data=b''):
+        return self.compressor.process(data) + self.compressor.finish()
+
+
+class CompressionMiddleware(object):
+
+    def __init__(self, wsgiApp, config):
+        self.wsgiApp = wsgiApp
+        self.level = config.get('COMPRESS_LEVEL', 6)
+        self.minSize = config.get('COMPRESS_MIN_SIZE', 500)
+        self.brotliQuality = config.get('COMPRESS_BROTLI_QUALITY', 5)
+        self.useBrotli = brotli is not None and config.get('COMPRESS_BROTLI', True)
+
+    def choose_encoder(self, environ):
+        # a factory for the encoder the client prefers, None for identity
+        if environ.get('REQUEST_METHOD') == 'HEAD':
+            return None
+        accepted = parse_accept_encoding(environ.get('HTTP_ACCEPT_ENCODING', ''))
+        if self.useBrotli and accepted.get('br', 0) > 0:
+            return lambda: BrotliEncoder(self.brotliQuality)
+        if accepted.get('gzip', accepted.get('*', 0)) > 0:
+            return lambda: GzipEncoder(self.level)
+        return None
+
+    def is_compressible(self, status, headers):
+        # whether the response's encoding depends on Accept-Encoding at all
+        if status[:3] in ('204', '206', '304') or int(status[:3]) < 200:
+            return False
+        values = dict((name.lower(), value) for name, value in headers)
+        if 'content-encoding' in values:
+            return False
+        return values.get('content-type', '').startswith(COMPRESSIBLE_TYPES)
+
+    def is_large_enough(self, headers):
+        values = dict((name.lower(), value) for name, value in headers)
+        length = values.get('content-length')
+        return length is None or int(length) >= self.minSize
+
+    def __call__(self, environ, start_response):
+        newEncoder = self.choose_encoder(environ)
+        captured = {}
+
+        def capture_start_response(status, headers, exc_info=None):
+            captured['status'] = status
+            captured['headers'] = headers
+            captured['exc_info'] = exc_info
+            return lambda data: captured.setdefault('written', []).append(data)
+
+        result = self.wsgiApp(environ, capture_start_response)
+        iterator = iter(result)
+        # apps may defer start_response until their first chunk
+        pending = list(captured.pop('written', []))
+        if 'status' not in captured:
+            for data in iterator:
+                pending.append(data)
+                break
+        status, headers = captured['status'], captured['headers']
+
+        if not self.is_compressible(status, headers):
+            start_response(status, headers, captured['exc_info'])
+            return self.passthrough(result, iterator, pending)
+        vary = [value for name, value in headers if name.lower() == 'vary']
+        if 'accept-encoding' not in ', '.join(vary).lower():
+            vary.append('Accept-Encoding')
+        varied = [(name, value) for name, value in headers if name.lower() != 'vary'] + [('Vary', ', '.join(vary))]
+        if newEncoder is None or not self.is_large_enough(headers):
+            start_response(status, varied, captured['exc_info'])
+            return self.passthrough(result, iterator, pending)
+
+        encoder = newEncoder()
+        headers = [(name, value) for name, value in varied if name.lower() != 'content-length'] + [
+            ('Content-Encoding', encoder.name),
+        ]
+        streamed = not any(name.lower() == 'content-length' for name, _ in captured['headers'])
+        if streamed:
+            start_response(status, headers, captured['exc_info'])
+            return self.compress_stream(encoder, result, iterator, pending)
+
+        try:
+            body = encoder.finish(b''.join(pending + list(iterator)))
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        start_response(status, headers + [('Content-Length', str(len(body)))], captured['exc_info'])
+        return [body]
+
+    def passthrough(self, result, iterator, pending):
+        try:
+            for data in pending:
+                yield data
+            for data in iterator:
+                yield data
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+
+    def compress_stream(self, encoder, result, iterator, pending):
+        try:
+            for data in pending:
+                if data:
+                    yield encoder.chunk(data)
+            for data in iterator:
+                if data:
+                    yield encoder.chunk(data)
+            yield encoder.finish()
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
@@ -7,12 +7,20 @@ from fabric.contrib.console import confirm
 def test():
     with settings(warn_only=True):
         result = local(
-            "python test_tasks.py -v && python test_users.py -v", capture=True
+            "python test_tasks.py -v && python test_users.py -v && python test_query_budget.py -v",
+            capture=True
         )
     if result.failed and not confirm("Tests failed. Continue?"):
         abort("Aborted at user request.")
 
 
+def loadtest():
+    with settings(warn_only=True):
+        result = local("python loadtest.py", capture=False)
+    if result.failed and not confirm("Load test regressed. Continue?"):
+        abort("Aborted at user request.")
+
+
 def commit():
     message = raw_input("Enter a git commit message: ")
     local("git add . && git commit -am '{}'".format(message))
@@ -24,6 +32,7 @@ def push():
 
 def prepare():
     test()
+    loadtest()
     commit()
     push()
 
@@ -47,6 +56,7 @@ def heroku_test():
 def deploy():
     pull()
     test()
+    loadtest()
     commit()
     heroku()
     heroku_test()
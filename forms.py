@@ -1,9 +1,10 @@
 from datetime import datetime
 from flask_wtf import Form
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField
+from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField, HiddenField
 from wtforms.validators import DataRequired, AnyOf, URL
 
 class ShowForm(Form):
+    # one artist id, or several separated by commas for a line-up
     artist_id = StringField(
         'artist_id'
     )
@@ -15,6 +16,17 @@ class ShowForm(Form):
         validators=[DataRequired()],
         default= datetime.today()
     )
+    repeat = SelectField(
+        'repeat',
+        choices=[
+            ('', 'Does not repeat'),
+            ('weekly', 'Every week'),
+            ('biweekly', 'Every two weeks'),
+        ]
+    )
+    repeat_until = StringField(
+        'repeat_until'
+    )
 
 class VenueForm(Form):
     name = StringField(
@@ -125,6 +137,9 @@ class VenueForm(Form):
         'seeking_description'
     )
 
+    # the row version the edit started from, see save_changes in app.py
+    version = HiddenField( 'version' )
+
 
 
 class ArtistForm(Form):
@@ -236,3 +251,6 @@ class ArtistForm(Form):
             'seeking_description'
      )
 
+    # the row version the edit started from, see save_changes in app.py
+    version = HiddenField( 'version' )
+
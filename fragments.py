@@ -0,0 +1,71 @@
+# ----------------------------------------------------------------------------#
+# Fragment caching for templates.
+#
+#   {% cache 'venue-card', venue.id, venue.version %} ... {% endcache %}
+#
+# renders the block once and then serves it from the fragment cache under a
+# key made of the given parts, so key a fragment by the ids and row versions of
+# everything it shows: an edit bumps the version, the next render misses and
+# the old entry simply ages out. The template's name and a checksum of its
+# source are part of every key, so changing the markup never serves stale
+# fragments. The tiles and cards in templates/partials/tiles.html are the
+# main users; the same fragment is shared by every page that includes it.
+#
+# Fragments get an LRU of their own in every worker, whatever CACHE_BACKEND
+# is: a listing page renders thousands of them, which would evict the app
+# cache's other entries (and each other) from its LRU, or cost a redis round
+# trip per tile. Their keys never go stale, so nothing needs to reach the
+# other workers' copies. FRAGMENT_CACHE_MAX_ENTRIES must hold the fragments
+# of the largest listing, or every render of it misses.
+# ----------------------------------------------------------------------------#
+
+import zlib
+
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+from cache import LocalCache
+from metrics import record_cache
+
+
+class FragmentCacheExtension(Extension):
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        Extension.__init__(self, environment)
+        environment.extend(fragment_cache=None, fragment_cache_ttl=None)
+        self.checksums = {}
+
+    def preprocess(self, source, name, filename=None):
+        self.checksums[name] = '%08x' % (zlib.crc32(source.encode('utf-8')) & 0xffffffff)
+        return source
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        parts = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            parts.append(parser.parse_expression())
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        prefix = nodes.Const('fragment:%s:%s' % (parser.name, self.checksums.get(parser.name, '')))
+        return nodes.CallBlock(self.call_method('render_fragment', [prefix, nodes.List(parts)]),
+                               [], [], body).set_lineno(lineno)
+
+    def render_fragment(self, prefix, parts, caller):
+        fragmentCache = self.environment.fragment_cache
+        if fragmentCache is None:
+            return caller()
+        key = prefix + ':' + ':'.join(str(part) for part in parts)
+        html = fragmentCache.get(key)
+        record_cache('fragment', html is not None)
+        if html is None:
+            html = caller()
+            fragmentCache.set(key, str(html), self.environment.fragment_cache_ttl)
+        return Markup(html)
+
+
+def init_fragments(app):
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    app.jinja_env.fragment_cache = LocalCache(app.config['FRAGMENT_CACHE_MAX_ENTRIES'],
+                                              app.config['FRAGMENT_CACHE_TTL'])
+    app.jinja_env.fragment_cache_ttl = app.config['FRAGMENT_CACHE_TTL']
@@ -0,0 +1,243 @@
+# ----------------------------------------------------------------------------#
+# Venue locations.
+#
+# Venues get a latitude/longitude from an offline gazetteer: a CSV or
+# tab-separated file with a header row naming the city, state, latitude and
+# longitude columns (the US Census places gazetteer works as-is).
+#
+#   flask geo import places.txt
+#
+# loads it into the Gazetteer table and geocodes every venue without a
+# location by its city and state; new and edited venues are geocoded on save.
+# Each location is also stored as a geohash, indexed, so a radius search is a
+# few range scans over the cells covering the circle, whatever the number of
+# venues; the database then keeps the nearest of those within the radius.
+# ----------------------------------------------------------------------------#
+
+import csv
+import math
+
+import click
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+GEOHASH_PRECISION = 12
+EARTH_RADIUS_KM = 6371.0088
+
+# header names accepted for each gazetteer column, lowercased
+GAZETTEER_COLUMNS = {
+    "city": ('city', 'name', 'place'),
+    "state": ('state', 'usps', 'state_code', 'admin1'),
+    "latitude": ('latitude', 'lat', 'intptlat'),
+    "longitude": ('longitude', 'lng', 'lon', 'long', 'intptlong'),
+}
+# the Census gazetteer names places 'Austin city', 'Brooklyn CDP', ...
+PLACE_SUFFIXES = (' city', ' town', ' village', ' borough', ' cdp', ' municipality')
+
+IMPORT_BATCH_SIZE = 1000
+
+
+def encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    latRange, lngRange = [-90.0, 90.0], [-180.0, 180.0]
+    chars = []
+    bits, value, even = 0, 0, True
+    while len(chars) < precision:
+        interval, coordinate = (lngRange, longitude) if even else (latRange, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits, value = 0, 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    # (latitude degrees, longitude degrees) covered by one cell
+    lngBits = (5 * precision + 1) // 2
+    latBits = 5 * precision // 2
+    return 180.0 / 2 ** latBits, 360.0 / 2 ** lngBits
+
+
+def distance_km(lat1, lng1, lat2, lng2):
+    # haversine great-circle distance
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = math.sin((phi2 - phi1) / 2) ** 2 \
+        + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(latitude, longitude, radiusKm):
+    # (min lat, max lat, min lng, max lng); the longitudes may fall outside
+    # -180..180 when the box crosses the antimeridian
+    latDelta = math.degrees(radiusKm / EARTH_RADIUS_KM)
+    minLat, maxLat = max(-90.0, latitude - latDelta), min(90.0, latitude + latDelta)
+    widest = max(abs(minLat), abs(maxLat))
+    if widest >= 89.9:
+        return minLat, maxLat, -180.0, 180.0
+    lngDelta = min(180.0, latDelta / math.cos(math.radians(widest)))
+    return minLat, maxLat, longitude - lngDelta, longitude + lngDelta
+
+
+def covering_cells(latitude, longitude, radiusKm, maxCells=9):
+    # the geohash cells of the finest precision at which at most maxCells
+    # cells cover the circle's bounding box
+    minLat, maxLat, minLng, maxLng = bounding_box(latitude, longitude, radiusKm)
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        latSize, lngSize = cell_size(precision)
+        rows = int(math.floor((maxLat + 90) / latSize)) - int(math.floor((minLat + 90) / latSize)) + 1
+        columns = int(math.floor((maxLng + 180) / lngSize)) - int(math.floor((minLng + 180) / lngSize)) + 1
+        if rows * columns <= maxCells or precision == 1:
+            break
+    cells = set()
+    for row in range(rows):
+        cellLat = min(maxLat, minLat + row * latSize)
+        for column in range(columns):
+            cellLng = min(maxLng, minLng + column * lngSize)
+            # wrap around the antimeridian
+            cellLng = (cellLng + 180) % 360 - 180
+            cells.add(encode(cellLat, cellLng, precision))
+    return sorted(cells)
+
+
+def cell_ranges(cells):
+    # [start, end) geohash ranges covering every hash that starts with one of
+    # the cells, end None for the last cell. The bounds are alphanumeric, so
+    # they compare the same under any collation.
+    ranges = []
+    for cell in cells:
+        end = cell
+        while end and end[-1] == BASE32[-1]:
+            end = end[:-1]
+        if end:
+            end = end[:-1] + BASE32[BASE32.index(end[-1]) + 1]
+        ranges.append((cell, end or None))
+    return ranges
+
+
+#  Gazetteer
+#  ----------------------------------------------------------------
+
+def place_key(city, state):
+    # normalized (city, state) the gazetteer is keyed on
+    city = (city or '').strip().lower()
+    for suffix in PLACE_SUFFIXES:
+        if city.endswith(suffix):
+            city = city[:-len(suffix)]
+            break
+    return ' '.join(city.split()), (state or '').strip().upper()
+
+
+def read_gazetteer(path):
+    # yields (city key, state, latitude, longitude) for every usable row
+    with open(path, newline='', encoding='utf-8-sig') as gazetteerFile:
+        sample = gazetteerFile.read(4096)
+        gazetteerFile.seek(0)
+        dialect = csv.Sniffer().sniff(sample, delimiters=',\t;|')
+        reader = csv.reader(gazetteerFile, dialect)
+        header = [name.strip().lower() for name in next(reader)]
+        positions = {}
+        for column, aliases in GAZETTEER_COLUMNS.items():
+            found = [header.index(alias) for alias in aliases if alias in header]
+            if not found:
+                raise click.ClickException('gazetteer has no %s column (one of: %s)'
+                                           % (column, ', '.join(aliases)))
+            positions[column] = found[0]
+        for row in reader:
+            try:
+                city, state = place_key(row[positions["city"]], row[positions["state"]])
+                latitude = float(row[positions["latitude"]])
+                longitude = float(row[positions["longitude"]])
+            except (IndexError, ValueError):
+                continue
+            if city and state and -90 <= latitude <= 90 and -180 <= longitude <= 180:
+                yield city, state, latitude, longitude
+
+
+def geocode(db, Gazetteer, city, state):
+    # {latitude, longitude, geohash} for a venue in the given city, all None
+    # when the gazetteer doesn't know it
+    cityKey, stateKey = place_key(city, state)
+    place = db.session.query(Gazetteer.latitude, Gazetteer.longitude) \
+        .filter(Gazetteer.city_key == cityKey, Gazetteer.state == stateKey).first()
+    if place is None:
+        return {"latitude": None, "longitude": None, "geohash": None}
+    return {"latitude": place[0], "longitude": place[1], "geohash": encode(place[0], place[1])}
+
+
+def import_gazetteer(db, Gazetteer, path):
+    # replaces the Gazetteer table with the file's places; the first row for
+    # a (city, state) wins
+    seen = set()
+    batch = []
+    imported = 0
+    db.session.query(Gazetteer).delete(synchronize_session=False)
+    for city, state, latitude, longitude in read_gazetteer(path):
+        if (city, state) in seen:
+            continue
+        seen.add((city, state))
+        batch.append({"city_key": city, "state": state, "latitude": latitude, "longitude": longitude})
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            db.session.execute(Gazetteer.__table__.insert(), batch)
+            imported += len(batch)
+            batch = []
+    if batch:
+        db.session.execute(Gazetteer.__table__.insert(), batch)
+        imported += len(batch)
+    return imported
+
+
+def geocode_venues(db, Venue, Gazetteer, everything=False):
+    # locates the venues without one (or all of them) in one joined query
+    # and writes the locations back in batched UPDATEs
+    query = db.session.query(Venue.id, Venue.city, Venue.state)
+    if not everything:
+        query = query.filter(Venue.geohash.is_(None))
+    venues = query.all()
+    places = {}
+    for venueId, city, state in venues:
+        places.setdefault(place_key(city, state), []).append(venueId)
+    states = sorted(set(state for _, state in places))
+    located = []
+    for start in range(0, len(states), IMPORT_BATCH_SIZE):
+        for cityKey, state, latitude, longitude in \
+                db.session.query(Gazetteer.city_key, Gazetteer.state, Gazetteer.latitude, Gazetteer.longitude) \
+                .filter(Gazetteer.state.in_(states[start:start + IMPORT_BATCH_SIZE])):
+            for venueId in places.get((cityKey, state), ()):
+                located.append({"venue_id": venueId, "latitude": latitude, "longitude": longitude,
+                                "geohash": encode(latitude, longitude)})
+    table = Venue.__table__
+    update = table.update().where(table.c.id == db.bindparam('venue_id')).values(
+        latitude=db.bindparam('latitude'), longitude=db.bindparam('longitude'), geohash=db.bindparam('geohash'))
+    for start in range(0, len(located), IMPORT_BATCH_SIZE):
+        db.session.execute(update, located[start:start + IMPORT_BATCH_SIZE])
+    return len(located), len(venues)
+
+
+def init_geo(app, db, Venue, Gazetteer):
+    geo = click.Group('geo', help='Venue locations.')
+
+    @geo.command('import')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--all', 'everything', is_flag=True, help='Geocode venues that already have a location too.')
+    def import_command(path, everything):
+        """Load a gazetteer file and geocode the venues from it."""
+        places = import_gazetteer(db, Gazetteer, path)
+        located, venues = geocode_venues(db, Venue, Gazetteer, everything)
+        db.session.commit()
+        click.echo('imported %d places, located %d of %d venues' % (places, located, venues))
+
+    @geo.command('geocode')
+    @click.option('--all', 'everything', is_flag=True, help='Geocode venues that already have a location too.')
+    def geocode_command(everything):
+        """Geocode venues from the imported gazetteer."""
+        located, venues = geocode_venues(db, Venue, Gazetteer, everything)
+        db.session.commit()
+        click.echo('located %d of %d venues' % (located, venues))
+
+    app.cli.add_command(geo)
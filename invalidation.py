@@ -0,0 +1,160 @@
+# ----------------------------------------------------------------------------#
+# Cache invalidation between workers.
+#
+# invalidate() in app.py publishes the cache namespaces a write touched
+# ('venue:12', 'search:venues', ...) on a bus, and every worker subscribed to
+# it bumps those namespaces in its own cache. Two buses with the same
+# publish/subscribe interface:
+#   LocalBus    - delivers to the subscribers of this process only; enough
+#                 for a single worker, a shared redis cache and the tests
+#   PostgresBus - NOTIFY on INVALIDATION_CHANNEL, LISTENed to by a
+#                 background thread in every worker; needs `psycopg2`
+# INVALIDATION_BUS picks one. A worker applies its own events immediately
+# and ignores their echo. Notifications sent while a listener is
+# reconnecting are lost, so a reconnected listener expires its whole cache
+# ('*') rather than serve what it may have missed.
+# ----------------------------------------------------------------------------#
+
+import json
+import os
+import re
+import select
+import threading
+import time
+import uuid
+
+# NOTIFY payloads must stay below 8000 bytes; larger events expire everything
+MAX_PAYLOAD = 7900
+LISTEN_POLL_SECONDS = 5
+RECONNECT_SECONDS = 1
+
+
+class LocalBus(object):
+
+    def __init__(self):
+        self.subscribers = []
+
+    def subscribe(self, handler):
+        # handler(namespaces), called once per published event
+        self.subscribers.append(handler)
+
+    def publish(self, namespaces):
+        self.deliver(list(namespaces))
+
+    def deliver(self, namespaces):
+        for handler in self.subscribers:
+            handler(namespaces)
+
+    def start(self):
+        pass
+
+
+class PostgresBus(LocalBus):
+
+    def __init__(self, url, channel, logger):
+        import psycopg2
+        self.psycopg2 = psycopg2
+        LocalBus.__init__(self)
+        # libpq takes the SQLAlchemy URL without its driver suffix
+        self.dsn = re.sub(r'^postgres(ql)?(\+\w+)?://', 'postgresql://', url)
+        self.channel = channel
+        self.logger = logger
+        self.lock = threading.Lock()
+        self.connection = None
+        self.sender = None
+        self.pid = None
+
+    def connect(self):
+        connection = self.psycopg2.connect(self.dsn)
+        connection.autocommit = True
+        return connection
+
+    def publish(self, namespaces):
+        namespaces = list(namespaces)
+        self.deliver(namespaces)
+        payload = json.dumps({"sender": self.sender, "namespaces": namespaces})
+        if len(payload.encode('utf-8')) > MAX_PAYLOAD:
+            payload = json.dumps({"sender": self.sender, "namespaces": ['*']})
+        with self.lock:
+            for attempt in range(2):
+                try:
+                    if self.connection is None or self.connection.closed:
+                        self.connection = self.connect()
+                    with self.connection.cursor() as cursor:
+                        cursor.execute('SELECT pg_notify(%s, %s)', (self.channel, payload))
+                    return
+                except self.psycopg2.Error:
+                    # a dropped connection is retried once on a new one
+                    self.connection = None
+                    if attempt:
+                        self.logger.exception('invalidation not published: %s', ', '.join(namespaces))
+
+    def start(self):
+        # once per process, so workers forked from a preloading master each
+        # get their own listener
+        if self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.pid != os.getpid():
+                self.pid = os.getpid()
+                self.sender = '%d-%s' % (self.pid, uuid.uuid4().hex[:8])
+                self.connection = None
+                threading.Thread(target=self.listen, name='invalidation', daemon=True).start()
+
+    def listen(self):
+        connected = False
+        while True:
+            try:
+                connection = self.connect()
+                try:
+                    with connection.cursor() as cursor:
+                        cursor.execute('LISTEN "%s"' % self.channel.replace('"', '""'))
+                    if connected:
+                        self.deliver(['*'])
+                    connected = True
+                    while True:
+                        if select.select([connection], [], [], LISTEN_POLL_SECONDS) == ([], [], []):
+                            continue
+                        connection.poll()
+                        while connection.notifies:
+                            self.receive(connection.notifies.pop(0).payload)
+                finally:
+                    connection.close()
+            except Exception:
+                self.logger.exception('invalidation listener disconnected')
+                time.sleep(RECONNECT_SECONDS)
+
+    def receive(self, payload):
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            return
+        if event.get("sender") != self.sender:
+            self.deliver(event.get("namespaces") or [])
+
+
+def create_bus(config, logger):
+    # with a shared redis cache the namespace versions are shared too, so
+    # there is nothing to broadcast
+    if config.get('INVALIDATION_BUS') == 'postgres' and config.get('CACHE_BACKEND') != 'redis':
+        return PostgresBus(config['SQLALCHEMY_DATABASE_URI'], config['INVALIDATION_CHANNEL'], logger)
+    return LocalBus()
+
+
+def init_invalidation(app, cache, invalidate_namespace):
+    bus = create_bus(app.config, app.logger)
+
+    def drop(namespaces):
+        if '*' in namespaces:
+            cache.expire_all()
+            return
+        for namespace in namespaces:
+            invalidate_namespace(cache, namespace)
+
+    bus.subscribe(drop)
+
+    @app.before_request
+    def start_listener():
+        bus.start()
+
+    return bus
@@ -0,0 +1,323 @@
+# ----------------------------------------------------------------------------#
+# Local load test.
+#
+# Starts the app on a local port against a freshly seeded database, drives a
+# weighted mix of GET/POST traffic over every route and reports latency
+# percentiles and throughput per route. Exits non-zero when a route's p95
+# regresses past the stored baseline, or when there is no baseline for it:
+# record one on the machine that runs the gate first.
+#
+#   python loadtest.py --update-baseline
+#   python loadtest.py --concurrency 16 --duration 30
+#
+# The database is dropped and re-seeded, so only a temporary sqlite file is
+# accepted unless --force is given.
+# ----------------------------------------------------------------------------#
+
+import argparse
+import json
+import logging
+import math
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'loadtest_baseline.json')
+
+# share of the seeded venues and artists set aside for the DELETE traffic;
+# no other route picks them, so deletes never turn other requests into 404s
+DISPOSABLE_FRACTION = 0.25
+
+
+def percentile(sortedValues, fraction):
+    # nearest-rank percentile of an already sorted list: the smallest value
+    # with at least `fraction` of the values at or below it. The product is
+    # rounded first so float noise (0.07 * 100 = 7.000000000000001) doesn't
+    # push it up a rank
+    if not sortedValues:
+        return 0.0
+    rank = math.ceil(round(fraction * len(sortedValues), 9))
+    index = max(0, min(len(sortedValues) - 1, rank - 1))
+    return sortedValues[index]
+
+
+def is_scratch_database(url):
+    # a sqlite database in the temporary directory, in memory or not there yet
+    if not url.startswith('sqlite://'):
+        return False
+    path = url[len('sqlite:///'):]
+    if not path or path == ':memory:' or not os.path.exists(path):
+        return True
+    return os.path.realpath(path).startswith(os.path.realpath(tempfile.gettempdir()) + os.sep)
+
+
+def build_mix(venueIds, artistIds, locations):
+    # (route, weight, method, path factory, form factory); weights roughly
+    # follow production traffic: listings and detail pages dominate
+    def pick(ids):
+        return lambda rng: rng.choice(ids)
+
+    def take(ids):
+        # each id once; when they run out the deletes measure the 404 path
+        pool = list(ids)
+        lock = threading.Lock()
+
+        def next_id(rng):
+            with lock:
+                return pool.pop() if pool else 0
+        return next_id
+
+    keptVenues = max(1, int(len(venueIds) * (1 - DISPOSABLE_FRACTION)))
+    keptArtists = max(1, int(len(artistIds) * (1 - DISPOSABLE_FRACTION)))
+    venue = pick(venueIds[:keptVenues])
+    artist = pick(artistIds[:keptArtists])
+    disposableVenue = take(venueIds[keptVenues:])
+    disposableArtist = take(artistIds[keptArtists:])
+
+    def term(rng):
+        return rng.choice(['the', 'hop', 'park', 'blue', 'sax', 'room', 'zzz'])
+
+    def new_show(rng):
+        return {
+            "venue_id": str(venue(rng)),
+            "artist_id": str(artist(rng)),
+            "start_time": '2030-%02d-%02d 20:00:00' % (rng.randint(1, 12), rng.randint(1, 28)),
+        }
+
+    def new_venue(rng):
+        return {"name": 'Load Venue ' + str(rng.randint(0, 10 ** 6)), "city": 'Austin', "state": 'TX',
+                "address": '1 Main St', "genres": 'Jazz', "facebook_link": 'https://www.facebook.com/x'}
+
+    def new_artist(rng):
+        return {"name": 'Load Artist ' + str(rng.randint(0, 10 ** 6)), "city": 'Austin', "state": 'TX',
+                "genres": 'Jazz', "facebook_link": 'https://www.facebook.com/x'}
+
+    def edited_venue(rng):
+        # no version field: the edits don't conflict with each other
+        form = new_venue(rng)
+        form["genres"] = rng.choice(['Jazz', 'Folk', 'Blues'])
+        return form
+
+    def edited_artist(rng):
+        form = new_artist(rng)
+        form["genres"] = rng.choice(['Jazz', 'Folk', 'Blues'])
+        return form
+
+    def near(rng):
+        latitude, longitude = rng.choice(sorted(locations.values()))
+        return '/venues/near?lat=%.4f&lng=%.4f&radius=%d' % (latitude, longitude, rng.choice([10, 25, 50]))
+
+    def report(rng):
+        return '/reports/shows?by=' + rng.choice(['genre,month', 'city', 'state,genre', 'month'])
+
+    return [
+        ('GET /', 5, 'GET', lambda rng: '/', None),
+        ('GET /venues', 10, 'GET', lambda rng: '/venues', None),
+        ('GET /artists', 10, 'GET', lambda rng: '/artists', None),
+        ('GET /shows', 10, 'GET', lambda rng: '/shows', None),
+        ('GET /venues/<id>', 15, 'GET', lambda rng: '/venues/%d' % venue(rng), None),
+        ('GET /artists/<id>', 15, 'GET', lambda rng: '/artists/%d' % artist(rng), None),
+        ('GET /venues/<id>/calendar', 3, 'GET', lambda rng: '/venues/%d/calendar' % venue(rng), None),
+        ('GET /artists/<id>/calendar', 3, 'GET', lambda rng: '/artists/%d/calendar' % artist(rng), None),
+        ('GET /venues/<id>/matches', 2, 'GET', lambda rng: '/venues/%d/matches' % venue(rng), None),
+        ('GET /artists/<id>/matches', 2, 'GET', lambda rng: '/artists/%d/matches' % artist(rng), None),
+        ('GET /venues/<id>/edit', 1, 'GET', lambda rng: '/venues/%d/edit' % venue(rng), None),
+        ('GET /artists/<id>/edit', 1, 'GET', lambda rng: '/artists/%d/edit' % artist(rng), None),
+        ('GET /venues/create', 1, 'GET', lambda rng: '/venues/create', None),
+        ('GET /artists/create', 1, 'GET', lambda rng: '/artists/create', None),
+        ('GET /shows/create', 1, 'GET', lambda rng: '/shows/create', None),
+        ('POST /venues/search', 6, 'POST', lambda rng: '/venues/search', lambda rng: {"search_term": term(rng)}),
+        ('POST /artists/search', 6, 'POST', lambda rng: '/artists/search', lambda rng: {"search_term": term(rng)}),
+        ('GET /search', 4, 'GET', lambda rng: '/search?search_term=' + term(rng), None),
+        ('POST /search', 2, 'POST', lambda rng: '/search', lambda rng: {"search_term": term(rng)}),
+        ('GET /venues/near', 3, 'GET', near, None),
+        ('GET /reports/shows', 2, 'GET', report, None),
+        ('POST /shows/create', 2, 'POST', lambda rng: '/shows/create', new_show),
+        ('POST /venues/create', 1, 'POST', lambda rng: '/venues/create', new_venue),
+        ('POST /artists/create', 1, 'POST', lambda rng: '/artists/create', new_artist),
+        ('POST /venues/<id>/edit', 1, 'POST', lambda rng: '/venues/%d/edit' % venue(rng), edited_venue),
+        ('POST /artists/<id>/edit', 1, 'POST', lambda rng: '/artists/%d/edit' % artist(rng), edited_artist),
+        ('DELETE /venues/<id>', 1, 'DELETE', lambda rng: '/venues/%d' % disposableVenue(rng), None),
+        ('DELETE /artists/<id>', 1, 'DELETE', lambda rng: '/artists/%d' % disposableArtist(rng), None),
+    ]
+
+
+class Recorder(object):
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+
+    def record(self, route, seconds, ok):
+        with self.lock:
+            self.latencies.setdefault(route, []).append(seconds * 1000.0)
+            if not ok:
+                self.errors[route] = self.errors.get(route, 0) + 1
+
+    def summary(self):
+        routes = {}
+        for route, values in self.latencies.items():
+            values = sorted(values)
+            routes[route] = {
+                "count": len(values),
+                "errors": self.errors.get(route, 0),
+                "p50": percentile(values, 0.50),
+                "p95": percentile(values, 0.95),
+                "p99": percentile(values, 0.99),
+            }
+        return routes
+
+
+def worker(baseUrl, mix, deadline, recorder, workerSeed):
+    rng = random.Random(workerSeed)
+    routes = list(mix)
+    weights = [entry[1] for entry in mix]
+    while time.time() < deadline:
+        route, _, method, pathFactory, formFactory = rng.choices(routes, weights)[0]
+        data = None
+        if formFactory is not None:
+            data = urllib.parse.urlencode(formFactory(rng)).encode()
+        req = urllib.request.Request(baseUrl + pathFactory(rng), data=data, method=method)
+        started = time.perf_counter()
+        ok = True
+        try:
+            with urllib.request.urlopen(req, timeout=30) as response:
+                response.read()
+        except urllib.error.HTTPError as error:
+            ok = error.code < 500
+        except Exception:
+            ok = False
+        recorder.record(route, time.perf_counter() - started, ok)
+
+
+def start_server(app, port):
+    from werkzeug.serving import make_server
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', port, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def compare(routes, baseline, tolerance, slackMs, minSamples):
+    # a route regresses when its p95 exceeds baseline * (1 + tolerance) + slack,
+    # or when the baseline has no p95 for it (limit None); routes with too
+    # few samples for a stable p95 are skipped
+    regressions = []
+    for route, stats in sorted(routes.items()):
+        if stats["count"] < minSamples:
+            continue
+        if route not in baseline:
+            regressions.append((route, stats["p95"], None))
+            continue
+        limit = baseline[route]["p95"] * (1 + tolerance) + slackMs
+        if stats["p95"] > limit:
+            regressions.append((route, stats["p95"], limit))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run a local load test against Fyyur.')
+    parser.add_argument('--database-url', default=os.environ.get('LOADTEST_DATABASE_URL'),
+                        help='database to seed and serve from (default: a temporary sqlite file)')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=20.0, help='seconds of traffic')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--venues', type=int, default=200)
+    parser.add_argument('--artists', type=int, default=400)
+    parser.add_argument('--shows', type=int, default=4000)
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed relative p95 regression over the baseline')
+    parser.add_argument('--slack-ms', type=float, default=5.0,
+                        help='absolute p95 slack so tiny routes do not flap')
+    parser.add_argument('--min-samples', type=int, default=20,
+                        help='routes with fewer requests are not compared to the baseline')
+    parser.add_argument('--max-error-rate', type=float, default=0.01)
+    parser.add_argument('--update-baseline', action='store_true')
+    parser.add_argument('--force', action='store_true',
+                        help='drop and re-seed a database that is not a temporary sqlite file')
+    args = parser.parse_args(argv)
+
+    databaseUrl = args.database_url
+    if not databaseUrl:
+        databaseUrl = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='fyyur-loadtest-'), 'fyyur.db')
+    elif not args.force and not is_scratch_database(databaseUrl):
+        print('refusing to drop %s: the load test wipes its database. Use a temporary sqlite file '
+              'or pass --force.' % databaseUrl)
+        return 2
+    # config.py reads DATABASE_URL at import time
+    os.environ['DATABASE_URL'] = databaseUrl
+    # every simulated user shares one address; measure the routes, not the limiter
+    os.environ['RATELIMIT_ENABLED'] = '0'
+    # keep the synthetic traffic out of the recorded access stats
+    os.environ['ACCESS_STATS_DIR'] = tempfile.mkdtemp(prefix='fyyur-loadtest-stats-')
+
+    from app import app, db
+    from schema import create_schema
+    from seed import seed, CITY_LOCATIONS
+    with app.app_context():
+        db.drop_all()
+        with db.engine.begin() as conn:
+            create_schema(conn, db.metadata, app.config['SHOW_PARTITION_MONTHS_AHEAD'])
+        venueIds, artistIds = seed(args.venues, args.artists, args.shows)
+
+    server = start_server(app, args.port)
+    baseUrl = 'http://127.0.0.1:%d' % args.port
+    mix = build_mix(venueIds, artistIds, CITY_LOCATIONS)
+    recorder = Recorder()
+    started = time.time()
+    deadline = started + args.duration
+    threads = [threading.Thread(target=worker, args=(baseUrl, mix, deadline, recorder, i))
+               for i in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - started
+    server.shutdown()
+
+    routes = recorder.summary()
+    total = sum(stats["count"] for stats in routes.values())
+    errors = sum(stats["errors"] for stats in routes.values())
+    print('%-32s %7s %6s %9s %9s %9s' % ('route', 'count', 'errors', 'p50 ms', 'p95 ms', 'p99 ms'))
+    for route, stats in sorted(routes.items()):
+        print('%-32s %7d %6d %9.1f %9.1f %9.1f' % (route, stats["count"], stats["errors"],
+                                                   stats["p50"], stats["p95"], stats["p99"]))
+    print('%d requests in %.1fs: %.1f req/s, %d errors (concurrency %d)'
+          % (total, elapsed, total / elapsed, errors, args.concurrency))
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as baselineFile:
+            json.dump(routes, baselineFile, indent=2, sort_keys=True)
+        print('baseline written to ' + args.baseline)
+        return 0
+
+    failed = False
+    if total and float(errors) / total > args.max_error_rate:
+        print('FAIL: error rate %.2f%% above %.2f%%' % (100.0 * errors / total, 100.0 * args.max_error_rate))
+        failed = True
+    if not os.path.exists(args.baseline):
+        print('FAIL: no baseline at %s; run with --update-baseline on this machine to record one'
+              % args.baseline)
+        return 1
+    with open(args.baseline) as baselineFile:
+        baseline = json.load(baselineFile)
+    for route, p95, limit in compare(routes, baseline, args.tolerance, args.slack_ms, args.min_samples):
+        if limit is None:
+            print('FAIL: %s has no baseline; run with --update-baseline to record it' % route)
+        else:
+            print('FAIL: %s p95 %.1f ms exceeds baseline limit %.1f ms' % (route, p95, limit))
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
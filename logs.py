@@ -0,0 +1,108 @@
+# ----------------------------------------------------------------------------#
+# Application logging.
+#
+# Records are handed to a bounded in-memory queue and written to a rotating
+# file by a background QueueListener thread, so a slow disk never blocks a
+# request. When the queue is full new records are dropped and counted
+# rather than waited on. Every request also gets one structured access
+# record carrying route, status and latency, written once the response body
+# has been sent so streamed pages report their full time.
+# ----------------------------------------------------------------------------#
+
+import atexit
+import json
+import logging
+import queue
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+
+from flask import g, request
+from flask.logging import default_handler
+
+# attributes of a plain LogRecord; everything else was passed via extra=
+RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record, '%Y-%m-%dT%H:%M:%S'),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class DroppingQueueHandler(QueueHandler):
+    # never blocks the calling thread: records that don't fit are dropped
+
+    def __init__(self, logQueue):
+        QueueHandler.__init__(self, logQueue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def build_file_handler(config):
+    if config.get('LOG_ROTATE_WHEN'):
+        handler = TimedRotatingFileHandler(config['LOG_FILE'], when=config['LOG_ROTATE_WHEN'],
+                                           backupCount=config['LOG_BACKUP_COUNT'], delay=True)
+    else:
+        handler = RotatingFileHandler(config['LOG_FILE'], maxBytes=config['LOG_MAX_BYTES'],
+                                      backupCount=config['LOG_BACKUP_COUNT'], delay=True)
+    handler.setFormatter(JsonFormatter())
+    return handler
+
+
+def configure_logging(app):
+    level = logging.getLevelName(str(app.config.get('LOG_LEVEL', 'INFO')).upper())
+    logQueue = queue.Queue(maxsize=app.config.get('LOG_QUEUE_SIZE', 10000))
+    fileHandler = build_file_handler(app.config)
+    fileHandler.setLevel(level)
+    listener = QueueListener(logQueue, fileHandler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    queueHandler = DroppingQueueHandler(logQueue)
+    queueHandler.setLevel(level)
+    app.logger.setLevel(level)
+    # flask's default handler writes synchronously to stderr
+    app.logger.removeHandler(default_handler)
+    app.logger.addHandler(queueHandler)
+    app.extensions['log_queue_handler'] = queueHandler
+
+    @app.before_request
+    def start_request_timer():
+        g.requestStarted = time.perf_counter()
+
+    @app.after_request
+    def log_request(response):
+        started = g.get('requestStarted')
+        if started is not None:
+            # the request context may be gone when the response closes
+            message = (request.method, request.path, response.status_code)
+            record = {
+                "route": request.url_rule.rule if request.url_rule else None,
+                "endpoint": request.endpoint,
+                "method": request.method,
+                "status": response.status_code,
+            }
+
+            def write_record():
+                record["latency_ms"] = round((time.perf_counter() - started) * 1000, 2)
+                app.logger.info('%s %s %s', *message, extra=record)
+            response.call_on_close(write_record)
+        return response
+
+    return listener
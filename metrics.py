@@ -0,0 +1,387 @@
+# ----------------------------------------------------------------------------#
+# Prometheus metrics.
+#
+# Request counts and latency per endpoint, template render time, SQL query
+# counts and time, connection pool usage and cache hit ratios, exposed at
+# /metrics in the Prometheus text format.
+#
+# Samples are kept in process memory behind one lock. When METRICS_DIR is
+# set, each worker process also writes its samples to METRICS_DIR/<pid>.json
+# from a background thread every METRICS_FLUSH_INTERVAL seconds, and
+# /metrics sums the files, so any worker can answer a scrape for the whole
+# server. As with prometheus_client's multiprocess mode, a worker that exits
+# keeps counting: its last counters and histograms are folded into
+# METRICS_DIR/archive.json - at exit, or by the next scrape when it was
+# killed - and its own file is removed. Only its gauges go away.
+# ----------------------------------------------------------------------------#
+
+import atexit
+import fcntl
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Response, has_request_context, request
+from jinja2 import Template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HELP = {
+    'fyyur_http_requests_total': ('counter', 'HTTP requests by endpoint, method and status.'),
+    'fyyur_http_request_duration_seconds': ('histogram', 'HTTP request latency by endpoint.'),
+    'fyyur_template_render_seconds': ('histogram', 'Jinja template render time by template.'),
+    'fyyur_db_queries_total': ('counter', 'SQL statements executed by endpoint.'),
+    'fyyur_db_query_duration_seconds': ('histogram', 'SQL statement execution time by endpoint.'),
+    'fyyur_db_pool_size': ('gauge', 'Configured connection pool size.'),
+    'fyyur_db_pool_checked_out': ('gauge', 'Connections currently checked out of the pool.'),
+    'fyyur_db_pool_overflow': ('gauge', 'Connections currently open beyond the pool size.'),
+    'fyyur_cache_requests_total': ('counter', 'Cache lookups by cache and result (hit or miss).'),
+    'fyyur_cache_hit_ratio': ('gauge', 'Cache hits over lookups since start.'),
+}
+
+
+class Registry(object):
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.gauges = {}
+
+    def inc(self, name, labels, value=1):
+        key = (name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        key = (name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [0] * len(BUCKETS) + [0.0, 0]
+            for i, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    histogram[i] += 1
+                    break
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    def set(self, name, labels, value):
+        with self.lock:
+            self.gauges[(name, labels)] = value
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "counters": [[name, labels, value] for (name, labels), value in self.counters.items()],
+                "histograms": [[name, labels, list(values)] for (name, labels), values in self.histograms.items()],
+                "gauges": [[name, labels, value] for (name, labels), value in self.gauges.items()],
+            }
+
+
+registry = Registry()
+
+
+def labels(**values):
+    return tuple(sorted(values.items()))
+
+
+def current_endpoint():
+    if has_request_context():
+        return request.endpoint or 'unmatched'
+    return 'none'
+
+
+def record_cache(cache, hit):
+    # called by the caches on every lookup
+    registry.inc('fyyur_cache_requests_total', labels(cache=cache, result='hit' if hit else 'miss'))
+
+
+#  Collection
+#  ----------------------------------------------------------------
+
+class TimedTemplate(Template):
+
+    def render(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return Template.render(self, *args, **kwargs)
+        finally:
+            registry.observe('fyyur_template_render_seconds', labels(template=self.name or 'string'),
+                             time.perf_counter() - started)
+
+    def generate(self, *args, **kwargs):
+        # what stream() renders with; only the time spent producing chunks
+        # counts, not the time the page waits on the client between them
+        elapsed = 0.0
+        started = time.perf_counter()
+        try:
+            for chunk in Template.generate(self, *args, **kwargs):
+                elapsed += time.perf_counter() - started
+                yield chunk
+                started = time.perf_counter()
+            elapsed += time.perf_counter() - started
+        finally:
+            registry.observe('fyyur_template_render_seconds', labels(template=self.name or 'string'), elapsed)
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def record_query(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_started'].pop()
+    endpoint = labels(endpoint=current_endpoint())
+    registry.inc('fyyur_db_queries_total', endpoint)
+    registry.observe('fyyur_db_query_duration_seconds', endpoint, elapsed)
+
+
+def collect_pool(db):
+    pool = db.engine.pool
+    for name, attribute in (('fyyur_db_pool_size', 'size'),
+                            ('fyyur_db_pool_checked_out', 'checkedout'),
+                            ('fyyur_db_pool_overflow', 'overflow')):
+        # sqlite's SingletonThreadPool/StaticPool have no counters
+        if hasattr(pool, attribute):
+            registry.set(name, (), getattr(pool, attribute)())
+
+
+def collect_cache_ratios(samples):
+    lookups = {}
+    for name, labelPairs, value in samples["counters"]:
+        if name == 'fyyur_cache_requests_total':
+            values = dict(labelPairs)
+            hits, total = lookups.get(values['cache'], (0, 0))
+            lookups[values['cache']] = (hits + (value if values['result'] == 'hit' else 0), total + value)
+    for cache, (hits, total) in lookups.items():
+        samples["gauges"].append(['fyyur_cache_hit_ratio', labels(cache=cache), float(hits) / total if total else 0.0])
+
+
+#  Multi-process aggregation
+#  ----------------------------------------------------------------
+
+ARCHIVE = 'archive.json'
+
+
+def load(path):
+    with open(path) as snapshotFile:
+        return json.load(snapshotFile)
+
+
+def save(path, snapshot):
+    temporary = '%s.%d.tmp' % (path, threading.get_ident())
+    with open(temporary, 'w') as snapshotFile:
+        json.dump(snapshot, snapshotFile)
+    os.replace(temporary, path)
+
+
+def flush(directory):
+    save(os.path.join(directory, '%d.json' % os.getpid()), registry.snapshot())
+
+
+def alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # someone else's process
+        return True
+    return True
+
+
+@contextmanager
+def locked(directory):
+    # one worker at a time folds files into the archive and reads it
+    with open(os.path.join(directory, 'archive.lock'), 'a') as lockFile:
+        fcntl.flock(lockFile, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lockFile, fcntl.LOCK_UN)
+
+
+def archive(directory, paths):
+    # call holding locked(directory)
+    archivePath = os.path.join(directory, ARCHIVE)
+    snapshots = []
+    for path in paths + [archivePath]:
+        try:
+            snapshots.append(load(path))
+        except (OSError, ValueError):
+            continue
+    merged = merge(snapshots)
+    # the pool gauges of an exited worker describe nothing anymore
+    merged["gauges"] = []
+    save(archivePath, merged)
+    for path in paths:
+        os.remove(path)
+
+
+def retire(directory):
+    # at exit: the worker's final totals go to the archive
+    flush(directory)
+    with locked(directory):
+        archive(directory, [os.path.join(directory, '%d.json' % os.getpid())])
+
+
+def merge(snapshots):
+    counters, histograms, gauges = {}, {}, {}
+    for snapshot in snapshots:
+        for name, labelPairs, value in snapshot["counters"]:
+            key = (name, tuple(tuple(pair) for pair in labelPairs))
+            counters[key] = counters.get(key, 0) + value
+        for name, labelPairs, values in snapshot["histograms"]:
+            key = (name, tuple(tuple(pair) for pair in labelPairs))
+            merged = histograms.setdefault(key, [0] * len(values))
+            for i, value in enumerate(values):
+                merged[i] += value
+        for name, labelPairs, value in snapshot["gauges"]:
+            key = (name, tuple(tuple(pair) for pair in labelPairs))
+            gauges[key] = gauges.get(key, 0) + value
+    return {
+        "counters": [[name, labelPairs, value] for (name, labelPairs), value in counters.items()],
+        "histograms": [[name, labelPairs, values] for (name, labelPairs), values in histograms.items()],
+        "gauges": [[name, labelPairs, value] for (name, labelPairs), value in gauges.items()],
+    }
+
+
+def read_snapshots(directory):
+    snapshots, exited = [], []
+    with locked(directory):
+        for fileName in os.listdir(directory):
+            pid, extension = os.path.splitext(fileName)
+            if extension != '.json' or not pid.isdigit():
+                continue
+            path = os.path.join(directory, fileName)
+            if not alive(int(pid)):
+                # killed before it could archive its totals itself
+                exited.append(path)
+                continue
+            try:
+                snapshots.append(load(path))
+            except (OSError, ValueError):
+                continue
+        if exited:
+            archive(directory, exited)
+        try:
+            snapshots.append(load(os.path.join(directory, ARCHIVE)))
+        except (OSError, ValueError):
+            pass
+    return snapshots
+
+
+#  Exposition
+#  ----------------------------------------------------------------
+
+def format_labels(labelPairs, extra=()):
+    pairs = list(labelPairs) + list(extra)
+    if not pairs:
+        return ''
+    escaped = ['%s="%s"' % (key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+               for key, value in pairs]
+    return '{' + ','.join(escaped) + '}'
+
+
+def render(samples):
+    byName = {}
+    for kind in ('counters', 'histograms', 'gauges'):
+        for name, labelPairs, value in samples[kind]:
+            byName.setdefault(name, []).append((labelPairs, value))
+
+    lines = []
+    for name in sorted(byName):
+        kind, description = HELP.get(name, ('untyped', name))
+        lines.append('# HELP %s %s' % (name, description))
+        lines.append('# TYPE %s %s' % (name, kind))
+        for labelPairs, value in sorted(byName[name], key=lambda sample: str(sample[0])):
+            if kind != 'histogram':
+                lines.append('%s%s %s' % (name, format_labels(labelPairs), value))
+                continue
+            cumulative = 0
+            for bound, count in zip(BUCKETS, value):
+                cumulative += count
+                lines.append('%s_bucket%s %d' % (name, format_labels(labelPairs, [('le', bound)]), cumulative))
+            lines.append('%s_bucket%s %d' % (name, format_labels(labelPairs, [('le', '+Inf')]), value[-1]))
+            lines.append('%s_sum%s %s' % (name, format_labels(labelPairs), value[-2]))
+            lines.append('%s_count%s %d' % (name, format_labels(labelPairs), value[-1]))
+    return '\n'.join(lines) + '\n'
+
+
+def init_metrics(app, db):
+    directory = app.config.get('METRICS_DIR')
+    interval = app.config.get('METRICS_FLUSH_INTERVAL', 5)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    state = {"pid": None, "retired": False}
+    flushLock = threading.Lock()
+    app.jinja_env.template_class = TimedTemplate
+
+    def flush_now():
+        with flushLock:
+            # nothing may recreate the file once it is archived
+            if not state["retired"]:
+                with app.app_context():
+                    collect_pool(db)
+                flush(directory)
+
+    def run_flusher():
+        while not state["retired"]:
+            time.sleep(interval)
+            try:
+                flush_now()
+            except Exception:
+                app.logger.exception('metrics flush failed')
+
+    def retire_worker():
+        with flushLock:
+            if not state["retired"]:
+                state["retired"] = True
+                retire(directory)
+    app.extensions['metrics'] = retire_worker
+
+    @app.before_request
+    def start_metrics_timer():
+        request.environ['fyyur.started'] = time.perf_counter()
+        if directory and state["pid"] != os.getpid():
+            # started by the first request, so each worker forked from a
+            # preloading master gets a flusher of its own
+            with flushLock:
+                if state["pid"] != os.getpid():
+                    state["pid"] = os.getpid()
+                    threading.Thread(target=run_flusher, name='metrics', daemon=True).start()
+                    atexit.register(retire_worker)
+
+    @app.after_request
+    def record_request(response):
+        started = request.environ.get('fyyur.started')
+        if started is not None:
+            endpoint = current_endpoint()
+            registry.inc('fyyur_http_requests_total',
+                         labels(endpoint=endpoint, method=request.method, status=response.status_code))
+
+            # once the body has been sent: a streamed page is rendered after
+            # this hook returns
+            def record_duration():
+                registry.observe('fyyur_http_request_duration_seconds', labels(endpoint=endpoint),
+                                 time.perf_counter() - started)
+            response.call_on_close(record_duration)
+        return response
+
+    def metrics_view():
+        collect_pool(db)
+        if directory:
+            flush_now()
+            samples = merge(read_snapshots(directory))
+        else:
+            samples = registry.snapshot()
+        collect_cache_ratios(samples)
+        return Response(render(samples), mimetype='text/plain; version=0.0.4')
+
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
@@ -85,9 +85,7 @@ def run_migrations_online():
                 directives[:] = []
                 logger.info('No changes in schema detected.')
 
-    connectable = get_engine()
-
-    with connectable.connect() as connection:
+    def run(connection):
         context.configure(
             connection=connection,
             target_metadata=get_metadata(),
@@ -98,6 +96,15 @@ def run_migrations_online():
         with context.begin_transaction():
             context.run_migrations()
 
+    # `flask schema verify` migrates a scratch database over its own connection
+    connection = config.attributes.get('connection')
+    if connection is not None:
+        run(connection)
+        return
+
+    with get_engine().connect() as connection:
+        run(connection)
+
 
 if context.is_offline_mode():
     run_migrations_offline()
@@ -1,38 +0,0 @@
-"""empty message
-
-Revision ID: 0ba8f509adf7
-Revises: 37be2c225209
-Create Date: 2023-02-02 16:15:49.959124
-
-"""
-from alembic import op
-import sqlalchemy as sa
-from sqlalchemy.dialects import postgresql
-
-# revision identifiers, used by Alembic.
-revision = '0ba8f509adf7'
-down_revision = '37be2c225209'
-branch_labels = None
-depends_on = None
-
-
-def upgrade():
-    # ### commands auto generated by Alembic - please adjust! ###
-    with op.batch_alter_table('Show', schema=None) as batch_op:
-        batch_op.alter_column('start_time',
-               existing_type=postgresql.TIMESTAMP(),
-               type_=sa.String(),
-               existing_nullable=True)
-
-    # ### end Alembic commands ###
-
-
-def downgrade():
-    # ### commands auto generated by Alembic - please adjust! ###
-    with op.batch_alter_table('Show', schema=None) as batch_op:
-        batch_op.alter_column('start_time',
-               existing_type=sa.String(),
-               type_=postgresql.TIMESTAMP(),
-               existing_nullable=True)
-
-    # ### end Alembic commands ###
@@ -1,38 +0,0 @@
-"""empty message
-
-Revision ID: 0d619bc3af52
-Revises: 8671d4a585cf
-Create Date: 2023-02-02 14:20:53.531711
-
-"""
-from alembic import op
-import sqlalchemy as sa
-
-
-# revision identifiers, used by Alembic.
-revision = '0d619bc3af52'
-down_revision = '8671d4a585cf'
-branch_labels = None
-depends_on = None
-
-
-def upgrade():
-    # ### commands auto generated by Alembic - please adjust! ###
-    op.create_table('Show',
-    sa.Column('id', sa.Integer(), nullable=False),
-    sa.Column('name', sa.String(), nullable=True),
-    sa.Column('date', sa.Date(), nullable=True),
-    sa.Column('time', sa.Time(), nullable=True),
-    sa.Column('artist_id', sa.Integer(), nullable=False),
-    sa.Column('venue_id', sa.Integer(), nullable=False),
-    sa.ForeignKeyConstraint(['artist_id'], ['Artist.id'], ),
-    sa.ForeignKeyConstraint(['venue_id'], ['Venue.id'], ),
-    sa.PrimaryKeyConstraint('id')
-    )
-    # ### end Alembic commands ###
-
-
-def downgrade():
-    # ### commands auto generated by Alembic - please adjust! ###
-    op.drop_table('Show')
-    # ### end Alembic commands ###
@@ -1,32 +0,0 @@
-"""empty message
-
-Revision ID: 3d0b6bfb3eef
-Revises: f60933129eb2
-Create Date: 2023-02-02 18:03:52.622505
-
-"""
-from alembic import op
-import sqlalchemy as sa
-
-
-# revision identifiers, used by Alembic.
-revision = '3d0b6bfb3eef'
-down_revision = 'f60933129eb2'
-branch_labels = None
-depends_on = None
-
-
-def upgrade():
-    # ### commands auto generated by Alembic - please adjust! ###
-    with op.batch_alter_table('Artist', schema=None) as batch_op:
-        batch_op.add_column(sa.Column('seeking_description', sa.String(), nullable=True))
-
-    # ### end Alembic commands ###
-
-
-def downgrade():
-    # ### commands auto generated by Alembic - please adjust! ###
-    with op.batch_alter_table('Artist', schema=None) as batch_op:
-        batch_op.drop_column('seeking_description')
-
-    # ### end Alembic commands ###
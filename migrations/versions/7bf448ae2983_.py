@@ -1,7 +1,13 @@
-"""empty message
+"""squashed baseline: Venue, Artist and Show
+
+Replaces the eleven revisions from 7c0fd2a19ba5 through 7bf448ae2983 and
+keeps the id of the last one, so databases already at that revision (or
+any later one) need nothing. A database at one of the replaced revisions
+must first be upgraded to 7bf448ae2983 with a release from before the
+squash.
 
 Revision ID: 7bf448ae2983
-Revises: d5121ba936c1
+Revises:
 Create Date: 2023-02-02 21:44:51.967464
 
 """
@@ -11,22 +17,55 @@ import sqlalchemy as sa
 
 # revision identifiers, used by Alembic.
 revision = '7bf448ae2983'
-down_revision = 'd5121ba936c1'
+down_revision = None
 branch_labels = None
 depends_on = None
 
 
 def upgrade():
-    # ### commands auto generated by Alembic - please adjust! ###
-    with op.batch_alter_table('Venue', schema=None) as batch_op:
-        batch_op.add_column(sa.Column('seeking_description', sa.String(), nullable=True))
-
-    # ### end Alembic commands ###
+    op.create_table('Artist',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=True),
+    sa.Column('city', sa.String(length=120), nullable=True),
+    sa.Column('state', sa.String(length=120), nullable=True),
+    sa.Column('phone', sa.String(length=120), nullable=True),
+    sa.Column('genres', sa.String(length=120), nullable=True),
+    sa.Column('image_link', sa.String(length=500), nullable=True),
+    sa.Column('facebook_link', sa.String(length=120), nullable=True),
+    sa.Column('seeking_venue', sa.Boolean(), nullable=True),
+    sa.Column('website', sa.String(), nullable=True),
+    sa.Column('seeking_description', sa.String(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('Venue',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=True),
+    sa.Column('city', sa.String(length=120), nullable=True),
+    sa.Column('state', sa.String(length=120), nullable=True),
+    sa.Column('address', sa.String(length=120), nullable=True),
+    sa.Column('phone', sa.String(length=120), nullable=True),
+    sa.Column('image_link', sa.String(length=500), nullable=True),
+    sa.Column('facebook_link', sa.String(length=120), nullable=True),
+    sa.Column('genres', sa.String(), nullable=True),
+    sa.Column('website', sa.String(), nullable=True),
+    sa.Column('seeking_talent', sa.Boolean(), nullable=True),
+    sa.Column('seeking_description', sa.String(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('Show',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('artist_id', sa.Integer(), nullable=False),
+    sa.Column('venue_id', sa.Integer(), nullable=False),
+    sa.Column('start_time', sa.String(), nullable=True),
+    # the names postgres gave the original constraints; 5e8b3f61c2d4 drops
+    # them by name
+    sa.ForeignKeyConstraint(['artist_id'], ['Artist.id'], name='Show_artist_id_fkey'),
+    sa.ForeignKeyConstraint(['venue_id'], ['Venue.id'], name='Show_venue_id_fkey'),
+    sa.PrimaryKeyConstraint('id')
+    )
 
 
 def downgrade():
-    # ### commands auto generated by Alembic - please adjust! ###
-    with op.batch_alter_table('Venue', schema=None) as batch_op:
-        batch_op.drop_column('seeking_description')
-
-    # ### end Alembic commands ###
+    op.drop_table('Show')
+    op.drop_table('Venue')
+    op.drop_table('Artist')
@@ -1,32 +0,0 @@
-"""empty message
-
-Revision ID: 8671d4a585cf
-Revises: 7c0fd2a19ba5
-Create Date: 2023-02-02 12:26:14.784073
-
-"""
-from alembic import op
-import sqlalchemy as sa
-
-
-# revision identifiers, used by Alembic.
-revision = '8671d4a585cf'
-down_revision = '7c0fd2a19ba5'
-branch_labels = None
-depends_on = None
-
-
-def upgrade():
-    # ### commands auto generated by Alembic - please adjust! ###
-    with op.batch_alter_table('Venue', schema=None) as batch_op:
-        batch_op.add_column(sa.Column('genres', sa.String(), nullable=True))
-
-    # ### end Alembic commands ###
-
-
-def downgrade():
-    # ### commands auto generated by Alembic - please adjust! ###
-    with op.batch_alter_table('Venue', schema=None) as batch_op:
-        batch_op.drop_column('genres')
-
-    # ### end Alembic commands ###
@@ -0,0 +1,108 @@
+"""partition Show by month on start_time
+
+Revision ID: 9d4e2c1b7a08
+Revises: 2f7a6b0d9e31
+Create Date: 2026-10-19 14:10:12.530914
+
+"""
+from datetime import date
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d4e2c1b7a08'
+down_revision = '2f7a6b0d9e31'
+branch_labels = None
+depends_on = None
+
+MONTHS_AHEAD = 3
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def upgrade():
+    conn = op.get_bind()
+    if conn.dialect.name != 'postgresql':
+        # no partitioning elsewhere; start_time becomes required all the same
+        # and moves next to id, as in the partitioned table
+        op.execute('UPDATE "Show" SET start_time = \'1970-01-01 00:00:00\' WHERE start_time IS NULL')
+        with op.batch_alter_table('Show', schema=None,
+                                  partial_reordering=[('id', 'start_time', 'artist_id', 'venue_id')]) as batch_op:
+            batch_op.alter_column('start_time', existing_type=sa.String(), nullable=False)
+        return
+    op.execute('ALTER TABLE "Show" RENAME TO "Show_unpartitioned"')
+    op.execute('ALTER INDEX "Show_pkey" RENAME TO "Show_unpartitioned_pkey"')
+    op.execute('ALTER INDEX "ix_Show_venue_id_start_time" RENAME TO "ix_Show_unpartitioned_venue_id_start_time"')
+    op.execute('ALTER INDEX "ix_Show_artist_id_start_time" RENAME TO "ix_Show_unpartitioned_artist_id_start_time"')
+    # keep the id sequence alive when the old table is dropped
+    op.execute('ALTER SEQUENCE "Show_id_seq" OWNED BY NONE')
+
+    op.execute('''
+        CREATE TABLE "Show" (
+            id integer NOT NULL DEFAULT nextval('"Show_id_seq"'::regclass),
+            start_time varchar NOT NULL,
+            artist_id integer NOT NULL REFERENCES "Artist" (id) ON DELETE CASCADE,
+            venue_id integer NOT NULL REFERENCES "Venue" (id) ON DELETE CASCADE,
+            PRIMARY KEY (id, start_time)
+        ) PARTITION BY RANGE (start_time)
+    ''')
+    op.execute('CREATE TABLE "Show_default" PARTITION OF "Show" DEFAULT')
+
+    # one partition per month from the oldest show through MONTHS_AHEAD
+    # months from now
+    oldest = conn.execute(sa.text('SELECT min(start_time) FROM "Show_unpartitioned"')).scalar()
+    month = date.today().replace(day=1)
+    if oldest:
+        month = min(month, date(int(oldest[:4]), int(oldest[5:7]), 1))
+    last = add_months(date.today().replace(day=1), MONTHS_AHEAD)
+    while month <= last:
+        op.execute('CREATE TABLE "Show_y%04dm%02d" PARTITION OF "Show" FOR VALUES FROM (\'%s\') TO (\'%s\')'
+                   % (month.year, month.month, month.isoformat(), add_months(month, 1).isoformat()))
+        month = add_months(month, 1)
+
+    op.execute('CREATE INDEX "ix_Show_venue_id_start_time" ON "Show" (venue_id, start_time)')
+    op.execute('CREATE INDEX "ix_Show_artist_id_start_time" ON "Show" (artist_id, start_time)')
+
+    op.execute('''
+        INSERT INTO "Show" (id, start_time, artist_id, venue_id)
+        SELECT id, coalesce(start_time, '1970-01-01 00:00:00'), artist_id, venue_id
+        FROM "Show_unpartitioned"
+    ''')
+    op.execute('DROP TABLE "Show_unpartitioned"')
+    op.execute('ALTER SEQUENCE "Show_id_seq" OWNED BY "Show".id')
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        with op.batch_alter_table('Show', schema=None) as batch_op:
+            batch_op.alter_column('start_time', existing_type=sa.String(), nullable=True)
+        return
+    op.execute('ALTER TABLE "Show" RENAME TO "Show_partitioned"')
+    op.execute('ALTER INDEX "Show_pkey" RENAME TO "Show_partitioned_pkey"')
+    op.execute('ALTER INDEX "ix_Show_venue_id_start_time" RENAME TO "ix_Show_partitioned_venue_id_start_time"')
+    op.execute('ALTER INDEX "ix_Show_artist_id_start_time" RENAME TO "ix_Show_partitioned_artist_id_start_time"')
+    op.execute('ALTER SEQUENCE "Show_id_seq" OWNED BY NONE')
+
+    op.execute('''
+        CREATE TABLE "Show" (
+            id integer NOT NULL DEFAULT nextval('"Show_id_seq"'::regclass) PRIMARY KEY,
+            start_time varchar,
+            artist_id integer NOT NULL,
+            venue_id integer NOT NULL,
+            CONSTRAINT "Show_artist_id_fkey" FOREIGN KEY (artist_id) REFERENCES "Artist" (id) ON DELETE CASCADE,
+            CONSTRAINT "Show_venue_id_fkey" FOREIGN KEY (venue_id) REFERENCES "Venue" (id) ON DELETE CASCADE
+        )
+    ''')
+    op.execute('''
+        INSERT INTO "Show" (id, start_time, artist_id, venue_id)
+        SELECT id, start_time, artist_id, venue_id FROM "Show_partitioned"
+    ''')
+    op.execute('DROP TABLE "Show_partitioned"')
+    op.execute('ALTER SEQUENCE "Show_id_seq" OWNED BY "Show".id')
+    op.execute('CREATE INDEX "ix_Show_venue_id_start_time" ON "Show" (venue_id, start_time)')
+    op.execute('CREATE INDEX "ix_Show_artist_id_start_time" ON "Show" (artist_id, start_time)')
@@ -1,8 +1,8 @@
-"""empty message
+"""add show calendar indexes
 
-Revision ID: 37be2c225209
-Revises: d1e0e2249287
-Create Date: 2023-02-02 14:29:04.135709
+Revision ID: a41c2e9d7f10
+Revises: 7bf448ae2983
+Create Date: 2026-10-19 09:12:31.402117
 
 """
 from alembic import op
@@ -10,8 +10,8 @@ import sqlalchemy as sa
 
 
 # revision identifiers, used by Alembic.
-revision = '37be2c225209'
-down_revision = 'd1e0e2249287'
+revision = 'a41c2e9d7f10'
+down_revision = '7bf448ae2983'
 branch_labels = None
 depends_on = None
 
@@ -19,7 +19,8 @@ depends_on = None
 def upgrade():
     # ### commands auto generated by Alembic - please adjust! ###
     with op.batch_alter_table('Show', schema=None) as batch_op:
-        batch_op.drop_column('name')
+        batch_op.create_index('ix_Show_artist_id_start_time', ['artist_id', 'start_time'], unique=False)
+        batch_op.create_index('ix_Show_venue_id_start_time', ['venue_id', 'start_time'], unique=False)
 
     # ### end Alembic commands ###
 
@@ -27,6 +28,7 @@ def upgrade():
 def downgrade():
     # ### commands auto generated by Alembic - please adjust! ###
     with op.batch_alter_table('Show', schema=None) as batch_op:
-        batch_op.add_column(sa.Column('name', sa.VARCHAR(), autoincrement=False, nullable=True))
+        batch_op.drop_index('ix_Show_venue_id_start_time')
+        batch_op.drop_index('ix_Show_artist_id_start_time')
 
     # ### end Alembic commands ###
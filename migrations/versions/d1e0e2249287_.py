@@ -1,36 +0,0 @@
-"""empty message
-
-Revision ID: d1e0e2249287
-Revises: 0d619bc3af52
-Create Date: 2023-02-02 14:25:27.464705
-
-"""
-from alembic import op
-import sqlalchemy as sa
-from sqlalchemy.dialects import postgresql
-
-# revision identifiers, used by Alembic.
-revision = 'd1e0e2249287'
-down_revision = '0d619bc3af52'
-branch_labels = None
-depends_on = None
-
-
-def upgrade():
-    # ### commands auto generated by Alembic - please adjust! ###
-    with op.batch_alter_table('Show', schema=None) as batch_op:
-        batch_op.add_column(sa.Column('start_time', sa.DateTime(), nullable=True))
-        batch_op.drop_column('date')
-        batch_op.drop_column('time')
-
-    # ### end Alembic commands ###
-
-
-def downgrade():
-    # ### commands auto generated by Alembic - please adjust! ###
-    with op.batch_alter_table('Show', schema=None) as batch_op:
-        batch_op.add_column(sa.Column('time', postgresql.TIME(), autoincrement=False, nullable=True))
-        batch_op.add_column(sa.Column('date', sa.DATE(), autoincrement=False, nullable=True))
-        batch_op.drop_column('start_time')
-
-    # ### end Alembic commands ###
@@ -1,34 +0,0 @@
-"""empty message
-
-Revision ID: d5121ba936c1
-Revises: 3d0b6bfb3eef
-Create Date: 2023-02-02 20:46:42.280777
-
-"""
-from alembic import op
-import sqlalchemy as sa
-
-
-# revision identifiers, used by Alembic.
-revision = 'd5121ba936c1'
-down_revision = '3d0b6bfb3eef'
-branch_labels = None
-depends_on = None
-
-
-def upgrade():
-    # ### commands auto generated by Alembic - please adjust! ###
-    with op.batch_alter_table('Venue', schema=None) as batch_op:
-        batch_op.add_column(sa.Column('website', sa.String(), nullable=True))
-        batch_op.add_column(sa.Column('seeking_talent', sa.Boolean(), nullable=True))
-
-    # ### end Alembic commands ###
-
-
-def downgrade():
-    # ### commands auto generated by Alembic - please adjust! ###
-    with op.batch_alter_table('Venue', schema=None) as batch_op:
-        batch_op.drop_column('seeking_talent')
-        batch_op.drop_column('website')
-
-    # ### end Alembic commands ###
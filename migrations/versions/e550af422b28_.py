@@ -1,32 +0,0 @@
-"""empty message
-
-Revision ID: e550af422b28
-Revises: 0ba8f509adf7
-Create Date: 2023-02-02 17:49:28.318636
-
-"""
-from alembic import op
-import sqlalchemy as sa
-
-
-# revision identifiers, used by Alembic.
-revision = 'e550af422b28'
-down_revision = '0ba8f509adf7'
-branch_labels = None
-depends_on = None
-
-
-def upgrade():
-    # ### commands auto generated by Alembic - please adjust! ###
-    with op.batch_alter_table('Artist', schema=None) as batch_op:
-        batch_op.add_column(sa.Column('seeking_venue', sa.Boolean(), nullable=True))
-
-    # ### end Alembic commands ###
-
-
-def downgrade():
-    # ### commands auto generated by Alembic - please adjust! ###
-    with op.batch_alter_table('Artist', schema=None) as batch_op:
-        batch_op.drop_column('seeking_venue')
-
-    # ### end Alembic commands ###
@@ -1,32 +0,0 @@
-"""empty message
-
-Revision ID: f60933129eb2
-Revises: e550af422b28
-Create Date: 2023-02-02 17:58:16.289447
-
-"""
-from alembic import op
-import sqlalchemy as sa
-
-
-# revision identifiers, used by Alembic.
-revision = 'f60933129eb2'
-down_revision = 'e550af422b28'
-branch_labels = None
-depends_on = None
-
-
-def upgrade():
-    # ### commands auto generated by Alembic - please adjust! ###
-    with op.batch_alter_table('Artist', schema=None) as batch_op:
-        batch_op.add_column(sa.Column('website', sa.String(), nullable=True))
-
-    # ### end Alembic commands ###
-
-
-def downgrade():
-    # ### commands auto generated by Alembic - please adjust! ###
-    with op.batch_alter_table('Artist', schema=None) as batch_op:
-        batch_op.drop_column('website')
-
-    # ### end Alembic commands ###
@@ -0,0 +1,105 @@
+# ----------------------------------------------------------------------------#
+# Show table partitions (postgres only).
+#
+# "Show" is range-partitioned by start_time into one partition per month,
+# named Show_yYYYYmMM, plus a Show_default partition for anything outside
+# them. `flask partitions maintain`, run daily from the scheduler:
+#   - creates the partitions for the current month and the next
+#     SHOW_PARTITION_MONTHS_AHEAD months, moving any rows that landed in
+#     Show_default into them;
+#   - moves partitions older than SHOW_ARCHIVE_AFTER_MONTHS, and their
+#     indexes, to SHOW_ARCHIVE_TABLESPACE. They stay attached, so past
+#     shows on the detail pages keep working.
+# ----------------------------------------------------------------------------#
+
+import re
+from datetime import date
+
+import click
+from sqlalchemy import text
+
+PARTITION_NAME = re.compile(r'^Show_y(\d{4})m(\d{2})$')
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return 'Show_y%04dm%02d' % (month.year, month.month)
+
+
+def list_partitions(conn):
+    # {partition name: tablespace or None}
+    rows = conn.execute(text(
+        'SELECT c.relname, t.spcname FROM pg_inherits i '
+        'JOIN pg_class c ON c.oid = i.inhrelid '
+        'LEFT JOIN pg_tablespace t ON t.oid = c.reltablespace '
+        'WHERE i.inhparent = \'"Show"\'::regclass'))
+    return dict((name, tablespace) for name, tablespace in rows)
+
+
+def create_partition(conn, month):
+    # rows for the month may already sit in Show_default, which would make a
+    # plain CREATE ... PARTITION OF fail; build the table, move them, attach
+    name = partition_name(month)
+    lower, upper = month.isoformat(), add_months(month, 1).isoformat()
+    conn.execute(text('CREATE TABLE "%s" (LIKE "Show" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)' % name))
+    conn.execute(text(
+        'WITH moved AS (DELETE FROM "Show_default" WHERE start_time >= :lower AND start_time < :upper '
+        'RETURNING *) INSERT INTO "%s" SELECT * FROM moved' % name), lower=lower, upper=upper)
+    conn.execute(text('ALTER TABLE "Show" ATTACH PARTITION "%s" FOR VALUES FROM (\'%s\') TO (\'%s\')'
+                      % (name, lower, upper)))
+    return name
+
+
+def ensure_partitions(conn, monthsAhead, today=None):
+    existing = list_partitions(conn)
+    month = (today or date.today()).replace(day=1)
+    created = []
+    for offset in range(monthsAhead + 1):
+        target = add_months(month, offset)
+        if partition_name(target) not in existing:
+            created.append(create_partition(conn, target))
+    return created
+
+
+def archive_partitions(conn, afterMonths, tablespace, today=None):
+    cutoff = add_months((today or date.today()).replace(day=1), -afterMonths)
+    archived = []
+    for name, currentTablespace in sorted(list_partitions(conn).items()):
+        match = PARTITION_NAME.match(name)
+        if not match or currentTablespace == tablespace:
+            continue
+        if date(int(match.group(1)), int(match.group(2)), 1) >= cutoff:
+            continue
+        conn.execute(text('ALTER TABLE "%s" SET TABLESPACE "%s"' % (name, tablespace)))
+        for (indexName,) in conn.execute(text('SELECT indexname FROM pg_indexes WHERE tablename = :name'),
+                                         name=name):
+            conn.execute(text('ALTER INDEX "%s" SET TABLESPACE "%s"' % (indexName, tablespace)))
+        archived.append(name)
+    return archived
+
+
+def init_partitions(app, db):
+
+    @app.cli.group()
+    def partitions():
+        """Manage the monthly Show partitions."""
+
+    @partitions.command()
+    def maintain():
+        """Create upcoming partitions and archive old ones."""
+        engine = db.get_engine(app)
+        if engine.dialect.name != 'postgresql':
+            click.echo('Show is only partitioned on postgres; nothing to do.')
+            return
+        with engine.begin() as conn:
+            for name in ensure_partitions(conn, app.config['SHOW_PARTITION_MONTHS_AHEAD']):
+                click.echo('created ' + name)
+        tablespace = app.config.get('SHOW_ARCHIVE_TABLESPACE')
+        if tablespace:
+            with engine.begin() as conn:
+                for name in archive_partitions(conn, app.config['SHOW_ARCHIVE_AFTER_MONTHS'], tablespace):
+                    click.echo('archived %s to %s' % (name, tablespace))
@@ -0,0 +1,129 @@
+# ----------------------------------------------------------------------------#
+# On-demand request profiling.
+#
+# A request is profiled with cProfile when it carries a token signed with
+# PROFILE_SECRET (X-Profile-Token header or ?__profile= query flag), or when
+# it is picked by PROFILE_SAMPLE_RATE. Results are written as pstats files to
+# PROFILE_DIR/<method>_<route>/ and can be opened with snakeviz or turned
+# into a flamegraph with flameprof/gprof2dot. The X-Profile response header
+# names the file; only the newest PROFILE_MAX_FILES files are kept.
+#
+#   python profiler.py sign /venues/1     # prints a token valid for 10 min
+# ----------------------------------------------------------------------------#
+
+import cProfile
+import hashlib
+import hmac
+import os
+import random
+import re
+import sys
+import time
+import uuid
+
+from werkzeug.exceptions import HTTPException
+
+TOKEN_HEADER = 'HTTP_X_PROFILE_TOKEN'
+TOKEN_PARAM = '__profile='
+
+
+def sign(path, secret, ttl=600):
+    # token = '<expiry>.<hmac(secret, expiry:path)>'
+    expiry = str(int(time.time()) + ttl)
+    digest = hmac.new(secret.encode(), (expiry + ':' + path).encode(), hashlib.sha256).hexdigest()
+    return expiry + '.' + digest
+
+
+def verify(token, path, secret):
+    expiry, _, digest = token.partition('.')
+    if not expiry.isdigit() or int(expiry) < time.time():
+        return False
+    expected = hmac.new(secret.encode(), (expiry + ':' + path).encode(), hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, digest)
+
+
+class ProfilerMiddleware(object):
+
+    def __init__(self, wsgiApp, flaskApp):
+        self.wsgiApp = wsgiApp
+        self.flaskApp = flaskApp
+        self.secret = flaskApp.config.get('PROFILE_SECRET')
+        self.sampleRate = flaskApp.config.get('PROFILE_SAMPLE_RATE', 0.0)
+        self.directory = flaskApp.config.get('PROFILE_DIR', 'profiles')
+        self.maxFiles = flaskApp.config.get('PROFILE_MAX_FILES', 500)
+        # when there is neither a secret nor a sample rate, every request
+        # takes the single attribute check below
+        self.enabled = bool(self.secret) or self.sampleRate > 0
+
+    def __call__(self, environ, start_response):
+        if not self.enabled or not self.wants_profile(environ):
+            return self.wsgiApp(environ, start_response)
+        return self.profile(environ, start_response)
+
+    def wants_profile(self, environ):
+        if self.secret:
+            token = environ.get(TOKEN_HEADER)
+            queryString = environ.get('QUERY_STRING', '')
+            if token is None and TOKEN_PARAM in queryString:
+                token = queryString.split(TOKEN_PARAM, 1)[1].split('&', 1)[0]
+            if token and verify(token, environ.get('PATH_INFO', ''), self.secret):
+                return True
+        return self.sampleRate > 0 and random.random() < self.sampleRate
+
+    def route_key(self, environ):
+        try:
+            rule, _ = self.flaskApp.url_map.bind_to_environ(environ).match(return_rule=True)
+            route = rule.rule
+        except HTTPException:
+            route = 'unmatched'
+        return environ.get('REQUEST_METHOD', 'GET') + '_' + re.sub(r'[^A-Za-z0-9]+', '_', route).strip('_')
+
+    def profile(self, environ, start_response):
+        key = self.route_key(environ)
+        # workers profiling in the same millisecond still get their own file
+        fileName = '%s-%d-%s.prof' % (time.strftime('%Y%m%d-%H%M%S'), os.getpid(), uuid.uuid4().hex[:8])
+        path = os.path.join(self.directory, key or 'root', fileName)
+
+        def profiled_start_response(status, headers, exc_info=None):
+            # the file name only: the server's paths aren't the client's business
+            return start_response(status, headers + [('X-Profile', fileName)], exc_info)
+
+        # the body is drained inside the profile so streamed responses are
+        # measured too; profiling is rare enough to afford the buffering
+        profile = cProfile.Profile()
+        profile.enable()
+        try:
+            result = self.wsgiApp(environ, profiled_start_response)
+            try:
+                body = list(result)
+            finally:
+                if hasattr(result, 'close'):
+                    result.close()
+        finally:
+            profile.disable()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            profile.dump_stats(path)
+            self.prune()
+        return body
+
+    def prune(self):
+        # drops the oldest files once there are more than maxFiles
+        files = []
+        for routeDir in os.scandir(self.directory):
+            if routeDir.is_dir():
+                files.extend(entry for entry in os.scandir(routeDir.path) if entry.name.endswith('.prof'))
+        if len(files) <= self.maxFiles:
+            return
+        files.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in files[:len(files) - self.maxFiles]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                # another worker removed it first
+                pass
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3 or sys.argv[1] != 'sign' or not os.environ.get('PROFILE_SECRET'):
+        sys.exit('usage: PROFILE_SECRET=... python profiler.py sign <path>')
+    print(sign(sys.argv[2], os.environ['PROFILE_SECRET']))
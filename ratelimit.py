@@ -0,0 +1,188 @@
+# ----------------------------------------------------------------------------#
+# Rate limiting and load shedding.
+#
+# Requests are sorted into route groups: 'search' (the search endpoints) and
+# 'write' (every POST and DELETE). Each group has
+#   - a token bucket per client: RATELIMIT_<GROUP>_BURST requests at once,
+#     refilled at RATELIMIT_<GROUP>_RATE requests per second;
+#   - a cap on the requests of the group in flight at the same time,
+#     RATELIMIT_<GROUP>_CONCURRENCY, so a burst of expensive calls from many
+#     clients can't occupy every worker.
+# A request over either limit gets a 429 with Retry-After before any work is
+# done; other routes are never affected. The counters live in a LocalStore
+# (one per worker process) or, with RATELIMIT_BACKEND = 'redis', in redis,
+# shared by every worker; the redis scripts read the clock of the redis
+# server, so workers whose clocks disagree still agree on the counters.
+# ----------------------------------------------------------------------------#
+
+import math
+import threading
+import time
+import uuid
+
+from flask import g, render_template, request
+
+GROUPS = ('search', 'write')
+
+SEARCH_ENDPOINTS = frozenset(['search_venues', 'search_artists', 'search'])
+
+# the current time in seconds on the redis server. Redis before 5 only
+# allows writes after TIME once the script replicates its effects rather
+# than itself
+NOW_SCRIPT = '''
+redis.replicate_commands()
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+'''
+
+TAKE_SCRIPT = NOW_SCRIPT + '''
+local tokens = tonumber(redis.call('HGET', KEYS[1], 'tokens') or ARGV[2])
+local updated = tonumber(redis.call('HGET', KEYS[1], 'updated') or now)
+tokens = math.min(tonumber(ARGV[2]), tokens + (now - updated) * tonumber(ARGV[1]))
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(tonumber(ARGV[2]) / tonumber(ARGV[1])) + 1)
+return {allowed, tostring(tokens)}
+'''
+
+# the slots of a group are a sorted set of holder ids scored by when they
+# were taken, so a slot its worker never released drops out after
+# RATELIMIT_SLOT_TIMEOUT on its own without expiring the slots still held
+ACQUIRE_SCRIPT = NOW_SCRIPT + '''
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - tonumber(ARGV[2]))
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('ZADD', KEYS[1], tostring(now), ARGV[3])
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return 1
+'''
+
+
+def retry_after(tokens, rate):
+    # seconds until the bucket holds a whole token again
+    return max(1, int(math.ceil((1 - tokens) / rate)))
+
+
+class LocalStore(object):
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets = {}
+        self.slots = {}
+
+    def take(self, key, rate, burst):
+        # returns (allowed, seconds to wait when not)
+        now = time.time()
+        with self.lock:
+            tokens, updated = self.buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self.buckets[key] = (tokens, now)
+            if len(self.buckets) > 100000:
+                # drop the buckets that have refilled completely
+                for staleKey in [k for k, (t, u) in self.buckets.items() if now - u > burst / rate]:
+                    del self.buckets[staleKey]
+        return allowed, 0 if allowed else retry_after(tokens, rate)
+
+    def acquire(self, key, limit):
+        # returns the holder to release the slot with, or None when all
+        # `limit` slots are taken
+        with self.lock:
+            if self.slots.get(key, 0) >= limit:
+                return None
+            self.slots[key] = self.slots.get(key, 0) + 1
+            return key
+
+    def release(self, key, holder):
+        with self.lock:
+            self.slots[key] = max(0, self.slots.get(key, 0) - 1)
+
+
+class RedisStore(object):
+
+    def __init__(self, url, slotTimeout, prefix='fyyur:ratelimit:'):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.slotTimeout = slotTimeout
+        self.prefix = prefix
+        self.takeScript = self.client.register_script(TAKE_SCRIPT)
+        self.acquireScript = self.client.register_script(ACQUIRE_SCRIPT)
+
+    def take(self, key, rate, burst):
+        allowed, tokens = self.takeScript(keys=[self.prefix + 'bucket:' + key], args=[rate, burst])
+        return bool(allowed), 0 if allowed else retry_after(float(tokens), rate)
+
+    def acquire(self, key, limit):
+        holder = uuid.uuid4().hex
+        if self.acquireScript(keys=[self.prefix + 'slots:' + key], args=[limit, self.slotTimeout, holder]):
+            return holder
+        return None
+
+    def release(self, key, holder):
+        self.client.zrem(self.prefix + 'slots:' + key, holder)
+
+
+def create_store(config):
+    if config.get('RATELIMIT_BACKEND') == 'redis':
+        return RedisStore(config.get('RATELIMIT_REDIS_URL') or config['CACHE_REDIS_URL'],
+                          config.get('RATELIMIT_SLOT_TIMEOUT', 60))
+    return LocalStore()
+
+
+def route_group(endpoint, method):
+    if endpoint in SEARCH_ENDPOINTS:
+        return 'search'
+    if method in ('POST', 'DELETE') and endpoint is not None:
+        return 'write'
+    return None
+
+
+def client_id(trustProxy):
+    if trustProxy and request.access_route:
+        return request.access_route[0]
+    return request.remote_addr or 'unknown'
+
+
+def too_many_requests(seconds):
+    return render_template('errors/429.html', retry_after=seconds), 429, {'Retry-After': str(seconds)}
+
+
+def init_ratelimit(app):
+    store = create_store(app.config)
+    trustProxy = app.config.get('RATELIMIT_TRUST_PROXY', False)
+    limits = {}
+    for group in GROUPS:
+        prefix = 'RATELIMIT_' + group.upper()
+        limits[group] = (app.config[prefix + '_RATE'], app.config[prefix + '_BURST'],
+                         app.config[prefix + '_CONCURRENCY'])
+    app.extensions['ratelimit_store'] = store
+
+    @app.before_request
+    def limit_request():
+        group = route_group(request.endpoint, request.method)
+        if group is None or not app.config.get('RATELIMIT_ENABLED', True):
+            return None
+        rate, burst, concurrency = limits[group]
+        allowed, seconds = store.take(group + ':' + client_id(trustProxy), rate, burst)
+        if not allowed:
+            return too_many_requests(seconds)
+        holder = store.acquire(group, concurrency)
+        if holder is None:
+            # shed the request rather than queueing it behind the others
+            return too_many_requests(1)
+        g.ratelimitSlot = (group, holder)
+        return None
+
+    @app.teardown_request
+    def release_slot(exc):
+        # teardown runs whether or not the view raised
+        slot = g.pop('ratelimitSlot', None)
+        if slot is not None:
+            store.release(*slot)
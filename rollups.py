@@ -0,0 +1,148 @@
+# ----------------------------------------------------------------------------#
+# Show rollups.
+#
+# ShowRollup holds the number of shows per month, venue city and artist genre
+# (a show counts once for every genre of its artist). The write routes keep
+# it current in the same transaction as the write itself:
+#   - creating shows adds one to each of their (month, city, genre) rows;
+#   - deleting a venue or an artist subtracts its shows before they cascade;
+#   - editing a venue's city/state or an artist's genres moves its shows
+#     from the old rows to the new ones.
+# Every change is a single batched upsert, so the cost of a write doesn't
+# depend on the size of the Show table, and /reports/shows never reads it.
+# An edit or a delete holds its entity's row lock - the edit's UPDATE takes
+# it, a delete locks the row first - while it reads the entity's shows, and
+# creating shows share-locks their venues and artists. So under READ
+# COMMITTED a show created during an edit or a delete is either seen by it
+# or waits for it and is then counted at the entity's new place.
+# `flask rollups rebuild` recomputes the table from scratch, e.g. after bulk
+# loads that bypass the routes.
+# ----------------------------------------------------------------------------#
+
+from collections import Counter
+
+import click
+from sqlalchemy import func, text
+
+NO_GENRE = 'Unknown'
+
+# works on postgres and sqlite >= 3.24
+UPSERT_SQL = text(
+    'INSERT INTO "ShowRollup" (month, state, city, genre, show_count) '
+    'VALUES (:month, :state, :city, :genre, :show_count) '
+    'ON CONFLICT (month, state, city, genre) '
+    'DO UPDATE SET show_count = "ShowRollup".show_count + excluded.show_count')
+
+REBUILD_BATCH_SIZE = 1000
+
+
+class Rollups(object):
+
+    def __init__(self, db, Show, Venue, Artist, ShowRollup, parse_genres):
+        self.db = db
+        self.Show = Show
+        self.Venue = Venue
+        self.Artist = Artist
+        self.ShowRollup = ShowRollup
+        self.parse_genres = parse_genres
+
+    def grouped_shows(self, *filters):
+        # (month, artist genres, city, state, shows) for the matching shows
+        Show, Venue, Artist = self.Show, self.Venue, self.Artist
+        month = func.substr(Show.start_time, 1, 7)
+        return self.db.session.query(month, Artist.genres, Venue.city, Venue.state, func.count(Show.id)) \
+            .join(Artist, Artist.id == Show.artist_id) \
+            .join(Venue, Venue.id == Show.venue_id) \
+            .filter(*filters) \
+            .group_by(month, Artist.genres, Venue.city, Venue.state)
+
+    def add(self, deltas, rows, sign=1):
+        # adds grouped rows to the {(month, state, city, genre): shows} deltas
+        for month, genres, city, state, shows in rows:
+            for genre in self.parse_genres(genres) or [NO_GENRE]:
+                deltas[(month, state or '', city or '', genre)] += sign * shows
+        return deltas
+
+    def lock(self, model, entityId):
+        # the entity's row, locked until the write commits (a no-op on
+        # sqlite, where writes are serialized anyway)
+        self.db.session.query(model.id).filter(model.id == entityId).with_for_update().all()
+
+    def apply(self, deltas):
+        params = [{"month": month, "state": state, "city": city, "genre": genre, "show_count": shows}
+                  for (month, state, city, genre), shows in sorted(deltas.items()) if shows]
+        if params:
+            self.db.session.execute(UPSERT_SQL, params)
+
+    #  Write hooks, called inside the write's transaction
+    #  ----------------------------------------------------------------
+
+    def shows_created(self, newShows):
+        # newShows: [{venue_id, artist_id, start_time}], all inserted by one
+        # write; their places come from one statement
+        Artist, Venue = self.Artist, self.Venue
+        places = dict(((artistId, venueId), (genres, city, state)) for artistId, venueId, genres, city, state in
+                      self.db.session.query(Artist.id, Venue.id, Artist.genres, Venue.city, Venue.state)
+                      .filter(Artist.id.in_(sorted(set(show["artist_id"] for show in newShows))),
+                              Venue.id.in_(sorted(set(show["venue_id"] for show in newShows))))
+                      .with_for_update(read=True))
+        rows = []
+        for show in newShows:
+            place = places.get((show["artist_id"], show["venue_id"]))
+            if place is not None:
+                rows.append((show["start_time"][:7],) + place + (1,))
+        self.apply(self.add(Counter(), rows))
+
+    def venue_deleting(self, venueId):
+        # before the DELETE, while the shows still exist
+        self.lock(self.Venue, venueId)
+        self.apply(self.add(Counter(), self.grouped_shows(self.Show.venue_id == venueId), -1))
+
+    def artist_deleting(self, artistId):
+        self.lock(self.Artist, artistId)
+        self.apply(self.add(Counter(), self.grouped_shows(self.Show.artist_id == artistId), -1))
+
+    def venue_edited(self, venueId, previous):
+        # previous: {column: value before the edit} of the changed columns.
+        # The edit's UPDATE already holds the venue's row lock
+        if 'city' not in previous and 'state' not in previous:
+            return
+        rows = self.grouped_shows(self.Show.venue_id == venueId).all()
+        before = [(month, genres, previous.get('city', city), previous.get('state', state), shows)
+                  for month, genres, city, state, shows in rows]
+        self.apply(self.add(self.add(Counter(), rows), before, -1))
+
+    def artist_edited(self, artistId, previous):
+        if 'genres' not in previous:
+            return
+        rows = self.grouped_shows(self.Show.artist_id == artistId).all()
+        before = [(month, previous['genres'], city, state, shows) for month, genres, city, state, shows in rows]
+        self.apply(self.add(self.add(Counter(), rows), before, -1))
+
+    #  Rebuild
+    #  ----------------------------------------------------------------
+
+    def rebuild(self):
+        # recomputes every rollup from the Show table in one grouped scan
+        deltas = self.add(Counter(), self.grouped_shows())
+        self.db.session.query(self.ShowRollup).delete(synchronize_session=False)
+        rows = [{"month": month, "state": state, "city": city, "genre": genre, "show_count": shows}
+                for (month, state, city, genre), shows in sorted(deltas.items()) if shows]
+        for start in range(0, len(rows), REBUILD_BATCH_SIZE):
+            self.db.session.execute(self.ShowRollup.__table__.insert(), rows[start:start + REBUILD_BATCH_SIZE])
+        return len(rows)
+
+
+def init_rollups(app, db, Show, Venue, Artist, ShowRollup, parse_genres):
+    rollups = Rollups(db, Show, Venue, Artist, ShowRollup, parse_genres)
+    group = click.Group('rollups', help='Show rollups for /reports/shows.')
+
+    @group.command('rebuild')
+    def rebuild_command():
+        """Recompute the show rollups from the Show table."""
+        rows = rollups.rebuild()
+        db.session.commit()
+        click.echo('rebuilt %d rollup rows' % rows)
+
+    app.cli.add_command(group)
+    return rollups
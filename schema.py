@@ -0,0 +1,153 @@
+# ----------------------------------------------------------------------------#
+# Schema bootstrap.
+#
+# `flask schema bootstrap` creates the current schema in an empty database in
+# one step and stamps it at the migration head, instead of replaying the
+# migrations: the tables and indexes come from the models, plus on postgres
+# the pg_trgm extension and the monthly partitioned Show table. Later
+# migrations then apply to it as usual. Meant for CI, benchmark and preview
+# databases; production keeps using `flask db upgrade`.
+#
+# `flask schema verify` builds one scratch database with the migrations and
+# one with the bootstrap and fails if their schemas differ, so the two can't
+# drift apart. Without options it uses two temporary sqlite files; pass two
+# empty postgres databases to check the postgres-only parts as well.
+# ----------------------------------------------------------------------------#
+
+import difflib
+import json
+import os
+import shutil
+import tempfile
+
+import click
+from alembic import command
+from alembic.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy import create_engine, inspect, text
+
+from partitions import ensure_partitions
+
+SHOW_TABLE_DDL = (
+    'CREATE SEQUENCE "Show_id_seq"',
+    '''CREATE TABLE "Show" (
+        id integer NOT NULL DEFAULT nextval('"Show_id_seq"'::regclass),
+        start_time varchar NOT NULL,
+        artist_id integer NOT NULL REFERENCES "Artist" (id) ON DELETE CASCADE,
+        venue_id integer NOT NULL REFERENCES "Venue" (id) ON DELETE CASCADE,
+        PRIMARY KEY (id, start_time)
+    ) PARTITION BY RANGE (start_time)''',
+    'ALTER SEQUENCE "Show_id_seq" OWNED BY "Show".id',
+    'CREATE TABLE "Show_default" PARTITION OF "Show" DEFAULT',
+)
+
+
+def alembic_config(app):
+    return app.extensions['migrate'].migrate.get_config()
+
+
+def create_schema(conn, metadata, monthsAhead):
+    if conn.dialect.name != 'postgresql':
+        metadata.create_all(conn)
+        return
+    conn.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+    show = metadata.tables['Show']
+    metadata.create_all(conn, tables=[table for table in metadata.sorted_tables if table is not show])
+    for statement in SHOW_TABLE_DDL:
+        conn.execute(text(statement))
+    ensure_partitions(conn, monthsAhead)
+    for index in show.indexes:
+        index.create(conn)
+
+
+def stamp_head(conn, config):
+    script = ScriptDirectory.from_config(config)
+    head = script.get_current_head()
+    MigrationContext.configure(conn).stamp(script, head)
+    return head
+
+
+def bootstrap(engine, app, metadata):
+    existing = set(inspect(engine).get_table_names()) & set(metadata.tables)
+    if existing:
+        raise click.ClickException('database already has tables: ' + ', '.join(sorted(existing)))
+    with engine.begin() as conn:
+        create_schema(conn, metadata, app.config['SHOW_PARTITION_MONTHS_AHEAD'])
+        return stamp_head(conn, alembic_config(app))
+
+
+def migrate(engine, app):
+    config = alembic_config(app)
+    with engine.begin() as conn:
+        # picked up by migrations/env.py instead of the app's own engine
+        config.attributes['connection'] = conn
+        command.upgrade(config, 'head')
+
+
+def snapshot(engine):
+    # everything that makes up the schema, in a stable, comparable form
+    inspector = inspect(engine)
+    tables = {}
+    for tableName in sorted(inspector.get_table_names()):
+        tables[tableName] = {
+            "columns": [[column['name'], str(column['type']), column['nullable'], str(column.get('default'))]
+                        for column in inspector.get_columns(tableName)],
+            "primary_key": inspector.get_pk_constraint(tableName)['constrained_columns'],
+            "foreign_keys": sorted([key['constrained_columns'], key['referred_table'], key['referred_columns'],
+                                    (key.get('options') or {}).get('ondelete')]
+                                   for key in inspector.get_foreign_keys(tableName)),
+            "indexes": sorted([index['name'], index['column_names'], bool(index['unique'])]
+                              for index in inspector.get_indexes(tableName)),
+        }
+    result = {"tables": tables}
+    if engine.dialect.name == 'postgresql':
+        with engine.connect() as conn:
+            # exact definitions: gin operator classes, partial index predicates
+            result["indexdefs"] = sorted(conn.execute(text(
+                'SELECT indexname, indexdef FROM pg_indexes WHERE schemaname = current_schema()')).fetchall())
+            result["partitions"] = sorted(conn.execute(text(
+                'SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i '
+                'JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = \'"Show"\'::regclass')).fetchall())
+            result["extensions"] = sorted(row[0] for row in conn.execute(text('SELECT extname FROM pg_extension')))
+    return json.loads(json.dumps(result, default=str))
+
+
+def init_schema(app, db):
+
+    @app.cli.group()
+    def schema():
+        """Create and check the database schema without migrations."""
+
+    @schema.command('bootstrap')
+    def bootstrap_command():
+        """Create the current schema in an empty database."""
+        head = bootstrap(db.get_engine(app), app, db.metadata)
+        click.echo('schema created and stamped at ' + head)
+
+    @schema.command('verify')
+    @click.option('--migrated-url', help='empty database to build with the migrations')
+    @click.option('--bootstrapped-url', help='empty database to build with the bootstrap')
+    def verify_command(migrated_url, bootstrapped_url):
+        """Check the bootstrapped schema against the migrated one."""
+        scratch = None
+        if not migrated_url or not bootstrapped_url:
+            scratch = tempfile.mkdtemp(prefix='fyyur-schema-')
+            migrated_url = migrated_url or 'sqlite:///' + os.path.join(scratch, 'migrated.db')
+            bootstrapped_url = bootstrapped_url or 'sqlite:///' + os.path.join(scratch, 'bootstrapped.db')
+        try:
+            migratedEngine = create_engine(migrated_url)
+            bootstrappedEngine = create_engine(bootstrapped_url)
+            migrate(migratedEngine, app)
+            bootstrap(bootstrappedEngine, app, db.metadata)
+            migrated = json.dumps(snapshot(migratedEngine), indent=2, sort_keys=True).splitlines()
+            bootstrapped = json.dumps(snapshot(bootstrappedEngine), indent=2, sort_keys=True).splitlines()
+            migratedEngine.dispose()
+            bootstrappedEngine.dispose()
+        finally:
+            if scratch:
+                shutil.rmtree(scratch, ignore_errors=True)
+        if migrated != bootstrapped:
+            for line in difflib.unified_diff(migrated, bootstrapped, 'migrated', 'bootstrapped', lineterm=''):
+                click.echo(line)
+            raise click.ClickException('bootstrapped schema differs from the migrations')
+        click.echo('bootstrapped schema matches the migrations')
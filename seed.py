@@ -0,0 +1,131 @@
+# ----------------------------------------------------------------------------#
+# Seed data for local, load-test and benchmark databases.
+#
+#   DATABASE_URL=sqlite:///fyyur-dev.db python seed.py --venues 200
+# ----------------------------------------------------------------------------#
+
+import argparse
+import random
+from datetime import datetime, timedelta
+
+from app import app, db, rollups, Venue, Artist, Show
+from geo import encode
+
+CITIES = [
+    ('San Francisco', 'CA'),
+    ('Los Angeles', 'CA'),
+    ('New York', 'NY'),
+    ('Brooklyn', 'NY'),
+    ('Austin', 'TX'),
+    ('Seattle', 'WA'),
+    ('Chicago', 'IL'),
+    ('Nashville', 'TN'),
+]
+
+# (latitude, longitude) of each city; venues are scattered around it
+CITY_LOCATIONS = {
+    'San Francisco': (37.7749, -122.4194),
+    'Los Angeles': (34.0522, -118.2437),
+    'New York': (40.7128, -74.0060),
+    'Brooklyn': (40.6782, -73.9442),
+    'Austin': (30.2672, -97.7431),
+    'Seattle': (47.6062, -122.3321),
+    'Chicago': (41.8781, -87.6298),
+    'Nashville': (36.1627, -86.7816),
+}
+
+GENRES = [
+    'Alternative', 'Blues', 'Classical', 'Country', 'Electronic', 'Folk',
+    'Funk', 'Hip-Hop', 'Jazz', 'Pop', 'Punk', 'R&B', 'Reggae', 'Rock n Roll', 'Soul',
+]
+
+WORDS = [
+    'Musical', 'Hop', 'Dueling', 'Pianos', 'Park', 'Square', 'Live', 'Music',
+    'Coffee', 'Guns', 'Petals', 'Matt', 'Quevedo', 'Wild', 'Sax', 'Band',
+    'Blue', 'Room', 'Electric', 'Garden', 'Velvet', 'Lounge', 'Echo', 'Hall',
+]
+
+
+def random_name(rng):
+    return ' '.join(rng.sample(WORDS, 3))
+
+
+def random_genres(rng):
+    return ','.join(rng.sample(GENRES, rng.randint(1, 3)))
+
+
+def seed(venues=200, artists=400, shows=4000, randomSeed=0):
+    # bulk-inserts a deterministic dataset; returns the created ids
+    rng = random.Random(randomSeed)
+    venueRows = []
+    for i in range(venues):
+        city, state = rng.choice(CITIES)
+        latitude = CITY_LOCATIONS[city][0] + rng.uniform(-0.1, 0.1)
+        longitude = CITY_LOCATIONS[city][1] + rng.uniform(-0.1, 0.1)
+        venueRows.append({
+            "name": random_name(rng),
+            "city": city,
+            "state": state,
+            "address": str(rng.randint(1, 9999)) + ' Main St',
+            "phone": '555-' + str(rng.randint(100, 999)) + '-' + str(rng.randint(1000, 9999)),
+            "genres": random_genres(rng),
+            "image_link": 'https://images.example.com/venues/' + str(i) + '.jpg',
+            "facebook_link": 'https://www.facebook.com/venue' + str(i),
+            "website": 'https://venue' + str(i) + '.example.com',
+            "seeking_talent": rng.random() < 0.5,
+            "seeking_description": 'We are looking for local acts.',
+            "latitude": latitude,
+            "longitude": longitude,
+            "geohash": encode(latitude, longitude),
+        })
+    artistRows = []
+    for i in range(artists):
+        city, state = rng.choice(CITIES)
+        artistRows.append({
+            "name": random_name(rng),
+            "city": city,
+            "state": state,
+            "phone": '555-' + str(rng.randint(100, 999)) + '-' + str(rng.randint(1000, 9999)),
+            "genres": random_genres(rng),
+            "image_link": 'https://images.example.com/artists/' + str(i) + '.jpg',
+            "facebook_link": 'https://www.facebook.com/artist' + str(i),
+            "website": 'https://artist' + str(i) + '.example.com',
+            "seeking_venue": rng.random() < 0.5,
+            "seeking_description": 'Looking for shows in the area.',
+        })
+    db.session.execute(Venue.__table__.insert(), venueRows)
+    db.session.execute(Artist.__table__.insert(), artistRows)
+    db.session.flush()
+
+    venueIds = [row[0] for row in db.session.query(Venue.id).order_by(Venue.id).all()]
+    artistIds = [row[0] for row in db.session.query(Artist.id).order_by(Artist.id).all()]
+    # shows spread over two years either side of today
+    now = datetime.now().replace(minute=0, second=0, microsecond=0)
+    showRows = []
+    for i in range(shows):
+        startTime = now + timedelta(days=rng.randint(-730, 730), hours=rng.randint(0, 5))
+        showRows.append({
+            "venue_id": rng.choice(venueIds),
+            "artist_id": rng.choice(artistIds),
+            "start_time": startTime.strftime('%Y-%m-%d %H:%M:%S'),
+        })
+    if showRows:
+        db.session.execute(Show.__table__.insert(), showRows)
+    # the bulk insert bypasses the routes that keep the rollups current
+    rollups.rebuild()
+    db.session.commit()
+    return venueIds, artistIds
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Seed the Fyyur database.')
+    parser.add_argument('--venues', type=int, default=200)
+    parser.add_argument('--artists', type=int, default=400)
+    parser.add_argument('--shows', type=int, default=4000)
+    parser.add_argument('--random-seed', type=int, default=0)
+    parser.add_argument('--create', action='store_true', help='create missing tables first')
+    args = parser.parse_args()
+    with app.app_context():
+        if args.create:
+            db.create_all()
+        seed(args.venues, args.artists, args.shows, args.random_seed)
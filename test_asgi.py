@@ -0,0 +1,125 @@
+# ----------------------------------------------------------------------------#
+# The ASGI entry point.
+#
+# The read API served on the event loop answers like the Flask views and
+# goes through the same request hooks: metrics, rate limits and their
+# teardown, which may block on redis and so run on the thread pool.
+#
+#   python test_asgi.py -v
+# ----------------------------------------------------------------------------#
+
+import asyncio
+import gzip
+import json
+import threading
+import unittest
+
+from testsupport import AppTestCase, app
+
+import asgi
+import ratelimit
+from metrics import labels, registry
+
+
+def call(application, method, path, queryString=b'', headers=()):
+    # (status, headers dict, body) of one request
+    messages = [{"type": 'http.request', "body": b'', "more_body": False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {"type": 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+    scope = {"type": 'http', "method": method, "path": path, "query_string": queryString,
+             "headers": list(headers), "http_version": '1.1', "client": ('10.0.0.1', 5000)}
+    asyncio.run(application(scope, receive, send))
+    return (sent[0]['status'], dict(sent[0]['headers']),
+            b''.join(message.get('body', b'') for message in sent[1:]))
+
+
+def requests_counted(endpoint, status):
+    for name, labelPairs, value in registry.snapshot()["counters"]:
+        if name == 'fyyur_http_requests_total' and labelPairs == labels(endpoint=endpoint, method='GET',
+                                                                        status=status):
+            return value
+    return 0
+
+
+class ReadApiTestCase(AppTestCase):
+    seedSizes = (10, 20, 200)
+    config = {"RATELIMIT_ENABLED": True}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.application = asgi.Application(app)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.application.executor.shutdown(wait=True)
+
+    def test_same_response_as_flask(self):
+        for path, queryString in (('/venues/1/calendar', b'start=2026-01-01&end=2026-03-01'),
+                                  ('/venues/near', b'lat=30.2672&lng=-97.7431&radius=50&limit=5'),
+                                  ('/reports/shows', b'by=genre'),
+                                  ('/reports/shows', b'by=nothing'),
+                                  ('/artists/9999/calendar', b'')):
+            status, headers, body = call(self.application, 'GET', path, queryString)
+            expected = app.test_client().get(path, query_string=queryString.decode('ascii'))
+            self.assertEqual(status, expected.status_code)
+            self.assertEqual(json.loads(body), expected.get_json())
+
+    def test_compressed(self):
+        status, headers, body = call(self.application, 'GET', '/reports/shows', b'by=month,genre',
+                                     headers=[(b'accept-encoding', b'gzip')])
+        self.assertEqual(headers[b'content-encoding'], b'gzip')
+        self.assertEqual(json.loads(gzip.decompress(body))['by'], ['month', 'genre'])
+
+    def test_requests_are_counted(self):
+        before = requests_counted('venue_calendar', 200)
+        call(self.application, 'GET', '/venues/1/calendar')
+        self.assertEqual(requests_counted('venue_calendar', 200), before + 1)
+
+    def test_rate_limits_apply(self):
+        store = app.extensions['ratelimit_store']
+        store.buckets.clear()
+        store.slots.clear()
+        saved = ratelimit.route_group
+        # put the report in the search group for the test
+        ratelimit.route_group = lambda endpoint, method: 'search' if endpoint == 'show_report' else None
+        try:
+            statuses = [call(self.application, 'GET', '/reports/shows', b'by=state')[0]
+                        for number in range(app.config['RATELIMIT_SEARCH_BURST'] + 1)]
+        finally:
+            ratelimit.route_group = saved
+        self.assertEqual(statuses[:-1], [200] * app.config['RATELIMIT_SEARCH_BURST'])
+        self.assertEqual(statuses[-1], 429)
+        # every admitted request gave its concurrency slot back
+        self.assertEqual(store.slots['search'], 0)
+
+    def test_hooks_run_off_the_loop(self):
+        store = app.extensions['ratelimit_store']
+        threads = []
+
+        def recorded(method):
+            def record(*args):
+                threads.append((method.__name__, threading.current_thread().name))
+                return method(*args)
+            return record
+        for name in ('take', 'acquire', 'release'):
+            setattr(store, name, recorded(getattr(store, name)))
+            self.addCleanup(delattr, store, name)
+        saved = ratelimit.route_group
+        ratelimit.route_group = lambda endpoint, method: 'search' if endpoint == 'show_report' else None
+        try:
+            status, headers, body = call(self.application, 'GET', '/reports/shows', b'by=state')
+        finally:
+            ratelimit.route_group = saved
+        self.assertEqual(status, 200)
+        self.assertEqual([method for method, thread in threads], ['take', 'acquire', 'release'])
+        self.assertTrue(all(thread.startswith('wsgi') for method, thread in threads), threads)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,189 @@
+# ----------------------------------------------------------------------------#
+# Response compression.
+#
+# CompressionMiddleware around small WSGI apps: content negotiation, the
+# minimum size, Vary, and streamed responses staying streamed.
+#
+#   python test_compression.py -v
+# ----------------------------------------------------------------------------#
+
+import gzip
+import unittest
+import zlib
+
+import compression
+from compression import CompressionMiddleware, parse_accept_encoding
+
+CONFIG = {"COMPRESS_LEVEL": 6, "COMPRESS_MIN_SIZE": 500, "COMPRESS_BROTLI": True, "COMPRESS_BROTLI_QUALITY": 5}
+PAGE = b'<p>' + b'Fyyur listing row. ' * 200 + b'</p>'
+
+
+def page_app(body=PAGE, contentType='text/html; charset=utf-8', extraHeaders=()):
+    def app(environ, start_response):
+        start_response('200 OK', [('Content-Type', contentType), ('Content-Length', str(len(body)))]
+                       + list(extraHeaders))
+        return [body]
+    return app
+
+
+class StreamedApp(object):
+    # yields chunks without a Content-Length and records how many the
+    # server has pulled, like a streamed template
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.pulled = 0
+        self.closed = False
+
+    def __call__(self, environ, start_response):
+        start_response('200 OK', [('Content-Type', 'text/html; charset=utf-8')])
+        return self.generate()
+
+    def generate(self):
+        try:
+            for chunk in self.chunks:
+                self.pulled += 1
+                yield chunk
+        finally:
+            self.closed = True
+
+
+def request(app, acceptEncoding=None, method='GET'):
+    # (status, headers dict, the response iterable)
+    environ = {"REQUEST_METHOD": method, "PATH_INFO": '/'}
+    if acceptEncoding is not None:
+        environ['HTTP_ACCEPT_ENCODING'] = acceptEncoding
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started['status'] = status
+        started['headers'] = dict(headers)
+    result = CompressionMiddleware(app, CONFIG)(environ, start_response)
+    iterator = iter(result)
+    first = next(iterator, None)
+    return started['status'], started['headers'], [first] + list(iterator) if first is not None else []
+
+
+class AcceptEncodingTestCase(unittest.TestCase):
+
+    def test_parse_qualities(self):
+        self.assertEqual(parse_accept_encoding('gzip;q=0.5, br, identity;q=0'),
+                         {"gzip": 0.5, "br": 1.0, "identity": 0.0})
+        self.assertEqual(parse_accept_encoding('GZIP;q=bad'), {"gzip": 0.0})
+
+    def test_gzip(self):
+        status, headers, chunks = request(page_app(), 'gzip, deflate')
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        body = b''.join(chunks)
+        self.assertEqual(int(headers['Content-Length']), len(body))
+        self.assertEqual(gzip.decompress(body), PAGE)
+
+    def test_wildcard_gets_gzip(self):
+        status, headers, chunks = request(page_app(), '*')
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+
+    def test_identity(self):
+        for acceptEncoding in (None, 'identity', 'gzip;q=0'):
+            status, headers, chunks = request(page_app(), acceptEncoding)
+            self.assertNotIn('Content-Encoding', headers)
+            self.assertEqual(b''.join(chunks), PAGE)
+
+    def test_head_is_not_compressed(self):
+        status, headers, chunks = request(page_app(), 'gzip', method='HEAD')
+        self.assertNotIn('Content-Encoding', headers)
+
+    @unittest.skipUnless(compression.brotli, 'brotli is not installed')
+    def test_brotli_preferred(self):
+        status, headers, chunks = request(page_app(), 'gzip, br')
+        self.assertEqual(headers['Content-Encoding'], 'br')
+        self.assertEqual(compression.brotli.decompress(b''.join(chunks)), PAGE)
+
+    def test_brotli_unavailable_falls_back_to_gzip(self):
+        saved, compression.brotli = compression.brotli, None
+        try:
+            status, headers, chunks = request(page_app(), 'br, gzip;q=0.5')
+        finally:
+            compression.brotli = saved
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+
+    def test_brotli_only_client_without_brotli(self):
+        saved, compression.brotli = compression.brotli, None
+        try:
+            status, headers, chunks = request(page_app(), 'br')
+        finally:
+            compression.brotli = saved
+        self.assertNotIn('Content-Encoding', headers)
+        self.assertEqual(b''.join(chunks), PAGE)
+
+
+class SkipTestCase(unittest.TestCase):
+
+    def test_below_min_size(self):
+        status, headers, chunks = request(page_app(b'<p>tiny</p>'), 'gzip')
+        self.assertNotIn('Content-Encoding', headers)
+        self.assertEqual(b''.join(chunks), b'<p>tiny</p>')
+
+    def test_incompressible_type(self):
+        status, headers, chunks = request(page_app(b'\x89PNG' * 500, 'image/png'), 'gzip')
+        self.assertNotIn('Content-Encoding', headers)
+        self.assertNotIn('Vary', headers)
+
+    def test_already_encoded(self):
+        body = gzip.compress(PAGE)
+        status, headers, chunks = request(page_app(body, extraHeaders=[('Content-Encoding', 'gzip')]), 'gzip')
+        self.assertEqual(b''.join(chunks), body)
+
+
+class VaryTestCase(unittest.TestCase):
+
+    def test_compressed(self):
+        status, headers, chunks = request(page_app(), 'gzip')
+        self.assertEqual(headers['Vary'], 'Accept-Encoding')
+
+    def test_identity_and_small_responses_vary_too(self):
+        for app, acceptEncoding in ((page_app(), None), (page_app(b'<p>tiny</p>'), 'gzip')):
+            status, headers, chunks = request(app, acceptEncoding)
+            self.assertEqual(headers['Vary'], 'Accept-Encoding')
+
+    def test_existing_vary_is_kept(self):
+        status, headers, chunks = request(page_app(extraHeaders=[('Vary', 'Cookie')]), 'gzip')
+        self.assertEqual(headers['Vary'], 'Cookie, Accept-Encoding')
+        status, headers, chunks = request(page_app(extraHeaders=[('Vary', 'Accept-Encoding')]), 'gzip')
+        self.assertEqual(headers['Vary'], 'Accept-Encoding')
+
+
+class StreamingTestCase(unittest.TestCase):
+
+    def test_streamed_response_stays_streamed(self):
+        chunks = [b'<li>row %d</li>' % number * 20 for number in range(5)]
+        app = StreamedApp(chunks)
+        environ = {"REQUEST_METHOD": 'GET', "PATH_INFO": '/', "HTTP_ACCEPT_ENCODING": 'gzip'}
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started['headers'] = dict(headers)
+        result = iter(CompressionMiddleware(app, CONFIG)(environ, start_response))
+        self.assertEqual(started['headers']['Content-Encoding'], 'gzip')
+        self.assertNotIn('Content-Length', started['headers'])
+
+        # every compressed chunk decodes to its source chunk before the next
+        # one is pulled from the app
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        for number, chunk in enumerate(chunks):
+            self.assertEqual(decompressor.decompress(next(result)), chunk)
+            self.assertEqual(app.pulled, number + 1)
+        decompressor.decompress(b''.join(result))
+        self.assertTrue(decompressor.eof)
+        self.assertTrue(app.closed)
+
+    def test_closed_when_the_client_goes_away(self):
+        app = StreamedApp([b'<li>row</li>'] * 5)
+        environ = {"REQUEST_METHOD": 'GET', "PATH_INFO": '/', "HTTP_ACCEPT_ENCODING": 'gzip'}
+        result = CompressionMiddleware(app, CONFIG)(environ, lambda status, headers, exc_info=None: None)
+        next(iter(result))
+        result.close()
+        self.assertTrue(app.closed)
+
+
+if __name__ == '__main__':
+    unittest.main()
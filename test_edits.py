@@ -0,0 +1,117 @@
+# ----------------------------------------------------------------------------#
+# Editing venues and artists.
+#
+# Submitting an edit form unchanged must not write anything, a form started
+# from an older row version must not overwrite the newer one, and a
+# multi-select keeps every genre picked.
+#
+#   python test_edits.py -v
+# ----------------------------------------------------------------------------#
+
+import unittest
+
+from sqlalchemy import event
+
+from testsupport import AppTestCase, app, db, Venue, Artist, prefilled_form, post_fields
+
+
+class RecordedStatements(object):
+    # the SQL statements run against the app's engine while active
+
+    def __init__(self):
+        self.statements = []
+
+    def record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        event.listen(db.engine, 'before_cursor_execute', self.record)
+        return self.statements
+
+    def __exit__(self, *exc_info):
+        event.remove(db.engine, 'before_cursor_execute', self.record)
+
+
+class EditTestCase(AppTestCase):
+
+    def setUp(self):
+        # optional columns left NULL, as an older row or a seeded one has them
+        with app.app_context():
+            venue = Venue(name='The Dueling Pianos Bar', city='New York', state='NY', address='335 Delancey Street',
+                          genres='Classical,R&B,Hip-Hop', facebook_link='https://www.facebook.com/theduelingpianos',
+                          seeking_talent=False)
+            artist = Artist(name='The Wild Sax Band', city='San Francisco', state='CA', genres='Jazz,Classical',
+                            seeking_venue=True, seeking_description='Looking for shows in the Bay Area')
+            db.session.add_all([venue, artist])
+            db.session.commit()
+            self.venueId, self.artistId = venue.id, artist.id
+
+    def stored(self, model, entityId):
+        with app.app_context():
+            return db.session.query(model).filter(model.id == entityId).one()
+
+    def test_unchanged_venue_is_not_written(self):
+        client = app.test_client()
+        path = '/venues/%d/edit' % self.venueId
+        fields = prefilled_form(client, path)
+        with app.app_context(), RecordedStatements() as statements:
+            response = post_fields(client, path, fields)
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('/venues/%d' % self.venueId, response.headers['Location'])
+        self.assertFalse([statement for statement in statements if statement.startswith('UPDATE')])
+        venue = self.stored(Venue, self.venueId)
+        self.assertEqual(venue.version, 1)
+        self.assertEqual(venue.genres, 'Classical,R&B,Hip-Hop')
+        self.assertIsNone(venue.phone)
+        self.assertIsNone(venue.website)
+
+    def test_unchanged_artist_is_not_written(self):
+        client = app.test_client()
+        path = '/artists/%d/edit' % self.artistId
+        fields = prefilled_form(client, path)
+        with app.app_context(), RecordedStatements() as statements:
+            post_fields(client, path, fields)
+        self.assertFalse([statement for statement in statements if statement.startswith('UPDATE')])
+        artist = self.stored(Artist, self.artistId)
+        self.assertEqual(artist.version, 1)
+        self.assertEqual(artist.genres, 'Jazz,Classical')
+        self.assertIsNone(artist.image_link)
+
+    def test_edit_keeps_every_genre(self):
+        client = app.test_client()
+        path = '/artists/%d/edit' % self.artistId
+        fields = [(name, value) for name, value in prefilled_form(client, path) if name != 'genres']
+        fields += [('genres', 'Jazz'), ('genres', 'Funk'), ('genres', 'Soul')]
+        post_fields(client, path, fields)
+        artist = self.stored(Artist, self.artistId)
+        self.assertEqual(artist.genres, 'Jazz,Funk,Soul')
+        self.assertEqual(artist.version, 2)
+
+    def test_stale_version_is_a_conflict(self):
+        client = app.test_client()
+        path = '/venues/%d/edit' % self.venueId
+        first = prefilled_form(client, path)
+        second = prefilled_form(client, path)
+        post_fields(client, path, [(name, 'Pianos Uptown' if name == 'name' else value) for name, value in first])
+        response = post_fields(client, path,
+                               [(name, '555-555-5555' if name == 'phone' else value) for name, value in second])
+        # sent back to the form, with the first edit kept and the second not
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response.headers['Location'].endswith(path))
+        venue = self.stored(Venue, self.venueId)
+        self.assertEqual(venue.version, 2)
+        self.assertEqual(venue.name, 'Pianos Uptown')
+        self.assertIsNone(venue.phone)
+
+    def test_create_keeps_every_genre(self):
+        client = app.test_client()
+        client.post('/artists/create', data={
+            "name": 'Matt Quevedo', "city": 'New York', "state": 'NY', "phone": '300-400-5000',
+            "genres": ['Jazz', 'Blues'], "facebook_link": 'https://www.facebook.com/mattquevedo'})
+        with app.app_context():
+            artist = Artist.query.filter(Artist.name == 'Matt Quevedo').one()
+            self.assertEqual(artist.genres, 'Jazz,Blues')
+
+
+if __name__ == '__main__':
+    unittest.main()
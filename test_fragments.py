@@ -0,0 +1,65 @@
+# ----------------------------------------------------------------------------#
+# Fragment caching.
+#
+# A listing with more tiles than the app cache holds must be served from the
+# fragment cache on its next render, without pushing the detail pages and
+# other entries out of the app cache.
+#
+#   python test_fragments.py -v
+# ----------------------------------------------------------------------------#
+
+import unittest
+
+from metrics import labels, registry
+from testsupport import AppTestCase, fyyur, app, db, Show
+
+
+def cache_requests(cache):
+    # (hits, misses) of one cache so far
+    counts = dict((labelPairs, value) for name, labelPairs, value in registry.snapshot()["counters"]
+                  if name == 'fyyur_cache_requests_total')
+    return (counts.get(labels(cache=cache, result='hit'), 0),
+            counts.get(labels(cache=cache, result='miss'), 0))
+
+
+def render(path):
+    response = app.test_client().get(path)
+    response.get_data()
+    response.close()
+    return response
+
+
+class FragmentCacheTestCase(AppTestCase):
+    # more show tiles than the app cache has entries
+    seedSizes = (20, 40, fyyur.cache.maxEntries + 500)
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with app.app_context():
+            cls.tiles = db.session.query(Show.artist_id, Show.venue_id, Show.start_time).distinct().count()
+
+    def test_second_render_is_served_from_fragments(self):
+        render('/shows')
+        hits, misses = cache_requests('fragment')
+        render('/shows')
+        newHits, newMisses = cache_requests('fragment')
+        self.assertEqual(newMisses, misses)
+        self.assertGreaterEqual(newHits - hits, self.tiles)
+
+    def test_fragments_do_not_evict_detail_pages(self):
+        self.assertEqual(render('/venues/1').status_code, 200)
+        self.assertEqual(render('/artists/1').status_code, 200)
+        render('/shows')
+        render('/shows')
+        venueHits, _ = cache_requests('detail:venue')
+        artistHits, _ = cache_requests('detail:artist')
+        render('/venues/1')
+        render('/artists/1')
+        self.assertEqual(cache_requests('detail:venue')[0], venueHits + 1)
+        self.assertEqual(cache_requests('detail:artist')[0], artistHits + 1)
+        self.assertFalse([key for key in fyyur.cache.entries if key.startswith('fragment:')])
+
+
+if __name__ == '__main__':
+    unittest.main()
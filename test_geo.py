@@ -0,0 +1,134 @@
+# ----------------------------------------------------------------------------#
+# Geohashes and the radius search.
+#
+# The cells covering a circle must hold every point of it, across the
+# antimeridian and around the poles too, and /venues/near must answer what
+# a distance check over every venue would: the nearest `limit` venues
+# within the radius, nearest first.
+#
+#   python test_geo.py -v
+# ----------------------------------------------------------------------------#
+
+import math
+import unittest
+
+from geo import BASE32, EARTH_RADIUS_KM, cell_ranges, covering_cells, distance_km, encode
+from testsupport import AppTestCase, fyyur, app, db, Venue
+
+# (latitude, longitude, radius in km) of the circles tested
+CIRCLES = (
+    (30.2672, -97.7431, 25),
+    (30.2672, -97.7431, 200),
+    # Fiji, on the antimeridian
+    (-17.7, 179.95, 150),
+    (-17.7, -179.95, 10),
+    (89.95, 45.0, 60),
+    (-89.9, -120.0, 100),
+    (0.0, 0.0, 0.5),
+)
+
+
+def destination(latitude, longitude, bearing, distanceKm):
+    # the point distanceKm from the start along the initial bearing (degrees)
+    phi, lam, theta = math.radians(latitude), math.radians(longitude), math.radians(bearing)
+    delta = distanceKm / EARTH_RADIUS_KM
+    phi2 = math.asin(math.sin(phi) * math.cos(delta) + math.cos(phi) * math.sin(delta) * math.cos(theta))
+    lam2 = lam + math.atan2(math.sin(theta) * math.sin(delta) * math.cos(phi),
+                            math.cos(delta) - math.sin(phi) * math.sin(phi2))
+    return math.degrees(phi2), (math.degrees(lam2) + 540) % 360 - 180
+
+
+def circle_points(latitude, longitude, radius):
+    # the centre and points on rings out to (just inside) the radius
+    points = [(latitude, longitude)]
+    for fraction in (0.25, 0.5, 0.75, 0.999):
+        for bearing in range(0, 360, 15):
+            points.append(destination(latitude, longitude, bearing, radius * fraction))
+    return points
+
+
+class GeohashTestCase(unittest.TestCase):
+
+    def test_encode(self):
+        self.assertEqual(encode(42.6, -5.6, 5), 'ezs42')
+        self.assertEqual(encode(57.64911, 10.40744, 11), 'u4pruydqqvj')
+        self.assertEqual(encode(-90.0, -180.0, 4), '0000')
+        self.assertEqual(encode(90.0, 180.0, 4), 'zzzz')
+        self.assertEqual(len(encode(30.2672, -97.7431)), 12)
+
+    def test_covering_cells_hold_the_circle(self):
+        for latitude, longitude, radius in CIRCLES:
+            cells = covering_cells(latitude, longitude, radius)
+            with self.subTest(latitude=latitude, longitude=longitude, radius=radius):
+                self.assertLessEqual(len(cells), 9)
+                for pointLat, pointLng in circle_points(latitude, longitude, radius):
+                    geohash = encode(pointLat, pointLng)
+                    self.assertTrue(any(geohash.startswith(cell) for cell in cells), (pointLat, pointLng))
+
+    def test_cell_ranges(self):
+        self.assertEqual(cell_ranges(['9v6', 'ezz', 'zzz', 'b']), [('9v6', '9v7'), ('ezz', 'f'), ('zzz', None),
+                                                                    ('b', 'c')])
+        for cell in ('9v6', 'ezz', 'bzz'):
+            start, end = cell_ranges([cell])[0]
+            for suffix in ('', '0', 'zzzzzzzzz', '7h'):
+                self.assertTrue(start <= cell + suffix < end)
+            self.assertFalse(start <= end + '0' < end)
+            before = cell[:-1] + BASE32[BASE32.index(cell[-1]) - 1] + 'zz'
+            self.assertFalse(start <= before < end)
+
+
+class NearbyTestCase(AppTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # venues around each circle's centre, some outside it, no two at the
+        # same distance
+        rows = []
+        for latitude, longitude, radius in CIRCLES:
+            for number, fraction in enumerate((0.05, 0.3, 0.6, 0.9, 1.2, 2.0)):
+                for step, bearing in enumerate((0, 100, 200, 300)):
+                    pointLat, pointLng = destination(latitude, longitude, bearing + number * 7,
+                                                     radius * fraction * (1 + step / 100.0))
+                    rows.append({"name": 'Venue %d' % len(rows), "city": 'Somewhere', "state": 'XX',
+                                 "latitude": pointLat, "longitude": pointLng, "geohash": encode(pointLat, pointLng),
+                                 "version": 1})
+        with app.app_context():
+            db.session.execute(Venue.__table__.insert(), rows)
+            db.session.commit()
+            cls.venues = db.session.query(Venue.id, Venue.latitude, Venue.longitude).all()
+
+    def expected(self, latitude, longitude, radius, limit):
+        nearby = sorted((distance_km(latitude, longitude, venue.latitude, venue.longitude), venue.id)
+                        for venue in self.venues)
+        return [venueId for distance, venueId in nearby if distance <= radius][:limit]
+
+    def test_same_as_checking_every_venue(self):
+        client = app.test_client()
+        for latitude, longitude, radius in CIRCLES:
+            for limit in (1, 5, 100):
+                with self.subTest(latitude=latitude, longitude=longitude, radius=radius, limit=limit):
+                    response = client.get('/venues/near', query_string={
+                        "lat": latitude, "lng": longitude, "radius": radius, "limit": limit})
+                    self.assertEqual(response.status_code, 200)
+                    data = response.get_json()["data"]
+                    self.assertEqual([venue["id"] for venue in data],
+                                     self.expected(latitude, longitude, radius, limit))
+                    distances = [venue["distance_km"] for venue in data]
+                    self.assertEqual(distances, sorted(distances))
+                    self.assertTrue(all(distance <= radius for distance in distances))
+
+    def test_only_the_limit_is_fetched(self):
+        with app.app_context():
+            rows = db.session.execute(fyyur.nearby_venues_query(30.2672, -97.7431, 200, 3)).fetchall()
+        self.assertEqual([row.id for row in rows], self.expected(30.2672, -97.7431, 200, 3))
+
+    def test_bad_arguments(self):
+        client = app.test_client()
+        for queryString in ({"lat": 30}, {"lat": 91, "lng": 0}, {"lat": 0, "lng": 0, "radius": 500},
+                            {"lat": 'north', "lng": 0}):
+            self.assertEqual(client.get('/venues/near', query_string=queryString).status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,172 @@
+# ----------------------------------------------------------------------------#
+# Cache invalidation.
+#
+# Published namespaces are dropped from the cache, and '*' - sent by a
+# listener that reconnected and may have missed events - expires every
+# entry, including those of namespaces that were never invalidated before.
+# PostgresBus runs against a scripted stand-in for psycopg2.
+#
+#   python test_invalidation.py -v
+# ----------------------------------------------------------------------------#
+
+import json
+import logging
+import socket
+import sys
+import types
+import unittest
+from unittest import mock
+
+from flask import Flask
+
+import invalidation
+from cache import LocalCache, versioned_key, invalidate_namespace
+from invalidation import PostgresBus, init_invalidation
+
+
+class StopListening(BaseException):
+    # ends PostgresBus.listen, which retries every Exception
+    pass
+
+
+class FakeCursor(object):
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute(self, statement, params=None):
+        self.connection.executed.append((statement, params))
+
+
+class FakeConnection(object):
+    # readable at once; poll() raises `failure`, as a dropped connection does
+
+    def __init__(self, failure):
+        self.failure = failure
+        self.executed = []
+        self.notifies = []
+        self.closed = False
+        self.autocommit = False
+        self.reader, writer = socket.socketpair()
+        writer.send(b'x')
+        self.writer = writer
+
+    def fileno(self):
+        return self.reader.fileno()
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def poll(self):
+        raise self.failure
+
+    def close(self):
+        self.closed = True
+        self.reader.close()
+        self.writer.close()
+
+
+def fake_psycopg2(connections):
+    module = types.ModuleType('psycopg2')
+    module.Error = Exception
+    module.connect = lambda dsn: connections.pop(0)
+    return module
+
+
+class LocalBusTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = LocalCache()
+        self.bus = init_invalidation(Flask(__name__), self.cache, invalidate_namespace)
+
+    def test_published_namespace_is_dropped(self):
+        key = versioned_key(self.cache, 'venue:1', 'detail')
+        self.cache.set(key, 'cached')
+        other = versioned_key(self.cache, 'venue:2', 'detail')
+        self.cache.set(other, 'kept')
+        self.bus.publish(['venue:1'])
+        self.assertIsNone(self.cache.get(versioned_key(self.cache, 'venue:1', 'detail')))
+        self.assertEqual(self.cache.get(versioned_key(self.cache, 'venue:2', 'detail')), 'kept')
+
+    def test_expire_all_covers_namespaces_never_invalidated(self):
+        # 'search:venues' has never been bumped, so it is at version 0
+        self.cache.set(versioned_key(self.cache, 'venue:1', 'detail'), 'cached')
+        invalidate_namespace(self.cache, 'venue:1')
+        staleKey = versioned_key(self.cache, 'search:venues', 'jazz')
+        self.bus.publish(['*'])
+        # a result computed before the reset and stored after it
+        self.cache.set(staleKey, 'stale')
+        self.assertIsNone(self.cache.get(versioned_key(self.cache, 'search:venues', 'jazz')))
+        self.assertIsNone(self.cache.get(versioned_key(self.cache, 'venue:1', 'detail')))
+
+    def test_every_subscriber_gets_the_event(self):
+        events = []
+        self.bus.subscribe(events.append)
+        self.bus.publish(('artist:3', 'search:artists'))
+        self.assertEqual(events, [['artist:3', 'search:artists']])
+
+
+class PostgresBusTestCase(unittest.TestCase):
+
+    def create_bus(self, connections):
+        with mock.patch.dict(sys.modules, {"psycopg2": fake_psycopg2(connections)}):
+            bus = PostgresBus('postgresql+psycopg2://fyyur@localhost/fyyur', 'fyyur_invalidate',
+                              logging.getLogger('test_invalidation'))
+        bus.sender = 'this-worker'
+        return bus
+
+    def test_reconnected_listener_expires_everything(self):
+        cache = LocalCache()
+        cache.set(versioned_key(cache, 'search:all', 'jazz'), 'cached')
+        first, second = FakeConnection(OSError('connection lost')), FakeConnection(StopListening())
+        bus = self.create_bus([first, second])
+        events = []
+        bus.subscribe(events.append)
+        bus.subscribe(lambda namespaces: '*' in namespaces and cache.expire_all())
+        with mock.patch.object(invalidation, 'RECONNECT_SECONDS', 0), \
+                mock.patch.object(bus.logger, 'exception'):
+            with self.assertRaises(StopListening):
+                bus.listen()
+        self.assertEqual(events, [['*']])
+        self.assertEqual(first.executed, [('LISTEN "fyyur_invalidate"', None)])
+        self.assertTrue(first.closed and second.closed)
+        self.assertIsNone(cache.get(versioned_key(cache, 'search:all', 'jazz')))
+
+    def test_publish_notifies_and_applies_locally(self):
+        connection = FakeConnection(StopListening())
+        bus = self.create_bus([connection])
+        events = []
+        bus.subscribe(events.append)
+        bus.publish(['venue:1'])
+        self.assertEqual(events, [['venue:1']])
+        statement, (channel, payload) = connection.executed[0]
+        self.assertEqual(channel, 'fyyur_invalidate')
+        self.assertEqual(json.loads(payload), {"sender": 'this-worker', "namespaces": ['venue:1']})
+        connection.close()
+
+    def test_oversized_event_becomes_expire_all(self):
+        connection = FakeConnection(StopListening())
+        bus = self.create_bus([connection])
+        bus.publish(['search:%d' % number for number in range(2000)])
+        statement, (channel, payload) = connection.executed[0]
+        self.assertEqual(json.loads(payload)["namespaces"], ['*'])
+        connection.close()
+
+    def test_own_echo_is_ignored(self):
+        bus = self.create_bus([])
+        events = []
+        bus.subscribe(events.append)
+        bus.receive(json.dumps({"sender": 'this-worker', "namespaces": ['venue:1']}))
+        bus.receive(json.dumps({"sender": 'other-worker', "namespaces": ['venue:2']}))
+        bus.receive('not json')
+        self.assertEqual(events, [['venue:2']])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+# ----------------------------------------------------------------------------#
+# Batched listings.
+#
+# /venues, /artists and /shows fetch their rows LISTING_BATCH_SIZE at a time
+# and give the connection back between batches; the pages must be the same
+# as when every row comes in one batch, rows with NULL sort columns included.
+#
+#   python test_listings.py -v
+# ----------------------------------------------------------------------------#
+
+import unittest
+
+from sqlalchemy import event
+
+from testsupport import AppTestCase, fyyur, app, db, Venue, Artist
+
+PATHS = ('/venues', '/artists', '/shows')
+
+
+def render(path):
+    fyyur.cache.clear()
+    response = app.test_client().get(path)
+    body = response.get_data(as_text=True)
+    response.close()
+    return body
+
+
+class BatchedListingTestCase(AppTestCase):
+    seedSizes = (30, 40, 120)
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with app.app_context():
+            db.session.execute(Venue.__table__.insert(), [
+                {"name": None, "city": None, "state": 'TX', "version": 1},
+                {"name": 'Nameless Street', "city": None, "state": None, "version": 1}])
+            db.session.execute(Artist.__table__.insert(), [{"name": None, "version": 1}])
+            db.session.commit()
+
+    def setUp(self):
+        self.addCleanup(setattr, fyyur, 'LISTING_BATCH_SIZE', fyyur.LISTING_BATCH_SIZE)
+
+    def test_same_page_in_small_batches(self):
+        for path in PATHS:
+            fyyur.LISTING_BATCH_SIZE = 1000
+            expected = render(path)
+            for batchSize in (1, 7, 30):
+                fyyur.LISTING_BATCH_SIZE = batchSize
+                with self.subTest(path=path, batchSize=batchSize):
+                    self.assertEqual(render(path), expected)
+
+    def test_connection_released_between_batches(self):
+        fyyur.LISTING_BATCH_SIZE = 10
+        checkins = []
+        with app.app_context():
+            engine = db.engine
+
+        def checked_in(connection, record):
+            checkins.append(record)
+        event.listen(engine, 'checkin', checked_in)
+        self.addCleanup(event.remove, engine, 'checkin', checked_in)
+        render('/artists')
+        # 41 artists: five batches, each with a connection of its own
+        self.assertGreaterEqual(len(checkins), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+# ----------------------------------------------------------------------------#
+# The load test harness.
+#
+# Its percentiles, the baseline gate and the scratch-database guard; the
+# traffic itself is exercised by running loadtest.py.
+#
+#   python test_loadtest.py -v
+# ----------------------------------------------------------------------------#
+
+import os
+import tempfile
+import unittest
+
+from loadtest import compare, is_scratch_database, percentile
+
+
+class PercentileTestCase(unittest.TestCase):
+
+    def test_nearest_rank(self):
+        values = list(range(1, 31))
+        # 0.95 * 30 = 28.5, so the 29th value
+        self.assertEqual(percentile(values, 0.95), 29)
+        self.assertEqual(percentile(values, 0.50), 15)
+        self.assertEqual(percentile(list(range(1, 21)), 0.95), 19)
+        self.assertEqual(percentile(list(range(1, 101)), 0.07), 7)
+
+    def test_edges(self):
+        self.assertEqual(percentile([], 0.95), 0.0)
+        self.assertEqual(percentile([4.0], 0.99), 4.0)
+        self.assertEqual(percentile([1, 2, 3], 1.0), 3)
+        self.assertEqual(percentile([1, 2, 3], 0.0), 1)
+
+    def test_tail_is_not_under_reported(self):
+        # one slow request in twenty is the p95
+        values = [10.0] * 19 + [500.0]
+        self.assertEqual(percentile(values, 0.95), 10.0)
+        values = [10.0] * 18 + [500.0, 500.0]
+        self.assertEqual(percentile(values, 0.95), 500.0)
+
+
+class CompareTestCase(unittest.TestCase):
+
+    def test_regressions(self):
+        routes = {
+            "GET /": {"count": 50, "p95": 20.0},
+            "GET /venues": {"count": 50, "p95": 40.0},
+            "GET /new": {"count": 50, "p95": 1.0},
+            "GET /rare": {"count": 3, "p95": 900.0},
+        }
+        baseline = {"GET /": {"p95": 18.0}, "GET /venues": {"p95": 20.0}, "GET /rare": {"p95": 1.0}}
+        regressions = compare(routes, baseline, 0.25, 5.0, 20)
+        self.assertEqual(regressions, [('GET /new', 1.0, None), ('GET /venues', 40.0, 30.0)])
+
+
+class ScratchDatabaseTestCase(unittest.TestCase):
+
+    def test_scratch_databases(self):
+        self.assertTrue(is_scratch_database('sqlite://'))
+        self.assertTrue(is_scratch_database('sqlite:///:memory:'))
+        with tempfile.NamedTemporaryFile(suffix='.db') as existing:
+            self.assertTrue(is_scratch_database('sqlite:///' + existing.name))
+
+    def test_other_databases(self):
+        self.assertFalse(is_scratch_database('postgresql://fyyur@localhost/fyyur'))
+        self.assertFalse(is_scratch_database('sqlite:///' + os.path.abspath(__file__)))
+
+
+if __name__ == '__main__':
+    unittest.main()
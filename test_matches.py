@@ -0,0 +1,82 @@
+# ----------------------------------------------------------------------------#
+# Matchmaking candidates.
+#
+# /venues/<id>/matches and /artists/<id>/matches score at most
+# MATCH_CANDIDATES rows; the database must hand over the most relevant ones,
+# not whichever come first in the table, through indexed prefilters rather
+# than by scoring every seeking row.
+#
+#   python test_matches.py -v
+# ----------------------------------------------------------------------------#
+
+import unittest
+
+from sqlalchemy import event
+
+from testsupport import AppTestCase, fyyur, app, db, Venue, Artist
+
+
+class MatchCandidatesTestCase(AppTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with app.app_context():
+            venue = Venue(name='Jazz Cellar', city='Austin', state='TX', genres='Jazz,Blues', seeking_talent=True)
+            db.session.add(venue)
+            # more same-state seeking artists than the candidate limit, none
+            # sharing a genre, stored before the one that matches best
+            db.session.execute(Artist.__table__.insert(), [
+                {"name": 'Filler %d' % number, "city": 'Dallas', "state": 'TX', "genres": 'Metal',
+                 "seeking_venue": True, "version": 1}
+                for number in range(fyyur.MATCH_CANDIDATES + 100)])
+            best = Artist(name='Best Quartet', city='Austin', state='TX', genres='Jazz,Blues', seeking_venue=True)
+            remote = Artist(name='Remote Trio', city='Seattle', state='WA', genres='Jazz', seeking_venue=True)
+            unrelated = Artist(name='Far Band', city='Seattle', state='WA', genres='Metal', seeking_venue=True)
+            db.session.add_all([best, remote, unrelated])
+            db.session.commit()
+            cls.venueId, cls.bestId = venue.id, best.id
+            cls.remoteId, cls.unrelatedId = remote.id, unrelated.id
+
+    def candidates(self):
+        with app.app_context():
+            venue = db.session.query(Venue.id, Venue.city, Venue.state, Venue.genres) \
+                .filter(Venue.id == self.venueId).one()
+            return fyyur.find_match_candidates(Artist, Artist.seeking_venue, venue)
+
+    def test_best_match_is_a_candidate(self):
+        candidates = self.candidates()
+        self.assertEqual(len(candidates), fyyur.MATCH_CANDIDATES)
+        self.assertEqual(candidates[0].id, self.bestId)
+        # a shared genre outranks the same state
+        self.assertEqual(candidates[1].id, self.remoteId)
+        self.assertNotIn(self.unrelatedId, [row.id for row in candidates])
+
+    def test_location_prefilters_use_the_index(self):
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append((statement, parameters))
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', record)
+            try:
+                self.candidates()
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', record)
+            statement, parameters = statements[-1]
+            plan = [row[-1] for row in db.engine.execute('EXPLAIN QUERY PLAN ' + statement, parameters)]
+        self.assertEqual(len([step for step in plan if 'ix_Artist_seeking_state_city' in step]), 2)
+
+    def test_best_match_ranks_first(self):
+        response = app.test_client().get('/venues/%d/matches' % self.venueId)
+        self.assertEqual(response.status_code, 200)
+        best = response.get_json()["data"][0]
+        self.assertEqual(best["id"], self.bestId)
+        self.assertEqual(best["shared_genres"], ['Blues', 'Jazz'])
+
+    def test_candidates_are_deterministic(self):
+        self.assertEqual([row.id for row in self.candidates()], [row.id for row in self.candidates()])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,151 @@
+# ----------------------------------------------------------------------------#
+# Metrics of streamed pages.
+#
+# The listings are rendered while their body is sent, after the request
+# hooks have run; their render time and request latency must still cover
+# the whole page. With METRICS_DIR, /metrics sums idle workers too and keeps
+# the totals of workers that have exited.
+#
+#   python test_metrics.py -v
+# ----------------------------------------------------------------------------#
+
+import atexit
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import types
+import unittest
+
+from flask import Flask
+
+import metrics
+from metrics import labels, registry
+from testsupport import AppTestCase, app
+
+
+def histogram(name, **labelValues):
+    # (sum, count) of one histogram
+    values = registry.snapshot()["histograms"]
+    for sampleName, labelPairs, value in values:
+        if sampleName == name and labelPairs == labels(**labelValues):
+            return value[-2], value[-1]
+    return 0.0, 0
+
+
+class StreamedMetricsTestCase(AppTestCase):
+    seedSizes = (20, 40, 400)
+
+    def test_streamed_render_is_timed(self):
+        renderSum, renders = histogram('fyyur_template_render_seconds', template='pages/shows.html')
+        response = app.test_client().get('/shows')
+        response.get_data()
+        response.close()
+        newSum, newRenders = histogram('fyyur_template_render_seconds', template='pages/shows.html')
+        self.assertEqual(newRenders, renders + 1)
+        self.assertGreater(newSum, renderSum)
+
+    def test_latency_is_recorded_when_the_response_closes(self):
+        durationSum, requests = histogram('fyyur_http_request_duration_seconds', endpoint='shows')
+        renderSum, _ = histogram('fyyur_template_render_seconds', template='pages/shows.html')
+        response = app.test_client().get('/shows')
+        self.assertEqual(histogram('fyyur_http_request_duration_seconds', endpoint='shows')[1], requests)
+        response.get_data()
+        response.close()
+        newDurationSum, newRequests = histogram('fyyur_http_request_duration_seconds', endpoint='shows')
+        newRenderSum, _ = histogram('fyyur_template_render_seconds', template='pages/shows.html')
+        self.assertEqual(newRequests, requests + 1)
+        # the request took at least as long as rendering its page
+        self.assertGreaterEqual(newDurationSum - durationSum, newRenderSum - renderSum)
+
+
+def snapshot(requests, checkedOut):
+    return {"counters": [['fyyur_http_requests_total', labels(endpoint='shows'), requests]],
+            "histograms": [['fyyur_http_request_duration_seconds', labels(endpoint='shows'),
+                            [requests] + [0] * len(metrics.BUCKETS) + [0.01 * requests, requests]]],
+            "gauges": [['fyyur_db_pool_checked_out', (), checkedOut]]}
+
+
+def exited_pid():
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+class MultiProcessTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='fyyur-metrics-')
+        self.addCleanup(shutil.rmtree, self.directory, True)
+
+    def write(self, pid, sample):
+        metrics.save(os.path.join(self.directory, '%d.json' % pid), sample)
+
+    def totals(self):
+        merged = metrics.merge(metrics.read_snapshots(self.directory))
+        found = {}
+        for kind in ('counters', 'histograms', 'gauges'):
+            for name, labelPairs, value in merged[kind]:
+                found[name] = found.get(name, 0) + (value[-1] if kind == 'histograms' else value)
+        return found
+
+    def test_idle_workers_are_summed(self):
+        self.write(os.getpid(), snapshot(3, 1))
+        self.write(os.getppid(), snapshot(4, 2))
+        longAgo = time.time() - 24 * 3600
+        for fileName in os.listdir(self.directory):
+            os.utime(os.path.join(self.directory, fileName), (longAgo, longAgo))
+        self.assertEqual(self.totals(), {'fyyur_http_requests_total': 7,
+                                         'fyyur_http_request_duration_seconds': 7,
+                                         'fyyur_db_pool_checked_out': 3})
+
+    def test_exited_workers_keep_their_totals(self):
+        self.write(os.getpid(), snapshot(3, 1))
+        self.write(exited_pid(), snapshot(4, 2))
+        self.write(exited_pid(), snapshot(5, 2))
+        expected = {'fyyur_http_requests_total': 12, 'fyyur_http_request_duration_seconds': 12,
+                    'fyyur_db_pool_checked_out': 1}
+        self.assertEqual(self.totals(), expected)
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                         sorted(['%d.json' % os.getpid(), 'archive.json', 'archive.lock']))
+        # read again from the archive
+        self.assertEqual(self.totals(), expected)
+
+    def test_flushed_without_requests_and_archived_at_exit(self):
+        flaskApp = Flask(__name__, template_folder='no-templates')
+        flaskApp.config.update(METRICS_DIR=self.directory, METRICS_FLUSH_INTERVAL=0.05)
+        pool = types.SimpleNamespace(checkedout=lambda: 0)
+        metrics.init_metrics(flaskApp, types.SimpleNamespace(engine=types.SimpleNamespace(pool=pool)))
+        flaskApp.add_url_rule('/shows', 'shows', lambda: 'shows')
+        retire = flaskApp.extensions['metrics']
+        self.addCleanup(atexit.unregister, retire)
+        self.addCleanup(retire)
+        client = flaskApp.test_client()
+        # the registry is the whole test run's
+        requests = sum(value for name, labelPairs, value in registry.snapshot()["counters"]
+                       if name == 'fyyur_http_requests_total')
+
+        path = os.path.join(self.directory, '%d.json' % os.getpid())
+        client.get('/shows')
+        deadline = time.time() + 5
+        while time.time() < deadline:
+            if os.path.exists(path) and self.totals().get('fyyur_http_requests_total') == requests + 1:
+                break
+            time.sleep(0.05)
+        self.assertEqual(self.totals()['fyyur_http_requests_total'], requests + 1)
+
+        retire()
+        self.assertFalse(os.path.exists(path))
+        time.sleep(0.2)
+        # the flusher stopped with it
+        self.assertFalse(os.path.exists(path))
+        with open(os.path.join(self.directory, 'archive.json')) as archiveFile:
+            self.assertEqual(json.load(archiveFile)["gauges"], [])
+        self.assertEqual(self.totals()['fyyur_http_requests_total'], requests + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+# ----------------------------------------------------------------------------#
+# Request profiling.
+#
+# A profiled request gets a pstats file of its own, named - without the
+# server's path - in the X-Profile header, and PROFILE_DIR never holds more
+# than PROFILE_MAX_FILES of them.
+#
+#   python test_profiler.py -v
+# ----------------------------------------------------------------------------#
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from flask import Flask
+from werkzeug.test import Client
+from werkzeug.wrappers import Response
+
+from profiler import ProfilerMiddleware, sign
+
+
+def create_app(directory, **config):
+    flaskApp = Flask(__name__)
+    flaskApp.config.update(PROFILE_DIR=directory, **config)
+
+    @flaskApp.route('/venues/<int:venue_id>')
+    def show_venue(venue_id):
+        return 'venue %d' % venue_id
+    return Client(ProfilerMiddleware(flaskApp.wsgi_app, flaskApp), Response)
+
+
+def profiles(directory):
+    return sorted(name for path, dirs, names in os.walk(directory) for name in names)
+
+
+class ProfilerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='fyyur-profiles-')
+        self.addCleanup(shutil.rmtree, self.directory, True)
+
+    def test_header_names_the_file_only(self):
+        client = create_app(self.directory, PROFILE_SAMPLE_RATE=1.0)
+        response = client.get('/venues/1')
+        self.assertEqual(response.get_data(), b'venue 1')
+        fileName = response.headers['X-Profile']
+        self.assertNotIn(os.sep, fileName)
+        self.assertNotIn(self.directory, fileName)
+        self.assertTrue(os.path.exists(os.path.join(self.directory, 'GET_venues_int_venue_id', fileName)))
+
+    def test_every_request_gets_its_own_file(self):
+        client = create_app(self.directory, PROFILE_SAMPLE_RATE=1.0)
+        names = [client.get('/venues/1').headers['X-Profile'] for number in range(20)]
+        self.assertEqual(len(set(names)), 20)
+        self.assertEqual(profiles(self.directory), sorted(names))
+
+    def test_oldest_files_are_removed(self):
+        client = create_app(self.directory, PROFILE_SAMPLE_RATE=1.0, PROFILE_MAX_FILES=3)
+        names = []
+        for number in range(6):
+            names.append(client.get('/venues/%d' % number).headers['X-Profile'])
+            # distinct modification times
+            for path, dirs, files in os.walk(self.directory):
+                for name in files:
+                    stat = os.stat(os.path.join(path, name))
+                    os.utime(os.path.join(path, name), (stat.st_atime - 1, stat.st_mtime - 1))
+        self.assertEqual(profiles(self.directory), sorted(names[-3:]))
+
+    def test_signed_token(self):
+        client = create_app(self.directory, PROFILE_SECRET='secret')
+        self.assertNotIn('X-Profile', client.get('/venues/1').headers)
+        # a token signed for another path
+        response = client.get('/venues/1', headers={'X-Profile-Token': sign('/venues/2', 'secret')})
+        self.assertNotIn('X-Profile', response.headers)
+        response = client.get('/venues/1', headers={'X-Profile-Token': sign('/venues/1', 'secret')})
+        self.assertIn('X-Profile', response.headers)
+        self.assertEqual(len(profiles(self.directory)), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,259 @@
+# ----------------------------------------------------------------------------#
+# Query budgets per route.
+#
+# Every route in app.py is requested against a small and a larger seeded
+# sqlite database. Each request must stay within its budget of SQL
+# statements, and the statement count must not grow with the dataset, which
+# is what an N+1 loop or a per-row query looks like. Rows fetched are
+# budgeted too: a fixed number, plus one per row the page lists by design
+# (a listing lists every venue, a detail page every show of its entity).
+# A route without a budget fails the suite, so new routes must declare one.
+#
+#   python test_query_budget.py -v
+# ----------------------------------------------------------------------------#
+
+import sqlite3
+import unittest
+from collections import namedtuple
+
+from testsupport import AppTestCase, create_database, fyyur, app, Show
+
+# rows: fixed allowance; per: one more row for each of these ('venue',
+# 'artist' or 'show' in the database, or 'entity_show' for the shows of the
+# venue or artist the route is about)
+Budget = namedtuple('Budget', 'statements rows per')
+
+BUDGETS = {
+    ('GET', '/'): Budget(3, 3 * fyyur.HOME_FEED_SIZE, None),
+    ('GET', '/venues'): Budget(1, 0, 'venue'),
+    ('POST', '/venues/search'): Budget(1, 0, 'venue'),
+    ('GET', '/venues/<int:venue_id>'): Budget(3, 1, 'entity_show'),
+    ('DELETE', '/venues/<int:venue_id>'): Budget(4, 1, 'entity_show'),
+    ('GET', '/venues/create'): Budget(0, 0, None),
+    ('POST', '/venues/create'): Budget(5, 3 * fyyur.HOME_FEED_SIZE + 1, None),
+    ('GET', '/venues/<int:venue_id>/edit'): Budget(1, 1, None),
+    ('POST', '/venues/<int:venue_id>/edit'): Budget(5, 2, 'entity_show'),
+    ('GET', '/venues/<int:venue_id>/calendar'): Budget(2, 1, 'entity_show'),
+    ('GET', '/venues/<int:venue_id>/matches'): Budget(3, 2 * fyyur.MATCH_CANDIDATES + 1, None),
+    ('GET', '/venues/near'): Budget(2, fyyur.NEARBY_SHOWS_PER_VENUE * fyyur.NEARBY_LIMIT, 'venue'),
+    ('GET', '/artists'): Budget(1, 0, 'artist'),
+    ('POST', '/artists/search'): Budget(1, 0, 'artist'),
+    ('GET', '/artists/<int:artist_id>'): Budget(3, 1, 'entity_show'),
+    ('DELETE', '/artists/<int:artist_id>'): Budget(4, 1, 'entity_show'),
+    ('GET', '/artists/create'): Budget(0, 0, None),
+    ('POST', '/artists/create'): Budget(4, 3 * fyyur.HOME_FEED_SIZE, None),
+    ('GET', '/artists/<int:artist_id>/edit'): Budget(1, 1, None),
+    ('POST', '/artists/<int:artist_id>/edit'): Budget(4, 1, 'entity_show'),
+    ('GET', '/artists/<int:artist_id>/calendar'): Budget(2, 1, 'entity_show'),
+    ('GET', '/artists/<int:artist_id>/matches'): Budget(3, 2 * fyyur.MATCH_CANDIDATES + 1, None),
+    ('GET', '/shows'): Budget(1, 0, 'show'),
+    ('GET', '/shows/create'): Budget(0, 0, None),
+    ('POST', '/shows/create'): Budget(7, 3 * fyyur.HOME_FEED_SIZE + fyyur.SHOW_MAX_LINEUP, None),
+    ('GET', '/search'): Budget(1, 3 * fyyur.SEARCH_LIMIT, None),
+    ('POST', '/search'): Budget(1, 3 * fyyur.SEARCH_LIMIT, None),
+    ('GET', '/reports/shows'): Budget(1, fyyur.REPORT_MAX_ROWS + 1, None),
+    ('GET', '/metrics'): Budget(0, 0, None),
+    ('GET', '/healthz'): Budget(0, 0, None),
+}
+
+# listings fetched in batches (see batched_rows in app.py): their statement
+# budget is per LISTING_BATCH_SIZE rows listed, so their statement count
+# grows with the dataset by design
+BATCHED = {('GET', '/venues'), ('GET', '/artists'), ('GET', '/shows')}
+
+# (venues, artists, shows)
+DATASETS = ((20, 40, 200), (80, 160, 800))
+
+VENUE_FORM = {
+    "name": 'Budget Hall', "city": 'Austin', "state": 'TX', "address": '1 Main St', "phone": '555-100-2000',
+    "genres": 'Jazz', "facebook_link": 'https://www.facebook.com/budget', "image_link": '',
+    "website_link": '', "seeking_talent": 'y', "seeking_description": 'Jazz nights',
+}
+ARTIST_FORM = {
+    "name": 'Budget Band', "city": 'Austin', "state": 'TX', "phone": '555-100-3000', "genres": 'Jazz',
+    "facebook_link": 'https://www.facebook.com/band', "image_link": '', "website_link": '',
+    "seeking_venue": 'y', "seeking_description": 'Looking for gigs',
+}
+
+
+#  Statement recording
+#  ----------------------------------------------------------------
+
+class Recorder(object):
+    # [statement, rows fetched] for every statement while recording
+    statements = None
+
+
+class CountingCursor(sqlite3.Cursor):
+
+    def execute(self, statement, *args):
+        self.record(statement)
+        return sqlite3.Cursor.execute(self, statement, *args)
+
+    def executemany(self, statement, *args):
+        self.record(statement)
+        return sqlite3.Cursor.executemany(self, statement, *args)
+
+    def record(self, statement):
+        self.entry = None
+        if Recorder.statements is not None:
+            self.entry = [statement, 0]
+            Recorder.statements.append(self.entry)
+
+    def count(self, rows):
+        if getattr(self, 'entry', None) is not None:
+            self.entry[1] += rows
+        return rows
+
+    def fetchone(self):
+        row = sqlite3.Cursor.fetchone(self)
+        self.count(0 if row is None else 1)
+        return row
+
+    def fetchmany(self, *args):
+        rows = sqlite3.Cursor.fetchmany(self, *args)
+        self.count(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = sqlite3.Cursor.fetchall(self)
+        self.count(len(rows))
+        return rows
+
+
+class CountingConnection(sqlite3.Connection):
+
+    def cursor(self, factory=CountingCursor):
+        return sqlite3.Connection.cursor(self, factory)
+
+
+def connect():
+    conn = sqlite3.connect(app.config['SQLALCHEMY_DATABASE_URI'][len('sqlite:///'):],
+                           factory=CountingConnection, check_same_thread=False)
+    conn.execute('PRAGMA foreign_keys=ON')
+    return conn
+
+
+def format_statements(statements):
+    return '\n'.join('  [%d rows] %s' % (rows, ' '.join(statement.split())) for statement, rows in statements)
+
+
+#  Tests
+#  ----------------------------------------------------------------
+
+class QueryBudgetTestCase(AppTestCase):
+    config = {"SQLALCHEMY_ENGINE_OPTIONS": {"creator": connect}}
+
+    def load(self, dataset):
+        venues, artists, shows = dataset
+        venueIds, artistIds = create_database('budget-%d' % venues, dataset)
+        return {"venue": venues, "artist": artists, "show": shows, "venue_id": venueIds[0],
+                "artist_id": artistIds[0], "last_venue_id": venueIds[-1], "last_artist_id": artistIds[-1]}
+
+    def requests(self, data):
+        # (method, rule, path, form, the entity whose shows the page lists);
+        # deletes come last and remove entities nothing else uses
+        venueId, artistId = data["venue_id"], data["artist_id"]
+        venue, artist = ('venue', venueId), ('artist', artistId)
+        return [
+            ('GET', '/', '/', None, None),
+            ('GET', '/venues', '/venues', None, None),
+            ('POST', '/venues/search', '/venues/search', {"search_term": 'hop'}, None),
+            ('GET', '/venues/<int:venue_id>', '/venues/%d' % venueId, None, venue),
+            ('GET', '/venues/create', '/venues/create', None, None),
+            ('POST', '/venues/create', '/venues/create', VENUE_FORM, None),
+            ('GET', '/venues/<int:venue_id>/edit', '/venues/%d/edit' % venueId, None, None),
+            ('POST', '/venues/<int:venue_id>/edit', '/venues/%d/edit' % venueId, VENUE_FORM, venue),
+            ('GET', '/venues/<int:venue_id>/calendar', '/venues/%d/calendar' % venueId, None, venue),
+            ('GET', '/venues/<int:venue_id>/matches', '/venues/%d/matches' % venueId, None, None),
+            ('GET', '/venues/near', '/venues/near?lat=30.2672&lng=-97.7431&radius=50', None, None),
+            ('GET', '/artists', '/artists', None, None),
+            ('POST', '/artists/search', '/artists/search', {"search_term": 'band'}, None),
+            ('GET', '/artists/<int:artist_id>', '/artists/%d' % artistId, None, artist),
+            ('GET', '/artists/create', '/artists/create', None, None),
+            ('POST', '/artists/create', '/artists/create', ARTIST_FORM, None),
+            ('GET', '/artists/<int:artist_id>/edit', '/artists/%d/edit' % artistId, None, None),
+            ('POST', '/artists/<int:artist_id>/edit', '/artists/%d/edit' % artistId, ARTIST_FORM, artist),
+            ('GET', '/artists/<int:artist_id>/calendar', '/artists/%d/calendar' % artistId, None, artist),
+            ('GET', '/artists/<int:artist_id>/matches', '/artists/%d/matches' % artistId, None, None),
+            ('GET', '/shows', '/shows', None, None),
+            ('GET', '/shows/create', '/shows/create', None, None),
+            ('POST', '/shows/create', '/shows/create', {"venue_id": str(venueId), "artist_id": str(artistId),
+                                                        "start_time": '2035-01-01 20:00:00'}, None),
+            ('POST', '/shows/create', '/shows/create', {"venue_id": str(venueId),
+                                                        "artist_id": '%d, %d, %d' % (artistId, artistId + 1, artistId + 2),
+                                                        "start_time": '2035-02-01 20:00:00', "repeat": 'weekly',
+                                                        "repeat_until": '2035-03-29'}, None),
+            ('GET', '/search', '/search?search_term=jazz', None, None),
+            ('POST', '/search', '/search', {"search_term": 'park'}, None),
+            ('GET', '/reports/shows', '/reports/shows?by=genre,month', None, None),
+            ('GET', '/metrics', '/metrics', None, None),
+            ('GET', '/healthz', '/healthz', None, None),
+            ('DELETE', '/venues/<int:venue_id>', '/venues/%d' % data["last_venue_id"], None,
+             ('venue', data["last_venue_id"])),
+            ('DELETE', '/artists/<int:artist_id>', '/artists/%d' % data["last_artist_id"], None,
+             ('artist', data["last_artist_id"])),
+        ]
+
+    def entity_shows(self, entity):
+        with app.app_context():
+            kind, entityId = entity
+            column = Show.venue_id if kind == 'venue' else Show.artist_id
+            return Show.query.filter(column == entityId).count()
+
+    def measure(self, method, path, form):
+        fyyur.cache.clear()
+        client = app.test_client()
+        Recorder.statements = []
+        try:
+            response = client.open(path, method=method, data=form)
+            # streamed pages run their queries while the body is read
+            response.get_data()
+        finally:
+            statements, Recorder.statements = Recorder.statements, None
+        self.assertLess(response.status_code, 500, '%s %s failed' % (method, path))
+        return statements
+
+    def test_every_route_has_a_budget(self):
+        routes = set()
+        for rule in app.url_map.iter_rules():
+            if rule.endpoint == 'static':
+                continue
+            for method in rule.methods - {'HEAD', 'OPTIONS'}:
+                routes.add((method, rule.rule))
+        self.assertEqual(sorted(routes - set(BUDGETS)), [], 'routes without a query budget')
+        exercised = set(request[:2] for request in self.requests(
+            {"venue_id": 1, "artist_id": 1, "last_venue_id": 2, "last_artist_id": 2}))
+        self.assertEqual(sorted(routes - exercised), [],
+                         'routes not exercised by the budget test')
+
+    def test_routes_stay_within_budget(self):
+        counts = {}
+        for dataset in DATASETS:
+            data = self.load(dataset)
+            for method, rule, path, form, entity in self.requests(data):
+                budget = BUDGETS[(method, rule)]
+                maxStatements, maxRows = budget.statements, budget.rows
+                if (method, rule) in BATCHED:
+                    maxStatements *= data[budget.per] // fyyur.LISTING_BATCH_SIZE + 1
+                if budget.per == 'entity_show':
+                    maxRows += self.entity_shows(entity)
+                elif budget.per:
+                    maxRows += data[budget.per]
+                statements = self.measure(method, path, form)
+                rows = sum(fetched for _, fetched in statements)
+                with self.subTest(route='%s %s' % (method, rule), dataset=dataset):
+                    self.assertLessEqual(len(statements), maxStatements,
+                                         '%d statements over a budget of %d:\n%s'
+                                         % (len(statements), maxStatements, format_statements(statements)))
+                    self.assertLessEqual(rows, maxRows, '%d rows fetched over a budget of %d:\n%s'
+                                         % (rows, maxRows, format_statements(statements)))
+                    if (method, rule) in counts and (method, rule) not in BATCHED:
+                        self.assertEqual(len(statements), counts[(method, rule)],
+                                         'statement count grows with the dataset:\n%s'
+                                         % format_statements(statements))
+                counts[(method, rule)] = len(statements)
+
+
+if __name__ == '__main__':
+    unittest.main()
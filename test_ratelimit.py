@@ -0,0 +1,152 @@
+# ----------------------------------------------------------------------------#
+# Rate limiting and load shedding.
+#
+# A client over its burst and a group over its concurrency cap get a 429
+# with Retry-After, and a request's concurrency slot is given back however
+# its view ends.
+#
+#   python test_ratelimit.py -v
+# ----------------------------------------------------------------------------#
+
+import sys
+import types
+import unittest
+from unittest import mock
+
+from ratelimit import LocalStore, create_store
+from testsupport import AppTestCase, app
+
+
+class RateLimitTestCase(AppTestCase):
+    seedSizes = (5, 5, 10)
+    config = {"RATELIMIT_ENABLED": True}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.store = app.extensions['ratelimit_store']
+
+    def setUp(self):
+        self.store.buckets.clear()
+        self.store.slots.clear()
+
+    def search(self, client):
+        return client.post('/venues/search', data={"search_term": 'the'})
+
+    def test_burst_then_429(self):
+        client = app.test_client()
+        for number in range(app.config['RATELIMIT_SEARCH_BURST']):
+            self.assertEqual(self.search(client).status_code, 200)
+        response = self.search(client)
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response.headers['Retry-After']), 1)
+        # the bucket is per client
+        other = app.test_client()
+        response = other.post('/venues/search', data={"search_term": 'the'}, environ_base={"REMOTE_ADDR": '10.0.0.2'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_other_routes_are_not_limited(self):
+        client = app.test_client()
+        for number in range(app.config['RATELIMIT_SEARCH_BURST'] + 1):
+            self.search(client)
+        self.assertEqual(client.get('/venues').status_code, 200)
+
+    def test_concurrency_cap_sheds(self):
+        self.store.slots['search'] = app.config['RATELIMIT_SEARCH_CONCURRENCY']
+        response = self.search(app.test_client())
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers['Retry-After'], '1')
+        # a shed request holds no slot
+        self.assertEqual(self.store.slots['search'], app.config['RATELIMIT_SEARCH_CONCURRENCY'])
+
+    def test_slot_released_after_request(self):
+        self.assertEqual(self.search(app.test_client()).status_code, 200)
+        self.assertEqual(self.store.slots['search'], 0)
+
+    def test_slot_released_when_the_view_raises(self):
+        held = []
+
+        def failing_search():
+            held.append(self.store.slots['search'])
+            raise RuntimeError('search failed')
+        saved = app.view_functions['search_venues']
+        app.view_functions['search_venues'] = failing_search
+        # tear the failed request down at once, as outside debug mode
+        app.config['PRESERVE_CONTEXT_ON_EXCEPTION'] = False
+        try:
+            with self.assertRaises(RuntimeError):
+                self.search(app.test_client())
+        finally:
+            app.view_functions['search_venues'] = saved
+            app.config['PRESERVE_CONTEXT_ON_EXCEPTION'] = None
+        self.assertEqual(held, [1])
+        self.assertEqual(self.store.slots['search'], 0)
+
+
+class LocalStoreTestCase(unittest.TestCase):
+
+    def test_release_never_goes_negative(self):
+        store = LocalStore()
+        holder = store.acquire('write', 1)
+        self.assertIsNone(store.acquire('write', 1))
+        store.release('write', holder)
+        store.release('write', holder)
+        self.assertEqual(store.slots['write'], 0)
+        self.assertIsNotNone(store.acquire('write', 1))
+        self.assertIsNone(store.acquire('write', 1))
+
+
+class FakeRedis(object):
+    # records the script calls; every script returns `result`
+
+    def __init__(self, result):
+        self.result = result
+        self.calls = []
+        self.removed = []
+
+    def register_script(self, script):
+        def run(keys, args):
+            self.calls.append((script, keys, args))
+            return self.result
+        return run
+
+    def zrem(self, key, member):
+        self.removed.append((key, member))
+
+
+class RedisStoreTestCase(unittest.TestCase):
+
+    def create_store(self, client):
+        module = types.ModuleType('redis')
+        module.Redis = types.SimpleNamespace(from_url=lambda url: client)
+        with mock.patch.dict(sys.modules, {"redis": module}):
+            return create_store({"RATELIMIT_BACKEND": 'redis', "RATELIMIT_REDIS_URL": 'redis://ratelimit',
+                                 "RATELIMIT_SLOT_TIMEOUT": 90})
+
+    def test_scripts_use_the_redis_clock(self):
+        client = FakeRedis([1, '3.5'])
+        store = self.create_store(client)
+        self.assertEqual(store.take('search:10.0.0.1', 2.0, 20), (True, 0))
+        script, keys, args = client.calls[0]
+        self.assertIn("redis.call('TIME')", script)
+        # the worker's clock isn't passed in
+        self.assertEqual(args, [2.0, 20])
+
+    def test_slot_timeout_comes_from_config(self):
+        client = FakeRedis(1)
+        store = self.create_store(client)
+        holder = store.acquire('search', 8)
+        script, keys, args = client.calls[0]
+        self.assertIn("redis.call('TIME')", script)
+        self.assertEqual(keys, ['fyyur:ratelimit:slots:search'])
+        self.assertEqual(args, [8, 90, holder])
+        store.release('search', holder)
+        self.assertEqual(client.removed, [('fyyur:ratelimit:slots:search', holder)])
+
+    def test_full_group_gives_no_holder(self):
+        store = self.create_store(FakeRedis(0))
+        self.assertIsNone(store.acquire('write', 4))
+
+
+if __name__ == '__main__':
+    unittest.main()
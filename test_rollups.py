@@ -0,0 +1,93 @@
+# ----------------------------------------------------------------------------#
+# Show rollups.
+#
+# After every kind of write - creating shows, deleting a venue or an artist,
+# moving a venue or changing an artist's genres - /reports/shows must report
+# what counting the Show table would, and so must the rollups the migration
+# backfills.
+#
+#   python test_rollups.py -v
+# ----------------------------------------------------------------------------#
+
+import importlib.util
+import os
+import unittest
+from collections import Counter
+
+from testsupport import AppTestCase, fyyur, app, db, Show, prefilled_form, post_fields
+
+MIGRATION = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations', 'versions', 'b83e5d2a9c14_.py')
+
+
+def counted():
+    # {(month, state, city, genre): shows} counted from the Show table
+    with app.app_context():
+        counts = fyyur.rollups.add(Counter(), fyyur.rollups.grouped_shows())
+    return dict((key, shows) for key, shows in counts.items() if shows)
+
+
+def reported():
+    response = app.test_client().get('/reports/shows', query_string={"by": 'month,state,city,genre'})
+    return dict(((entry["month"], entry["state"], entry["city"], entry["genre"]), entry["shows"])
+                for entry in response.get_json()["data"])
+
+
+class RollupTestCase(AppTestCase):
+    seedSizes = (8, 12, 150)
+
+    def test_seeded(self):
+        self.assertEqual(reported(), counted())
+
+    def test_create_then_report(self):
+        venueIds, artistIds = self.seeded
+        response = app.test_client().post('/shows/create', data={
+            "venue_id": str(venueIds[0]), "artist_id": '%d,%d' % (artistIds[0], artistIds[1]),
+            "start_time": '2031-01-05 20:00:00', "repeat": 'weekly', "repeat_until": '2031-02-20'})
+        self.assertIn('14 shows were successfully listed', response.get_data(as_text=True))
+        self.assertEqual(reported(), counted())
+
+    def test_delete_then_report(self):
+        venueIds, artistIds = self.seeded
+        self.assertEqual(app.test_client().delete('/venues/%d' % venueIds[-1]).get_json(), {"success": True})
+        self.assertEqual(reported(), counted())
+        self.assertEqual(app.test_client().delete('/artists/%d' % artistIds[-1]).get_json(), {"success": True})
+        self.assertEqual(reported(), counted())
+
+    def test_edit_then_report(self):
+        venueIds, artistIds = self.seeded
+        client = app.test_client()
+        path = '/venues/%d/edit' % venueIds[1]
+        fields = [(name, value) for name, value in prefilled_form(client, path) if name not in ('city', 'state')]
+        post_fields(client, path, fields + [('city', 'Fairbanks'), ('state', 'AK')])
+        self.assertIn(('AK', 'Fairbanks'), set((state, city) for month, state, city, genre in reported()))
+        self.assertEqual(reported(), counted())
+
+        path = '/artists/%d/edit' % artistIds[1]
+        fields = [(name, value) for name, value in prefilled_form(client, path) if name != 'genres']
+        post_fields(client, path, fields + [('genres', 'Swing'), ('genres', 'Soul')])
+        self.assertIn('Swing', set(genre for month, state, city, genre in reported()))
+        self.assertEqual(reported(), counted())
+
+    def test_migration_backfill(self):
+        spec = importlib.util.spec_from_file_location('rollup_migration', MIGRATION)
+        migration = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(migration)
+        with app.app_context():
+            # artists without genres count as 'Unknown', postgres literals
+            # are split like plain lists
+            db.session.execute(Show.__table__.insert(), [
+                {"venue_id": self.seeded[0][2], "artist_id": artistId, "start_time": '2032-03-01 20:00:00'}
+                for artistId in self.seeded[1][2:4]])
+            fyyur.Artist.query.filter(fyyur.Artist.id == self.seeded[1][2]).update({"genres": None})
+            fyyur.Artist.query.filter(fyyur.Artist.id == self.seeded[1][3]).update({"genres": '{Jazz,"Hip-Hop"}'})
+            fyyur.ShowRollup.query.delete()
+            db.session.execute(migration.BACKFILL_SQL % {"position": 'instr'})
+            db.session.commit()
+        backfilled = reported()
+        self.assertIn(('2032-03', 'Unknown'), set((month, genre) for month, state, city, genre in backfilled))
+        self.assertIn(('2032-03', 'Hip-Hop'), set((month, genre) for month, state, city, genre in backfilled))
+        self.assertEqual(backfilled, counted())
+
+
+if __name__ == '__main__':
+    unittest.main()
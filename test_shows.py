@@ -0,0 +1,101 @@
+# ----------------------------------------------------------------------------#
+# Show submissions.
+#
+# A submission is expanded into one row per artist of its line-up and
+# occurrence of a weekly or biweekly show, and refused as a whole when the
+# venue or an artist already has a show overlapping one of them.
+#
+#   python test_shows.py -v
+# ----------------------------------------------------------------------------#
+
+import unittest
+
+from testsupport import AppTestCase, fyyur, app, db, Show
+
+
+class ExpandShowsTestCase(unittest.TestCase):
+
+    def test_lineup(self):
+        self.assertEqual(fyyur.parse_lineup('3, 7 12,3'), [3, 7, 12])
+        shows = fyyur.expand_shows({"venue_id": '2', "artist_id": '5,6', "start_time": '2026-03-01 20:00'})
+        self.assertEqual(shows, [
+            {"venue_id": 2, "artist_id": 5, "start_time": '2026-03-01 20:00:00'},
+            {"venue_id": 2, "artist_id": 6, "start_time": '2026-03-01 20:00:00'},
+        ])
+
+    def test_bad_lineup(self):
+        for lineup in ('', 'seven', ','.join(str(number) for number in range(fyyur.SHOW_MAX_LINEUP + 1))):
+            with self.assertRaises(ValueError):
+                fyyur.expand_shows({"venue_id": '2', "artist_id": lineup, "start_time": '2026-03-01 20:00'})
+
+    def test_weekly_and_biweekly(self):
+        data = {"venue_id": '1', "artist_id": '4', "start_time": '2026-03-01 20:00', "repeat_until": '2026-03-29'}
+        weekly = fyyur.expand_shows(dict(data, repeat='weekly'))
+        self.assertEqual([show["start_time"] for show in weekly],
+                         ['2026-03-%02d 20:00:00' % day for day in (1, 8, 15, 22, 29)])
+        biweekly = fyyur.expand_shows(dict(data, repeat='biweekly'))
+        self.assertEqual([show["start_time"] for show in biweekly],
+                         ['2026-03-%02d 20:00:00' % day for day in (1, 15, 29)])
+        # no repeat: repeat_until is ignored
+        self.assertEqual(len(fyyur.expand_shows(data)), 1)
+
+    def test_max_occurrences(self):
+        data = {"venue_id": '1', "artist_id": '4', "start_time": '2026-01-01 20:00', "repeat": 'weekly'}
+        shows = fyyur.expand_shows(dict(data, repeat_until='2026-12-31'))
+        self.assertEqual(len(shows), fyyur.SHOW_MAX_OCCURRENCES)
+        with self.assertRaises(ValueError):
+            fyyur.expand_shows(dict(data, repeat_until='2027-01-07'))
+
+    def test_bad_repeat_until(self):
+        data = {"venue_id": '1', "artist_id": '4', "start_time": '2026-01-01 20:00', "repeat": 'weekly'}
+        for until in ('', 'next year'):
+            with self.assertRaises(ValueError):
+                fyyur.expand_shows(dict(data, repeat_until=until))
+
+
+class ShowConflictTestCase(AppTestCase):
+    seedSizes = (3, 6, 0)
+
+    def setUp(self):
+        with app.app_context():
+            db.session.query(Show).delete()
+            db.session.execute(Show.__table__.insert(), [
+                {"venue_id": 1, "artist_id": 1, "start_time": '2026-05-01 20:00:00'},
+                {"venue_id": 2, "artist_id": 2, "start_time": '2026-05-08 21:00:00'},
+            ])
+            db.session.commit()
+
+    def submit(self, **data):
+        response = app.test_client().post('/shows/create', data=dict({"venue_id": '3', "artist_id": '3'}, **data))
+        self.assertEqual(response.status_code, 200)
+        return response.get_data(as_text=True)
+
+    def show_count(self):
+        with app.app_context():
+            return db.session.query(Show).count()
+
+    def test_overlapping_shows_are_refused(self):
+        for data in ({"venue_id": '1', "start_time": '2026-05-01 22:30:00'},
+                     {"artist_id": '4,1', "start_time": '2026-05-01 17:30:00'},
+                     # the third week overlaps the second show's artist
+                     {"artist_id": '2', "start_time": '2026-04-24 19:00:00', "repeat": 'weekly',
+                      "repeat_until": '2026-05-31'}):
+            self.assertIn('already booked', self.submit(**data))
+            self.assertEqual(self.show_count(), 2)
+
+    def test_shows_after_the_window_are_listed(self):
+        # back to back with the first show, at another time than the second
+        self.assertIn('successfully listed', self.submit(venue_id='1', start_time='2026-05-01 23:00:00'))
+        self.assertIn('2 shows were successfully listed',
+                      self.submit(artist_id='2,5', start_time='2026-05-08 17:00:00'))
+        self.assertEqual(self.show_count(), 5)
+
+    def test_window_follows_config(self):
+        self.addCleanup(app.config.__setitem__, 'SHOW_DURATION_MINUTES', app.config['SHOW_DURATION_MINUTES'])
+        app.config['SHOW_DURATION_MINUTES'] = 30
+        self.assertIn('successfully listed', self.submit(venue_id='1', start_time='2026-05-01 20:30:00'))
+        self.assertIn('already booked', self.submit(venue_id='1', start_time='2026-05-01 20:29:00'))
+
+
+if __name__ == '__main__':
+    unittest.main()
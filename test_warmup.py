@@ -0,0 +1,117 @@
+# ----------------------------------------------------------------------------#
+# Cache warm-up.
+#
+# The warm-up fills the caches for the most visited entities and search
+# terms recorded in ACCESS_STATS_DIR and for the pages every visitor sees,
+# /healthz answers 503 until it is done, and the in-memory counts are
+# trimmed to the keys that can still make the top.
+#
+#   python test_warmup.py -v
+# ----------------------------------------------------------------------------#
+
+import json
+import os
+import shutil
+import threading
+import types
+import unittest
+
+from flask import Flask
+
+import warmup
+from metrics import labels, registry
+from testsupport import AppTestCase, fyyur, app
+
+
+def cache_hits(cache):
+    for name, labelPairs, value in registry.snapshot()["counters"]:
+        if name == 'fyyur_cache_requests_total' and labelPairs == labels(cache=cache, result='hit'):
+            return value
+    return 0
+
+
+class WarmUpTestCase(AppTestCase):
+    seedSizes = (10, 20, 100)
+
+    def setUp(self):
+        fyyur.cache.clear()
+        self.directory = app.config['ACCESS_STATS_DIR']
+        os.makedirs(self.directory, exist_ok=True)
+        self.addCleanup(shutil.rmtree, self.directory, True)
+        with open(os.path.join(self.directory, '1-1.json'), 'w') as statsFile:
+            json.dump({"venue": {"1": 5, "2": 1}, "search:venues": {"the": 3}}, statsFile)
+
+    def test_warms_recorded_keys_and_pages(self):
+        templates, warmed = app.extensions['warmup']()
+        self.assertGreater(templates, 0)
+        # two pages, two venues and one search term
+        self.assertEqual(warmed, 5)
+        venueHits, areaHits = cache_hits('detail:venue'), cache_hits('areas')
+        for path in ('/venues/1', '/venues'):
+            response = app.test_client().get(path)
+            response.get_data()
+            # ends the streamed page and its request context
+            response.close()
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(cache_hits('detail:venue'), venueHits + 1)
+        self.assertEqual(cache_hits('areas'), areaHits + 1)
+
+    def test_venue_areas_are_cached_with_their_venues(self):
+        fyyur.warm_venue_areas()
+        with app.test_request_context('/'):
+            areas = fyyur.venue_areas()
+        self.assertIsInstance(areas, list)
+        self.assertEqual(sum(len(area["venues"]) for area in areas), 10)
+
+    def test_warmup_command(self):
+        result = app.test_cli_runner().invoke(args=['warmup'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertRegex(result.output, r'^compiled \d+ templates, warmed 5 cache entries')
+
+
+class HealthzTestCase(unittest.TestCase):
+
+    def test_not_ready_until_warm(self):
+        release = threading.Event()
+        # no templates to compile
+        flaskApp = Flask(__name__, template_folder='no-templates')
+        flaskApp.config.update(ACCESS_STATS_DIR=None, WARMUP_ENABLED=True)
+        session = types.SimpleNamespace(remove=lambda: None)
+        warmup.init_warmup(flaskApp, types.SimpleNamespace(session=session), {}, [release.wait])
+        client = flaskApp.test_client()
+        response = client.get('/healthz')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.get_json(), {"status": 'warming'})
+        release.set()
+        for thread in threading.enumerate():
+            if thread.name == 'warmup':
+                thread.join(5)
+        response = client.get('/healthz')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json(), {"status": 'ready'})
+
+
+class TrimTestCase(unittest.TestCase):
+
+    def setUp(self):
+        saved = dict(warmup.accessCounts)
+        warmup.accessCounts.clear()
+        self.addCleanup(warmup.accessCounts.update, saved)
+        self.addCleanup(warmup.accessCounts.clear)
+
+    def test_keeps_the_most_visited(self):
+        config = {"WARMUP_TOP_TERMS": 2, "WARMUP_TOP_ENTITIES": 3}
+        for number in range(100):
+            warmup.record_access('search:all', 'term %d' % number)
+            warmup.record_access('venue', number)
+        for number in range(5):
+            warmup.record_access('search:all', 'popular')
+        warmup.trim_counts(config)
+        terms = warmup.accessCounts['search:all']
+        self.assertEqual(len(terms), 2 * warmup.TRIM_FACTOR)
+        self.assertEqual(terms['popular'], 5)
+        self.assertEqual(len(warmup.accessCounts['venue']), 3 * warmup.TRIM_FACTOR)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+# ----------------------------------------------------------------------------#
+# Shared set-up for the tests.
+#
+# config.py reads DATABASE_URL and the other settings when app.py is first
+# imported, so test modules import app, db and the rest of app.py through
+# this module, which points them at a scratch directory first. AppTestCase
+# gives every test class its own sqlite database in that directory, built
+# with create_schema and seeded with seedSizes when set, and a known app
+# configuration: class `config` entries override the defaults below.
+# prefilled_form and post_fields submit an edit form as a browser would.
+# ----------------------------------------------------------------------------#
+
+import atexit
+import os
+import shutil
+import tempfile
+import unittest
+from html.parser import HTMLParser
+
+SCRATCH = tempfile.mkdtemp(prefix='fyyur-tests-')
+atexit.register(shutil.rmtree, SCRATCH, True)
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(SCRATCH, 'fyyur.db')
+os.environ['ACCESS_STATS_DIR'] = os.path.join(SCRATCH, 'access_stats')
+# warm-up queries would run in the background of the tested requests
+os.environ['WARMUP_ENABLED'] = '0'
+
+import app as fyyur
+from app import app, db, Venue, Artist, Show
+from schema import create_schema
+from seed import seed
+
+# every test class starts from these; rate limits would throttle the tests
+# that don't exercise them
+TEST_CONFIG = {
+    "TESTING": True,
+    "WARMUP_ENABLED": False,
+    "WTF_CSRF_ENABLED": False,
+    "RATELIMIT_ENABLED": False,
+    "SQLALCHEMY_ENGINE_OPTIONS": {},
+}
+
+
+def create_database(name, seedSizes=None):
+    # points the app at a new scratch database; returns the seeded
+    # (venue ids, artist ids), or None when not seeded
+    path = os.path.join(SCRATCH, name + '.db')
+    if os.path.exists(path):
+        os.remove(path)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + path
+    with app.app_context():
+        with db.engine.begin() as conn:
+            create_schema(conn, db.metadata, app.config['SHOW_PARTITION_MONTHS_AHEAD'])
+        if seedSizes:
+            return seed(*seedSizes)
+    return None
+
+
+class AppTestCase(unittest.TestCase):
+    # (venues, artists, shows) to seed, None for an empty database
+    seedSizes = None
+    config = {}
+
+    @classmethod
+    def setUpClass(cls):
+        app.config.update(TEST_CONFIG)
+        app.config.update(cls.config)
+        fyyur.cache.clear()
+        cls.seeded = create_database('%s-%s' % (cls.__module__, cls.__name__), cls.seedSizes)
+
+
+class FormParser(HTMLParser):
+    # the fields a browser would submit for the first form of a page:
+    # [(name, value)], with unchecked boxes and unselected options left out
+
+    def __init__(self):
+        HTMLParser.__init__(self)
+        self.fields = []
+        self.select = None
+        self.textarea = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'input' and attrs.get('name'):
+            if attrs.get('type') != 'checkbox' or 'checked' in attrs:
+                self.fields.append((attrs['name'], attrs.get('value') or ''))
+        elif tag == 'select':
+            self.select = attrs.get('name')
+        elif tag == 'option' and self.select and 'selected' in attrs:
+            self.fields.append((self.select, attrs.get('value')))
+        elif tag == 'textarea':
+            self.textarea = attrs.get('name')
+            self.fields.append((self.textarea, ''))
+
+    def handle_endtag(self, tag):
+        if tag == 'select':
+            self.select = None
+        elif tag == 'textarea':
+            self.textarea = None
+
+    def handle_data(self, data):
+        if self.textarea:
+            self.fields[-1] = (self.textarea, self.fields[-1][1] + data)
+
+
+def prefilled_form(client, path):
+    parser = FormParser()
+    parser.feed(client.get(path).get_data(as_text=True))
+    return parser.fields
+
+
+def post_fields(client, path, fields):
+    data = {}
+    for name, value in fields:
+        data.setdefault(name, []).append(value)
+    return client.post(path, data=data)
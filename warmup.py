@@ -0,0 +1,198 @@
+# ----------------------------------------------------------------------------#
+# Cache warm-up.
+#
+# The routes record what is visited (venue and artist pages, search terms)
+# with record_access. Every ACCESS_STATS_FLUSH_INTERVAL seconds each worker
+# writes its counts to ACCESS_STATS_DIR/<pid>-<start>.json; the files of
+# earlier workers and deploys stay there for ACCESS_STATS_MAX_AGE seconds,
+# so the counts survive restarts. Each worker keeps only the most visited
+# keys of a kind - TRIM_FACTOR times as many as are warmed - so the counts
+# of one-off search terms don't pile up.
+#
+# A worker warms up in a background thread when it gets its first request:
+# it compiles every template and fills the caches for the most visited
+# entities and search terms, plus the pages every visitor sees (home, the
+# venue areas). /healthz answers 503 until then, so a load balancer only
+# routes to warm workers. `flask warmup` does the same in the foreground,
+# e.g. after a deploy when the caches are shared through redis.
+# ----------------------------------------------------------------------------#
+
+import json
+import os
+import threading
+import time
+
+import click
+from flask import jsonify
+
+# kind -> {key: visits}
+accessCounts = {}
+accessLock = threading.Lock()
+
+# keys of a kind kept per warmed key, so keys climbing into the top still
+# have their counts
+TRIM_FACTOR = 10
+
+
+def record_access(kind, key):
+    # called by the routes on every visit worth warming
+    with accessLock:
+        counts = accessCounts.setdefault(kind, {})
+        counts[key] = counts.get(key, 0) + 1
+
+
+def warm_limit(config, kind):
+    # how many keys of a kind are warmed
+    if kind.startswith('search:'):
+        return config.get('WARMUP_TOP_TERMS', 20)
+    return config.get('WARMUP_TOP_ENTITIES', 50)
+
+
+def trim_counts(config):
+    with accessLock:
+        for kind, counts in accessCounts.items():
+            keep = warm_limit(config, kind) * TRIM_FACTOR
+            if len(counts) > keep:
+                accessCounts[kind] = dict((key, counts[key]) for key in most_visited(counts, keep))
+
+
+#  Access stats
+#  ----------------------------------------------------------------
+
+def flush_stats(directory, fileName):
+    with accessLock:
+        snapshot = dict((kind, dict(counts)) for kind, counts in accessCounts.items())
+    path = os.path.join(directory, fileName)
+    temporary = '%s.%d.tmp' % (path, threading.get_ident())
+    with open(temporary, 'w') as statsFile:
+        json.dump(snapshot, statsFile)
+    os.replace(temporary, path)
+
+
+def read_stats(directory, maxAge):
+    # visits per kind and key summed over every recent worker; files older
+    # than maxAge are deleted
+    merged = {}
+    if not directory or not os.path.isdir(directory):
+        return merged
+    now = time.time()
+    for fileName in os.listdir(directory):
+        if not fileName.endswith('.json'):
+            continue
+        path = os.path.join(directory, fileName)
+        try:
+            if now - os.path.getmtime(path) > maxAge:
+                os.remove(path)
+                continue
+            with open(path) as statsFile:
+                snapshot = json.load(statsFile)
+        except (OSError, ValueError):
+            continue
+        for kind, counts in snapshot.items():
+            total = merged.setdefault(kind, {})
+            for key, visits in counts.items():
+                total[key] = total.get(key, 0) + visits
+    return merged
+
+
+def most_visited(counts, limit):
+    return [key for key, _ in sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:limit]]
+
+
+#  Warm-up
+#  ----------------------------------------------------------------
+
+def compile_templates(app):
+    names = app.jinja_env.list_templates(extensions=['html'])
+    for name in names:
+        app.jinja_env.get_template(name)
+    return len(names)
+
+
+def warm_up(app, db, warmers, pages):
+    # warmers: {kind: function(key)} filling the cache for one recorded key;
+    # pages: functions filling the caches every visitor needs
+    started = time.perf_counter()
+    config = app.config
+    templates = compile_templates(app)
+    stats = read_stats(config.get('ACCESS_STATS_DIR'), config.get('ACCESS_STATS_MAX_AGE', 7 * 86400))
+    warmed = 0
+    with app.test_request_context('/'):
+        try:
+            for page in pages:
+                page()
+                warmed += 1
+            for kind, warmer in sorted(warmers.items()):
+                for key in most_visited(stats.get(kind, {}), warm_limit(config, kind)):
+                    warmer(key)
+                    warmed += 1
+        finally:
+            db.session.remove()
+    app.logger.info('warm-up finished', extra={
+        "templates": templates,
+        "entries": warmed,
+        "latency_ms": round((time.perf_counter() - started) * 1000, 2),
+    })
+    return templates, warmed
+
+
+def init_warmup(app, db, warmers, pages):
+    directory = app.config.get('ACCESS_STATS_DIR')
+    interval = app.config.get('ACCESS_STATS_FLUSH_INTERVAL', 30)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    state = {"started": False, "ready": False, "lastFlush": time.time(), "pid": None, "fileName": None}
+    lock = threading.Lock()
+
+    def run_warmup():
+        return warm_up(app, db, warmers, pages)
+    app.extensions['warmup'] = run_warmup
+
+    def run():
+        try:
+            run_warmup()
+        except Exception:
+            # a failed warm-up leaves cold caches, not a worker that never
+            # becomes ready
+            app.logger.exception('warm-up failed')
+        state["ready"] = True
+
+    @app.before_request
+    def start_warmup():
+        if state["started"] or state["ready"]:
+            return
+        if not app.config.get('WARMUP_ENABLED', True):
+            state["ready"] = True
+            return
+        with lock:
+            if not state["started"]:
+                state["started"] = True
+                threading.Thread(target=run, name='warmup', daemon=True).start()
+
+    @app.after_request
+    def flush_access_stats(response):
+        if time.time() - state["lastFlush"] <= interval:
+            return response
+        state["lastFlush"] = time.time()
+        trim_counts(app.config)
+        if directory:
+            if state["pid"] != os.getpid():
+                # named at the first flush, so workers forked from a
+                # preloading master don't share a file
+                state["pid"] = os.getpid()
+                state["fileName"] = '%d-%d.json' % (state["pid"], time.time())
+            flush_stats(directory, state["fileName"])
+        return response
+
+    def healthz():
+        if not state["ready"]:
+            return jsonify({"status": "warming"}), 503
+        return jsonify({"status": "ready"})
+
+    app.add_url_rule('/healthz', 'healthz', healthz)
+
+    @app.cli.command('warmup')
+    def warmup_command():
+        """Fill the caches from the recorded access stats."""
+        templates, warmed = run_warmup()
+        click.echo('compiled %d templates, warmed %d cache entries' % (templates, warmed))